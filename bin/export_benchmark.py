@@ -0,0 +1,101 @@
+"""
+Measures how fast exporter.export_corpus writes a generated corpus, for each export format and parameter format,
+next to the old way of exporting: one row at a time, rendered from scratch and written as a line of text.
+
+Usage: python bin/export_benchmark.py [number of signs] [repetitions]
+"""
+import os
+import sys
+import time
+import random
+import inspect
+import tempfile
+from datetime import date, timedelta
+base = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(base, 'slpa'))
+
+import parameters
+from lexicon import Corpus, Sign
+from constants import Flag, GLOBAL_OPTIONS
+from analysis import unmarked_handshapes
+from exporter import FORMATS, RowRenderer, export_corpus
+
+SIGNS = 20000
+REPETITIONS = 3
+PARAMETER_FORMATS = ['xml', 'txt', 'none']
+CODERS = ['coder{}'.format(n) for n in range(5)]
+
+
+def make_corpus(size, seed=0):
+    '''
+    :return: a Corpus of size signs made from the canonical unmarked handshapes, a few of them with a slot changed,
+    with random flags, options and dates, and the default parameters or one other set of them
+    '''
+    rnd = random.Random(seed)
+    hands = [list(c.canonical) for name, c in inspect.getmembers(unmarked_handshapes, inspect.isclass)
+             if hasattr(c, 'canonical')]
+    records = [parameters.defaultRecord]
+    changed = parameters.parametersFromRecord(parameters.defaultRecord)
+    changed[0].children[0].children[1].is_checked = True
+    records.append(parameters.recordFromParameters(changed))
+    corpus = Corpus({'name': 'benchmark'})
+    for n in range(size):
+        config = list()
+        for h in range(4):
+            hand = rnd.choice(hands)[:]
+            if rnd.random() < 0.2:
+                hand[rnd.choice([2, 3, 4, 17, 22, 27])] = rnd.choice(['E', 'F', 'H', 'i'])
+            config.append(hand)
+        flags = {name: [Flag(rnd.random() < 0.02, rnd.random() < 0.02) for slot in range(34)]
+                 for name in ['config1hand1', 'config1hand2', 'config2hand1', 'config2hand2']}
+        kwargs = {'gloss': 'SIGN{:06d}'.format(n), 'config1': config[:2], 'config2': config[2:], 'flags': flags,
+                  'parameters': rnd.choice(records), 'signNotes': 'note {}'.format(n) if n % 10 == 0 else '',
+                  '_frequency': float(rnd.randint(1, 100)), '_coder': rnd.choice(CODERS),
+                  '_lastUpdated': date(2020, 1, 1) + timedelta(days=rnd.randrange(1000))}
+        for option in GLOBAL_OPTIONS:
+            kwargs[option] = rnd.random() < 0.1
+        corpus.addWord(Sign(kwargs))
+    return corpus
+
+
+def export_by_line(corpus, path, parameter_format):
+    # a new renderer for every sign keeps nothing between rows, and each row is written as text on its own
+    with open(path, mode='w', encoding='utf-8') as f:
+        print(Sign.headers, file=f)
+        for sign in corpus:
+            print(RowRenderer(parameter_format=parameter_format).tsv(sign), file=f)
+    return len(corpus)
+
+
+def best_time(function, repetitions):
+    times = list()
+    for n in range(repetitions):
+        begin = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - begin)
+    return min(times)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else SIGNS
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else REPETITIONS
+    begin = time.perf_counter()
+    corpus = make_corpus(size)
+    print('{} signs made in {:.2f} s, best of {} runs'.format(size, time.perf_counter() - begin, repetitions))
+    print('{:<12}{:<12}{:>10}{:>14}{:>10}'.format('format', 'parameters', 'seconds', 'signs/s', 'MB/s'))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'export')
+        runs = [('tsv by line', parameter_format, lambda p=parameter_format: export_by_line(corpus, path, p))
+                for parameter_format in PARAMETER_FORMATS]
+        runs.extend((format, parameter_format,
+                     lambda f=format, p=parameter_format: export_corpus(corpus, path, f, parameter_format=p))
+                    for format in FORMATS for parameter_format in PARAMETER_FORMATS)
+        for format, parameter_format, function in runs:
+            seconds = best_time(function, repetitions)
+            megabytes = os.path.getsize(path) / (1 << 20)
+            print('{:<12}{:<12}{:>10.3f}{:>14,.0f}{:>10.1f}'.format(format, parameter_format, seconds,
+                                                                    size / seconds, megabytes / seconds))
+
+
+if __name__ == '__main__':
+    main()
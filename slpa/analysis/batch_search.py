@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from analysis.transcription_search import compile_query, query_key
+from analysis.handshape_search import handshape_search_shared
+from analysis.phonological_search import extended_finger_search_shared
+from analysis.result_cache import ResultCache, SEARCH_KEYS, fingerprint_is_usable
+
+# the name of each search function to a version of it that shares its lookups with the other searches of a batch,
+# transcription searches are compiled and share the bitmaps of a SlotIndex
+SHARED_SEARCHES = {'handshape_search': handshape_search_shared,
+                   'extended_finger_search': extended_finger_search_shared}
+
+
+def split_arguments(arguments):
+    '''
+    :param arguments: a dictionary of keyword arguments, or a sequence of positional ones
+    :return: args and kwargs
+    '''
+    if isinstance(arguments, dict):
+        return (), arguments
+    return tuple(arguments), dict()
+
+
+def transcription_search_shared(corpus, query, known=None):
+    '''
+    :param query: a TranscriptionQuery
+    :param known: see SlotIndex.select
+    '''
+    signs, total, plan = query.candidates(corpus, known)
+    return list(plan.run(signs))
+
+
+def batch_search(corpus, queries, call_back=None, stop_check=None):
+    '''
+    Run many searches of the same corpus together. The searches are told apart by the fingerprints of
+    analysis.result_cache, and each distinct one is run once, or not at all if the ResultCache of the corpus has
+    it. The searches look signs up in indexes of the corpus, SlotIndex, HandshapeIndex and HandStringIndex, and
+    share what they look up: the signs that pass a check or match a hand specification are found once for every
+    search that has it. The work then grows with the number of distinct hands in the corpus, rather than with the
+    number of signs times the number of searches.
+    :param queries: a dictionary of ids to (function, arguments), where function is transcription_search,
+    handshape_search or extended_finger_search from analysis, and arguments are what it takes after the corpus, as
+    a dictionary of keyword arguments or a sequence of positional ones
+    :param call_back: called after each distinct search with the number done so far and the number of them
+    :param stop_check: called before each distinct search, the searches stop if it returns True
+    :return: a dictionary of the ids to lists of the signs found, in gloss order. If the searches were stopped,
+    only the ids of the searches that were run are there
+    '''
+    searches = OrderedDict()  # fingerprint: a shared version of the search, its arguments, its test, its ids
+    uncached = set()  # fingerprints made up for searches that cannot be cached
+    for queryId, (function, arguments) in queries.items():
+        args, kwargs = split_arguments(arguments)
+        if function.__name__ == 'transcription_search':
+            query = compile_query(*args, **kwargs)
+            fingerprint, test = query_key(query)
+            search, args, kwargs = transcription_search_shared, (query,), dict()
+        else:
+            fingerprint, test = SEARCH_KEYS[function.__name__](*args, **kwargs)
+            search = SHARED_SEARCHES[function.__name__]
+        if not fingerprint_is_usable(fingerprint):
+            fingerprint = ('uncached', queryId)
+            uncached.add(fingerprint)
+        searches.setdefault(fingerprint, (search, args, kwargs, test, list()))[4].append(queryId)
+
+    cache = corpus.getIndex(ResultCache)
+    revision = corpus.revision
+    known = dict()  # what the searches have looked up so far
+    results = dict()
+    for n, (fingerprint, (search, args, kwargs, test, ids)) in enumerate(searches.items()):
+        if stop_check is not None and stop_check():
+            break
+        signs = None if fingerprint in uncached else cache.lookup(corpus, fingerprint)
+        if signs is None:
+            signs = search(corpus, *args, known=known, **kwargs)
+            if fingerprint not in uncached:
+                cache.store(fingerprint, revision, signs, test)
+        for queryId in ids:
+            results[queryId] = list(signs)
+        if call_back is not None:
+            call_back(n + 1, len(searches))
+    return results
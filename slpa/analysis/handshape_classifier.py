@@ -0,0 +1,136 @@
+import inspect
+from heapq import nsmallest
+try:
+    import numpy as np
+except ImportError:
+    #NumPy is optional, HandshapeClassifier.labelMany works one hand at a time without it
+    np = None
+from analysis import marked_handshapes, unmarked_handshapes
+from analysis.unmarked_handshapes import ORDER
+
+UNCERTAIN_DISTANCE = 0.5  # between '?' and any other symbol
+FLEXION_STEP = 1 / max(ORDER.values())  # between two flexion symbols, per step of ORDER
+
+# the transcription slots of each field, slot 1 (forearm) is not part of a handshape
+FIELDS = {2: range(2, 6),  # thumb
+          3: range(6, 16),  # thumb/finger contact
+          4: range(16, 20),  # index
+          5: range(20, 25),  # middle
+          6: range(25, 30),  # ring
+          7: range(30, 35)}  # pinky
+DEFAULT_WEIGHTS = {field: 1.0 for field in FIELDS}
+
+
+def canonical_handshapes():
+    '''
+    :return: a dictionary of the name of every handshape class in analysis that has a canonical transcription,
+    without its Handshape prefix, to that transcription
+    '''
+    handshapes = dict()
+    for module in [unmarked_handshapes, marked_handshapes]:
+        for name, handshape in vars(module).items():
+            if inspect.isclass(handshape) and hasattr(handshape, 'canonical'):
+                handshapes[name[len('Handshape'):]] = handshape.canonical
+    return handshapes
+
+
+def fill(transcription):
+    '''
+    :param transcription: the 34 slots of a hand, e.g. a canonical transcription or a hand of a Sign
+    :return: slots 2 to 34 with '_' for empty slots, as in SlotSummary.filled
+    '''
+    return tuple(slot if slot else '_' for slot in transcription[1:])
+
+
+def symbol_distance(symbol, other):
+    if symbol == other:
+        return 0.0
+    if symbol == '?' or other == '?':
+        return UNCERTAIN_DISTANCE
+    if symbol in ORDER and other in ORDER:
+        return abs(ORDER[symbol] - ORDER[other]) * FLEXION_STEP
+    return 1.0
+
+
+class HandshapeClassifier:
+    """
+    Finds the named handshapes closest to a hand. The distance between a hand and a handshape is the sum over slots
+    of the distance between their symbols, times the weight of the field of the slot. Flexion symbols are closer
+    the closer they are in ORDER, '?' is half way to everything, and any other two symbols are 1 apart.
+    For each slot, the distances from a symbol to that slot of every handshape are worked out once and kept in a
+    table, so the distances from a hand to all the handshapes are a sum of one row per slot.
+    """
+
+    def __init__(self, handshapes=None, weights=None):
+        '''
+        :param handshapes: a dictionary of names to canonical transcriptions, canonical_handshapes() by default
+        :param weights: a dictionary of field numbers, as in FIELDS, to the weight of their slots
+        '''
+        if handshapes is None:
+            handshapes = canonical_handshapes()
+        fieldWeights = dict(DEFAULT_WEIGHTS)
+        if weights is not None:
+            fieldWeights.update(weights)
+        self.labels = list(handshapes)
+        self.canonicals = [fill(canonical) for canonical in handshapes.values()]
+        self.weights = list()
+        for field, slots in sorted(FIELDS.items()):
+            self.weights.extend(fieldWeights[field] for slot in slots)
+        self.tables = [dict() for weight in self.weights]  # slot: symbol: distance to each handshape
+
+    def row(self, n, symbol):
+        table = self.tables[n]
+        try:
+            return table[symbol]
+        except KeyError:
+            weight = self.weights[n]
+            row = table[symbol] = [weight * symbol_distance(symbol, canonical[n]) for canonical in self.canonicals]
+            return row
+
+    def distances(self, hand):
+        '''
+        :param hand: slots 2 to 34 of a hand, as in SlotSummary.filled, see fill
+        :return: the distance from the hand to each handshape, in the order of self.labels
+        '''
+        rows = [self.row(n, symbol) for n, symbol in enumerate(hand)]
+        return [sum(column) for column in zip(*rows)]
+
+    def nearest(self, hand, k=3):
+        '''
+        :return: a list of (name, distance) of the k handshapes closest to the hand, closest first
+        '''
+        return nsmallest(k, zip(self.labels, self.distances(hand)), key=lambda item: item[1])
+
+    def labelMany(self, hands, k=1):
+        '''
+        :param hands: a sequence of hands as in SlotSummary.filled
+        :return: for each hand, the k closest handshapes as returned by nearest
+        '''
+        hands = list(hands)
+        if np is None or not hands:
+            return [self.nearest(hand, k) for hand in hands]
+        # each distinct symbol of a slot is looked up once, and the distances summed for all hands together
+        totals = np.zeros((len(hands), len(self.labels)))
+        for n in range(len(self.weights)):
+            symbols = dict()
+            codes = np.array([symbols.setdefault(hand[n], len(symbols)) for hand in hands], dtype=np.intp)
+            table = np.array([self.row(n, symbol) for symbol in symbols])
+            totals += table[codes]
+        closest = np.argsort(totals, axis=1, kind='stable')[:, :k]
+        return [[(self.labels[index], float(row[index])) for index in indices] for row, indices in zip(totals, closest)]
+
+
+def label_corpus(corpus, classifier=None, k=1):
+    '''
+    :return: a dictionary of glosses to, for each hand in the order of slotstore.HAND_NAMES, the k closest
+    handshapes as returned by HandshapeClassifier.nearest
+    '''
+    if classifier is None:
+        classifier = HandshapeClassifier()
+    signs = list(corpus.unorderedSigns())
+    hands = dict()
+    for sign in signs:
+        for hand in sign.slotSummary.filled:
+            hands.setdefault(hand, len(hands))
+    labels = classifier.labelMany(list(hands), k)
+    return {sign.gloss: [labels[hands[hand]] for hand in sign.slotSummary.filled] for sign in signs}
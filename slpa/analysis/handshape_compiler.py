@@ -0,0 +1,263 @@
+import itertools
+try:
+    import numpy as np
+except ImportError:
+    #NumPy is optional, only HandshapeSet.classifyMany needs it
+    np = None
+from analysis.unmarked_handshapes import (HandshapeAny, HandshapeEmpty,
+                                          HandshapeA, HandshapeB1, HandshapeB2, HandshapeC, HandshapeO, HandshapeS,
+                                          Handshape1, Handshape5,
+                                          ORDER, increasing_or_equal_flexion)
+
+UNKNOWN = 0  # the code of every symbol that no handshape allows
+QUESTION = '?'
+FINGER_JOINTS = [15, 16, 17, 20, 21, 22, 25, 26, 27, 30, 31, 32]
+FINGER_CONTACTS = [(10, '1'), (11, '2'), (12, '3'), (13, '4')]
+
+
+def forbid(slots, *combinations):
+    '''
+    :param slots: positions in a hand as in SlotSummary.filled, i.e. the positions used by the options of a handshape
+    :param combinations: tuples of symbols that the slots cannot hold together
+    '''
+    combinations = set(combinations)
+    return tuple(slots), lambda *symbols: symbols not in combinations
+
+
+def implies(slot, symbol, other, allowed):
+    '''
+    If slot holds symbol, other has to hold one of allowed
+    '''
+    return (slot, other), lambda value, otherValue: value != symbol or otherValue in allowed
+
+
+def relation(slots, test):
+    '''
+    :param test: a function that takes the symbols of slots and returns False if they cannot go together
+    '''
+    return tuple(slots), test
+
+
+def pairs(slots):
+    return list(itertools.combinations(slots, 2))
+
+
+def within(n):
+    def test(*symbols):
+        if QUESTION in symbols:
+            return True
+        return all(abs(ORDER[symbols[i + 1]] - ORDER[symbols[i]]) <= n for i in range(len(symbols) - 1))
+    return test
+
+
+def flexion(*symbols):
+    return QUESTION in symbols or increasing_or_equal_flexion(*symbols)
+
+
+def b1_contacts():
+    constraints = list()
+    for slot, digit in FINGER_CONTACTS:
+        constraints.append(implies(slot, digit, 1, ['{']))
+        constraints.extend(implies(slot, digit, joint, ['e', 'E']) for joint in FINGER_JOINTS)
+    for slot, digit in FINGER_CONTACTS:
+        thumb = ['e', 'E'] if digit in ['1', '2'] else ['i', 'e', 'E']
+        constraints.extend(implies(slot, digit, joint, thumb) for joint in [2, 3])
+    return constraints
+
+
+def b1_fingers():
+    # HandshapeB1.satisfy_const2 skips every comparison if any finger joint is '?', but the options of B1 do not
+    # allow '?' in any of them, so comparing the joints of adjacent fingers pair by pair is the same
+    constraints = list()
+    for joint in range(3):
+        fingers = [15 + joint, 20 + joint, 25 + joint, 30 + joint]
+        constraints.extend(relation(pair, within(1)) for pair in zip(fingers, fingers[1:]))
+    return constraints
+
+
+#the satisfy_const methods of each handshape, as constraints on a few slots at a time
+CONSTRAINTS = {
+    HandshapeEmpty: [],
+    HandshapeAny: [],
+    Handshape1: [forbid((2, 3), ('i', 'F')),
+                 forbid((15, 17), ('e', 'H')), forbid((16, 17), ('e', 'H')),
+                 forbid((25, 26), ('F', 'i')), forbid((25, 27), ('F', 'i')),
+                 forbid((30, 31), ('F', 'i')), forbid((30, 32), ('F', 'i'))],
+    Handshape5: [forbid((2, 3), ('e', 'H'))],
+    HandshapeA: [forbid((3, 5), ('i', 'p'), ('i', '-'))] +
+                [forbid((mcp, mcp + 2), ('f', 'E'), ('f', 'e')) for mcp in [15, 20, 25, 30]] +
+                [relation((17, 22, 27), within(2)),
+                 relation((17, 22, 27, 32), flexion)],
+    HandshapeB1: b1_contacts() + b1_fingers(),
+    HandshapeB2: [forbid(pair, ('E', 'i'), ('i', 'E')) for pair in pairs([15, 20, 25, 30])] +
+                 [forbid(pair, ('E', 'i'), ('i', 'E')) for pair in pairs([16, 21, 26, 31])] +
+                 [forbid(pair, ('E', 'i'), ('i', 'E')) for finger in [15, 20, 25, 30]
+                  for pair in pairs([finger, finger + 1, finger + 2])],
+    HandshapeC: [forbid((2, 3), ('E', 'i'), ('i', 'E'))] +
+                [relation(pair, lambda a, b: a == b) for pair in pairs([15, 20, 25])] +
+                [forbid(pair, ('e', 'f'), ('f', 'e')) for pair in pairs([16, 21, 26])] +
+                [forbid(pair, ('E', 'i'), ('i', 'E'), ('E', 'f'), ('f', 'E'), ('e', 'f'), ('f', 'e'))
+                 for pair in pairs([17, 22, 27])] +
+                [forbid((30, mcp), ('E', 'i'), ('E', 'f'), ('e', 'f'), ('f', 'e')) for mcp in [15, 20, 25]] +
+                [forbid((31, pip), ('E', 'f')) for pip in [16, 21, 26]],
+    HandshapeO: [forbid((2, 3), ('e', 'F')),
+                 forbid((10, 11, 12), ('-', '-', '-'))],
+    # constraints 4 and 5 of HandshapeS are not used by its match
+    HandshapeS: [forbid((1, 3), ('{', 'e'), ('{', 'i')),
+                 implies(4, 'u', 10, ['1']), implies(4, 'u', 11, ['-']), implies(4, 'u', 12, ['-']),
+                 implies(4, 'u', 3, ['F']),
+                 forbid((10, 11, 12), ('-', '-', '-'), ('1', '2', '3'), ('1', '-', '3'))],
+}
+
+
+class CompiledHandshape:
+    """
+    A handshape as tables over symbol codes: for each slot, a bitmask of the codes its options allow, and for each
+    constraint, the combinations of codes that its slots cannot hold. Only combinations of allowed symbols are
+    tabulated, since a hand with any other symbol is already rejected by the options.
+    """
+
+    def __init__(self, handshape, codes):
+        '''
+        :param handshape: one of the classes in analysis.unmarked_handshapes
+        :param codes: a dictionary of symbols to codes, which has every symbol in the options of the handshape
+        '''
+        if handshape not in CONSTRAINTS:
+            if any(name.startswith('satisfy_const') for name in vars(handshape)):
+                raise ValueError('The constraints of {} have not been declared'.format(handshape.__name__))
+        self.handshape = handshape
+        self.allowed = list()
+        for options in handshape.options:
+            mask = 0
+            for symbol in options:
+                mask |= 1 << codes[symbol]
+            self.allowed.append(mask)
+
+        self.pairs = list()  # (slot, other slot, {code: bitmask of the codes other slot cannot hold})
+        self.tuples = list()  # (slots, set of tuples of codes they cannot hold)
+        for slots, test in CONSTRAINTS.get(handshape, []):
+            forbidden = [tuple(codes[symbol] for symbol in symbols)
+                         for symbols in itertools.product(*[handshape.options[n] for n in slots])
+                         if not test(*symbols)]
+            if not forbidden:
+                continue
+            if len(slots) == 2:
+                table = dict()
+                for first, second in forbidden:
+                    table[first] = table.get(first, 0) | 1 << second
+                self.pairs.append((slots[0], slots[1], table))
+            else:
+                self.tuples.append((slots, set(forbidden)))
+
+    def matchCodes(self, codes):
+        '''
+        :param codes: the code of each slot of a hand
+        '''
+        for mask, code in zip(self.allowed, codes):
+            if not mask >> code & 1:
+                return False
+        return self.satisfies(codes)
+
+    def satisfies(self, codes):
+        '''
+        :return: True if the codes break none of the constraints, whether or not the options allow them
+        '''
+        for slot, other, table in self.pairs:
+            if table.get(codes[slot], 0) >> codes[other] & 1:
+                return False
+        for slots, forbidden in self.tuples:
+            if tuple(codes[n] for n in slots) in forbidden:
+                return False
+        return True
+
+
+class HandshapeSet:
+    """
+    A dictionary of labels to handshapes, compiled together so that a hand is encoded once and then tested against
+    every handshape. Each label has a bit, in the order of the dictionary. The options of all the handshapes are
+    also kept per slot as a bitmask of the labels that allow each code, so the labels whose options a hand passes
+    are found with one lookup per slot.
+    """
+
+    def __init__(self, mapping):
+        self.labels = list(mapping)
+        self.bits = {label: 1 << n for n, label in enumerate(self.labels)}
+        self.codes = dict()
+        for handshape in mapping.values():
+            for options in handshape.options:
+                for symbol in options:
+                    self.codes.setdefault(symbol, len(self.codes) + 1)
+        self.handshapes = [CompiledHandshape(handshape, self.codes) for handshape in mapping.values()]
+        self.arrays = None  # the tables of each handshape for classifyMany, made the first time they are needed
+
+        slots = len(self.handshapes[0].allowed)
+        self.slotLabels = [[0] * (len(self.codes) + 1) for n in range(slots)]  # slot: code: bitmask of labels
+        for handshape, bit in zip(self.handshapes, self.bits.values()):
+            for slotLabels, mask in zip(self.slotLabels, handshape.allowed):
+                for code in range(len(slotLabels)):
+                    if mask >> code & 1:
+                        slotLabels[code] |= bit
+
+    def encode(self, hand):
+        '''
+        :param hand: the symbols of a hand as in SlotSummary.filled
+        '''
+        codes = self.codes
+        return [codes.get(symbol, UNKNOWN) for symbol in hand]
+
+    def classify(self, hand):
+        '''
+        :return: an int with the bit of every label whose handshape the hand matches
+        '''
+        codes = self.encode(hand)
+        bits = -1
+        for slotLabels, code in zip(self.slotLabels, codes):
+            bits &= slotLabels[code]
+            if not bits:
+                return 0
+        for handshape, bit in zip(self.handshapes, self.bits.values()):
+            if bits & bit and not handshape.satisfies(codes):
+                bits &= ~bit
+        return bits
+
+    def match(self, label, hand):
+        return self.handshapes[self.labels.index(label)].matchCodes(self.encode(hand))
+
+    def tables(self, handshape):
+        '''
+        :return: the tables of a CompiledHandshape as NumPy arrays: whether each code is allowed in each slot, and for
+        each constraint its slots and an array that is True at the combinations of codes that are forbidden
+        '''
+        size = len(self.codes) + 1
+        allowed = np.array([[bool(mask >> code & 1) for code in range(size)] for mask in handshape.allowed],
+                           dtype=bool)
+        constraints = list()
+        for slot, other, table in handshape.pairs:
+            forbidden = np.zeros((size, size), dtype=bool)
+            for code, mask in table.items():
+                forbidden[code] = [bool(mask >> n & 1) for n in range(size)]
+            constraints.append(((slot, other), forbidden))
+        for slots, combinations in handshape.tuples:
+            forbidden = np.zeros((size,) * len(slots), dtype=bool)
+            for combination in combinations:
+                forbidden[combination] = True
+            constraints.append((slots, forbidden))
+        return allowed, constraints
+
+    def classifyMany(self, hands):
+        '''
+        The same as classify, for many hands at once with NumPy
+        :param hands: a sequence of hands as in SlotSummary.filled
+        :return: an array of the label bits of each hand
+        '''
+        codes = np.array([self.encode(hand) for hand in hands], dtype=np.intp).reshape(-1, len(self.slotLabels))
+        positions = np.arange(codes.shape[1])
+        bits = np.zeros(len(codes), dtype=np.int64)
+        if self.arrays is None:
+            self.arrays = [self.tables(handshape) for handshape in self.handshapes]
+        for (allowed, constraints), bit in zip(self.arrays, self.bits.values()):
+            matches = allowed[positions, codes].all(axis=1)
+            for slots, forbidden in constraints:
+                matches &= ~forbidden[tuple(codes[:, n] for n in slots)]
+            bits[matches] |= bit
+        return bits
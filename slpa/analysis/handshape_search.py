@@ -1,6 +1,12 @@
 from analysis.unmarked_handshapes import (HandshapeAny, HandshapeEmpty,
                                           HandshapeA, HandshapeB1, HandshapeB2, HandshapeC, HandshapeO, HandshapeS,
                                           Handshape1, Handshape5)
+from functools import lru_cache
+from lexicon import CorpusIndex
+from slotstore import HAND_NAMES
+from constants import GLOBAL_OPTIONS
+from analysis.handshape_compiler import HandshapeSet
+from analysis.streaming import in_batches, flatten
 from analysis.transcription_search import check_global_options, check_config_type, check_hand_type
 
 handshape_mapping = {
@@ -17,6 +23,80 @@ handshape_mapping = {
 }
 
 
+HANDSHAPES = HandshapeSet(handshape_mapping)
+LABEL_BITS = HANDSHAPES.bits
+ANY_LOGIC = 'Any of the above configurations'
+HAND_CACHE_SIZE = 4096  # distinct hands whose handshapes are kept, which covers the hands of most corpora
+
+
+@lru_cache(maxsize=HAND_CACHE_SIZE)
+def classify_hand(filled):
+    '''
+    :param filled: one hand as in SlotSummary.filled
+    :return: an int with the bit in LABEL_BITS of every handshape that the hand matches
+    '''
+    return HANDSHAPES.classify(filled)
+
+
+def label_mask(labels):
+    mask = 0
+    for label in labels:
+        mask |= LABEL_BITS[label]
+    return mask
+
+
+class HandshapeIndex(CorpusIndex):
+    """
+    The handshapes that each hand of each sign matches, as an int with the bit in LABEL_BITS of every matching
+    handshape. Hands are classified once, when a sign is indexed, and the glosses of each hand are grouped by their
+    bits, so a search only has to test each distinct set of bits once. The signs found are looked up in the
+    wordlist of the corpus.
+    """
+
+    def build(self, corpus):
+        self.entries = dict()  # gloss: the bits of each hand in the order of HAND_NAMES
+        self.groups = [dict() for name in HAND_NAMES]  # bits: set of glosses
+        for sign in corpus.unorderedSigns():
+            self.add(sign)
+
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and len(self.entries) == len(corpus.wordlist)
+
+    def add(self, sign):
+        # what is recorded is what gets removed again, even if the sign is changed in place in the meantime
+        entry = tuple(classify_hand(hand) for hand in sign.slotSummary.filled)
+        self.entries[sign.gloss] = entry
+        for groups, bits in zip(self.groups, entry):
+            groups.setdefault(bits, set()).add(sign.gloss)
+
+    def wordAdded(self, sign, old):
+        if old is not None:
+            self.wordRemoved(old)
+        self.add(sign)
+
+    def wordRemoved(self, sign):
+        for groups, bits in zip(self.groups, self.entries.pop(sign.gloss)):
+            glosses = groups[bits]
+            glosses.discard(sign.gloss)
+            if not glosses:
+                del groups[bits]
+
+    def matching(self, h, labels, positive):
+        '''
+        :param h: the position of the hand in HAND_NAMES
+        :param labels: keys of handshape_mapping
+        :param positive: a function that takes whether a hand matches any of labels and returns whether the sign
+        should be found
+        :return: the set of glosses of the signs whose hand h passes
+        '''
+        mask = label_mask(labels)
+        found = set()
+        for bits, glosses in self.groups[h].items():
+            if positive(bool(bits & mask)):
+                found |= glosses
+        return found
+
+
 def handshape_search(corpus, forearm, estimated, uncertain, incomplete, config, hand, logic, c1h1, c1h2, c2h1, c2h2):
     """
     Run handshape search and return a list of signs in the corpus that match the specifications
@@ -34,47 +114,116 @@ def handshape_search(corpus, forearm, estimated, uncertain, incomplete, config,
     :param c2h2: a list of handshapt --- O, 1, B, A, S, C, 5, B
     :return: a list of signs that match the criteria
     """
-    ret = list()
-    for word in corpus:
-        if not check_global_options(word, (forearm, estimated, uncertain, incomplete)):
-            continue
+    return flatten(handshape_search_batches(corpus, forearm, estimated, uncertain, incomplete, config, hand, logic,
+                                            c1h1, c1h2, c2h1, c2h2))
+
+
+def handshape_search_batches(corpus, forearm, estimated, uncertain, incomplete, config, hand, logic,
+                             c1h1, c1h2, c2h1, c2h2, call_back=None, stop_check=None):
+    '''
+    handshape_search a batch of matches at a time, see analysis.streaming.in_batches
+    '''
+    index = corpus.getIndex(HandshapeIndex)
+    found = handshape_glosses(index, logic, c1h1, c1h2, c2h1, c2h2)
+    check = handshape_filter(forearm, estimated, uncertain, incomplete, config, hand)
+
+    wordlist = corpus.wordlist
+
+    def test(glosses):
+        return [word for word in (wordlist[gloss] for gloss in glosses) if check(word)]
+
+    return in_batches(sorted(found), len(found), test, call_back=call_back, stop_check=stop_check)
+
+
+def handshape_search_shared(corpus, forearm, estimated, uncertain, incomplete, config, hand, logic,
+                            c1h1, c1h2, c2h1, c2h2, known=None):
+    '''
+    handshape_search for analysis.batch_search
+    :param known: see handshape_glosses
+    '''
+    if known is None:
+        known = dict()
+    index = corpus.getIndex(HandshapeIndex)
+    found = handshape_glosses(index, logic, c1h1, c1h2, c2h1, c2h2, known)
+    # the signs with the options and types asked for are found once for all the searches that ask for them, by
+    # checking one sign of each group of signs with the same options and types
+    key = ('handshape filter', forearm, estimated, uncertain, incomplete, config, hand)
+    if key not in known:
+        if 'handshape filter groups' not in known:
+            groups = known['handshape filter groups'] = dict()
+            for sign in corpus.unorderedSigns():
+                group = tuple(getattr(sign, option) for option in GLOBAL_OPTIONS) + (sign.config_type, sign.hand_type)
+                groups.setdefault(group, (sign, set()))[1].add(sign.gloss)
+        check = handshape_filter(forearm, estimated, uncertain, incomplete, config, hand)
+        known[key] = set().union(*[glosses for sign, glosses in known['handshape filter groups'].values()
+                                   if check(sign)])
+    wordlist = corpus.wordlist
+    return [wordlist[gloss] for gloss in sorted(found & known[key])]
+
+
+def handshape_glosses(index, logic, c1h1, c1h2, c2h1, c2h2, known=None):
+    '''
+    :param index: a HandshapeIndex
+    :param known: a dictionary of the glosses whose hands match each specification, kept between searches that
+    share specifications, or None
+    :return: the set of glosses of the signs whose hands match the specifications
+    '''
+    if known is None:
+        known = dict()
+
+    def matching(h, labels, positive):
+        key = ('handshape', h, frozenset(labels), positive)
+        if key not in known:
+            known[key] = index.matching(h, labels, positive)
+        return known[key]
+
+    specs = [c1h1, c1h2, c2h1, c2h2]
+    if logic == ANY_LOGIC:
+        # the first hand decides whether every hand is searched positively
+        found = set()
+        for h, spec in enumerate(specs):
+            found |= matching(h, spec['labels'], c1h1['positive'])
+    else:  # logic == 'All of the above configurations'
+        found = None
+        for h, spec in enumerate(specs):
+            glosses = matching(h, spec['labels'], spec['positive'])
+            found = set(glosses) if found is None else found & glosses
+            if not found:
+                break
+    return found
+
 
-        if not check_config_type(word, config):
-            continue
+def handshape_filter(forearm, estimated, uncertain, incomplete, config, hand):
+    '''
+    :return: a function that takes a sign and returns True if its global options, config type and hand type are
+    the ones asked for
+    '''
+    def check(word):
+        return (check_global_options(word, (forearm, estimated, uncertain, incomplete)) and
+                check_config_type(word, config) and check_hand_type(word, hand))
+    return check
 
-        if not check_hand_type(word, hand):
-            continue
 
-        if not check_handshape(word, logic, c1h1, c1h2, c2h1, c2h2):
-            continue
+def handshape_key(forearm, estimated, uncertain, incomplete, config, hand, logic, c1h1, c1h2, c2h1, c2h2):
+    '''
+    Takes the same arguments as handshape_search, without the corpus
+    :return: a fingerprint of the search and a test of whether one sign matches it, for a result_cache.ResultCache
+    '''
+    specs = [c1h1, c1h2, c2h1, c2h2]
+    fingerprint = ('handshape search', forearm, estimated, uncertain, incomplete, config, hand, logic,
+                   tuple((frozenset(spec['labels']), spec['positive']) for spec in specs))
 
-        ret.append(word)
+    check = handshape_filter(forearm, estimated, uncertain, incomplete, config, hand)
 
-    return ret
+    def test(sign):
+        return check(sign) and check_handshape(sign, logic, c1h1, c1h2, c2h1, c2h2)
+    return fingerprint, test
 
 
 def check_handshape(sign, logic, c1h1, c1h2, c2h1, c2h2):
-    #print(sign)
-    sign_c1h1 = [slot if slot else '_' for slot in sign.config1hand1[1:]]
-    sign_c1h2 = [slot if slot else '_' for slot in sign.config1hand2[1:]]
-    sign_c2h1 = [slot if slot else '_' for slot in sign.config2hand1[1:]]
-    sign_c2h2 = [slot if slot else '_' for slot in sign.config2hand2[1:]]
-
-    #for shape in c1h1['labels']:
-    #    print(shape)
-    #    print('   ', handshape_mapping[shape]().match(sign_c1h1))
-    #    print('   ', 'positive', c1h1['positive'])
-    #    print('   ', c1h1['positive'](handshape_mapping[shape]().match(sign_c1h1)))
-
-    #print('Overall', c1h1['positive'](any([handshape_mapping[shape]().match(sign_c1h1) for shape in c1h1['labels']])))
-
-    if logic == 'Any of the above configurations':
-        return any([c1h1['positive'](any([handshape_mapping[shape]().match(sign_c1h1) for shape in c1h1['labels']])),
-                    c1h1['positive'](any([handshape_mapping[shape]().match(sign_c1h2) for shape in c1h2['labels']])),
-                    c1h1['positive'](any([handshape_mapping[shape]().match(sign_c2h1) for shape in c2h1['labels']])),
-                    c1h1['positive'](any([handshape_mapping[shape]().match(sign_c2h2) for shape in c2h2['labels']]))])
+    specs = [c1h1, c1h2, c2h1, c2h2]
+    hands = [classify_hand(hand) for hand in sign.slotSummary.filled]
+    if logic == ANY_LOGIC:
+        return any([c1h1['positive'](bool(bits & label_mask(spec['labels']))) for bits, spec in zip(hands, specs)])
     else:  # logic == 'All of the above configurations'
-        return all([c1h1['positive'](any([handshape_mapping[shape]().match(sign_c1h1) for shape in c1h1['labels']])),
-                    c1h2['positive'](any([handshape_mapping[shape]().match(sign_c1h2) for shape in c1h2['labels']])),
-                    c2h1['positive'](any([handshape_mapping[shape]().match(sign_c2h1) for shape in c2h1['labels']])),
-                    c2h2['positive'](any([handshape_mapping[shape]().match(sign_c2h2) for shape in c2h2['labels']]))])
+        return all([spec['positive'](bool(bits & label_mask(spec['labels']))) for bits, spec in zip(hands, specs)])
@@ -0,0 +1,244 @@
+from collections import defaultdict
+from lexicon import CorpusIndex, CoderIndex, LastUpdatedIndex
+from slotstore import HAND_NAMES, NUM_SLOTS
+from constants import GLOBAL_OPTIONS
+
+INDEXED_ATTRIBUTES = GLOBAL_OPTIONS + ['hand_type', 'config_type']
+# attributes that the corpus keeps an index of its own for, which a SlotIndex turns into bitmaps when asked
+ATTRIBUTE_INDEXES = {'coder': CoderIndex, 'lastUpdated': LastUpdatedIndex}
+
+
+def bitmap_from_ids(ids):
+    '''
+    :param ids: an iterable of sign ids
+    :return: an int with the bit of every id set
+    '''
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for n in ids:
+        bits[n >> 3] |= 1 << (n & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def update_bitmap(bitmaps, key, bit, add):
+    '''
+    Set or clear one bit of the bitmap kept for key, leaving out bitmaps that become empty
+    '''
+    if add:
+        bitmaps[key] = bitmaps.get(key, 0) | bit
+    else:
+        bitmap = bitmaps[key] & ~bit
+        if bitmap:
+            bitmaps[key] = bitmap
+        else:
+            del bitmaps[key]
+
+
+def ids_from_bitmap(bitmap):
+    '''
+    :return: a list of the ids whose bits are set, in increasing order
+    '''
+    # the binary digits of an int are written out in C, so only the set bits are visited in Python
+    digits = bin(bitmap)[:1:-1]
+    ids = list()
+    n = digits.find('1')
+    while n != -1:
+        ids.append(n)
+        n = digits.find('1', n + 1)
+    return ids
+
+
+def describe(sign):
+    '''
+    :return: what a SlotIndex records about a sign: its slots as in SlotSummary.filled, the (hand, slot, flag) of
+    every flag that is set, and the values of INDEXED_ATTRIBUTES
+    '''
+    flags = sign.flags
+    flagged = tuple((name, n, index) for name in HAND_NAMES for n, flag in enumerate(flags[name])
+                    for index in [0, 1] if flag[index])
+    return sign.slotSummary.filled, flagged, tuple(getattr(sign, name) for name in INDEXED_ATTRIBUTES)
+
+
+class SlotIndex(CorpusIndex):
+    """
+    An inverted index from every (hand, slot, symbol) to the signs that have that symbol in that slot, from every
+    (hand, slot, flag) to the signs that have that flag set, and from the values of a few attributes to the signs
+    that have them. Each sign is given a small id, and the signs of each entry are kept as a bitmap: an int with
+    the bit of each of their ids set. Finding the signs that allow one of several symbols in a slot is then a
+    union of bitmaps, and finding the signs that match several slots an intersection of them.
+    Coders and dates are not kept here: their bitmaps are made from the CoderIndex and LastUpdatedIndex of the
+    corpus when a search asks for them.
+    Slots are indexed as they are matched by transcription search, see SlotSummary.filled, so slot n of a hand is
+    slot n+2 of its transcription. Only glosses are kept, and the signs found are looked up in the wordlist, so the
+    index does not keep the signs of a lazily loaded corpus in memory.
+    """
+
+    def build(self, corpus):
+        self.ids = dict()  # gloss: id
+        self.glosses = list()  # id: gloss, or None for ids that are free
+        self.entries = list()  # id: what was indexed for the sign, see describe
+        self.free = list()
+        self.slots = {name: [dict() for n in range(NUM_SLOTS - 1)] for name in HAND_NAMES}  # symbol: bitmap
+        self.flags = {name: [[0, 0] for n in range(NUM_SLOTS)] for name in HAND_NAMES}  # [isUncertain, isEstimate]
+        self.attributes = {name: dict() for name in INDEXED_ATTRIBUTES}  # value: bitmap
+        self.attributeIndexes = {name: corpus.getIndex(indexClass) for name, indexClass in ATTRIBUTE_INDEXES.items()}
+
+        # many signs have the same hands, so the ids are grouped by them before any bitmaps are made
+        hands = [defaultdict(list) for name in HAND_NAMES]
+        flags = defaultdict(list)
+        values = [defaultdict(list) for name in INDEXED_ATTRIBUTES]
+        for sign in corpus.unorderedSigns():
+            n = len(self.glosses)
+            entry = describe(sign)
+            self.ids[sign.gloss] = n
+            self.glosses.append(sign.gloss)
+            self.entries.append(entry)
+            filled, flagged, attributes = entry
+            for handIds, hand in zip(hands, filled):
+                handIds[hand].append(n)
+            for flag in flagged:
+                flags[flag].append(n)
+            for valueIds, value in zip(values, attributes):
+                valueIds[value].append(n)
+        self.everything = (1 << len(self.glosses)) - 1
+
+        for name, handIds in zip(HAND_NAMES, hands):
+            symbols = [defaultdict(list) for n in range(NUM_SLOTS - 1)]
+            for filled, ids in handIds.items():
+                for symbolIds, symbol in zip(symbols, filled):
+                    symbolIds[symbol].extend(ids)
+            for slot, symbolIds in zip(self.slots[name], symbols):
+                for symbol, ids in symbolIds.items():
+                    slot[symbol] = bitmap_from_ids(ids)
+        for (name, n, index), ids in flags.items():
+            self.flags[name][n][index] = bitmap_from_ids(ids)
+        for name, valueIds in zip(INDEXED_ATTRIBUTES, values):
+            self.attributes[name] = {value: bitmap_from_ids(ids) for value, ids in valueIds.items()}
+
+    def isCurrent(self, corpus):
+        return (super().isCurrent(corpus) and len(self.ids) == len(corpus.wordlist) and
+                all(index.isCurrent(corpus) for index in self.attributeIndexes.values()))
+
+    def setBits(self, n, entry, add):
+        bit = 1 << n
+        filled, flagged, attributes = entry
+        for name, hand in zip(HAND_NAMES, filled):
+            for slot, symbol in zip(self.slots[name], hand):
+                update_bitmap(slot, symbol, bit, add)
+        for name, slot, index in flagged:
+            bitmaps = self.flags[name][slot]
+            bitmaps[index] = bitmaps[index] | bit if add else bitmaps[index] & ~bit
+        for name, value in zip(INDEXED_ATTRIBUTES, attributes):
+            update_bitmap(self.attributes[name], value, bit, add)
+
+    def wordAdded(self, sign, old):
+        if old is not None:
+            # the new sign takes over the id of the one it replaces
+            n = self.ids[old.gloss]
+            self.setBits(n, self.entries[n], False)
+        elif self.free:
+            n = self.free.pop()
+        else:
+            n = len(self.glosses)
+            self.glosses.append(None)
+            self.entries.append(None)
+        # what is recorded is what gets removed again, even if the sign is changed in place in the meantime
+        entry = describe(sign)
+        self.ids[sign.gloss] = n
+        self.glosses[n] = sign.gloss
+        self.entries[n] = entry
+        self.everything |= 1 << n
+        self.setBits(n, entry, True)
+
+    def wordRemoved(self, sign):
+        n = self.ids.pop(sign.gloss)
+        self.setBits(n, self.entries[n], False)
+        self.glosses[n] = None
+        self.entries[n] = None
+        self.free.append(n)
+        self.everything &= ~(1 << n)
+
+    def slotBitmap(self, name, n, fullmatch):
+        '''
+        :param fullmatch: a function that takes a symbol and returns None if it is not allowed
+        :return: the bitmap of the signs whose slot n of hand name holds an allowed symbol
+        '''
+        bitmap = 0
+        for symbol, signs in self.slots[name][n].items():
+            if fullmatch(symbol) is not None:
+                bitmap |= signs
+        return bitmap
+
+    def flagBitmap(self, name, n, index, value):
+        '''
+        :param index: 0 for isUncertain, 1 for isEstimate
+        :param value: True for the signs with the flag set, False for the signs without it
+        '''
+        bitmap = self.flags[name][n][index]
+        return bitmap if value else self.everything & ~bitmap
+
+    def attributeBitmap(self, name, values):
+        '''
+        :return: the bitmap of the signs whose attribute name has one of values
+        '''
+        index = self.attributeIndexes.get(name)
+        if index is not None:
+            if index.glosses.keys() <= set(values):
+                return self.everything
+            return self.glossBitmap(index.glossesWith(values))
+        bitmap = 0
+        bitmaps = self.attributes[name]
+        for value in values:
+            bitmap |= bitmaps.get(value, 0)
+        return bitmap
+
+    def glossBitmap(self, glosses):
+        '''
+        :return: the bitmap of the signs with these glosses
+        '''
+        ids = self.ids
+        return bitmap_from_ids(ids[gloss] for gloss in glosses)
+
+    def select(self, slotChecks=(), flagChecks=(), attributeChecks=(), known=None):
+        '''
+        :param slotChecks: for each hand in the order of HAND_NAMES, a sequence of (slot, fullmatch)
+        :param flagChecks: a sequence of (hand name, slot, isUncertain or isEstimate, value)
+        :param attributeChecks: a sequence of (attribute name, allowed values), for INDEXED_ATTRIBUTES and
+        ATTRIBUTE_INDEXES
+        :param known: a dictionary of the bitmap of each check, kept between selections that share checks, e.g.
+        the searches of analysis.batch_search, or None
+        :return: the bitmap of the signs that pass every check
+        '''
+        if known is None:
+            known = dict()
+        bitmap = self.everything
+        for name, values in attributeChecks:
+            key = ('attribute', name, values)
+            if key not in known:
+                known[key] = self.attributeBitmap(name, values)
+            bitmap &= known[key]
+            if not bitmap:
+                return 0
+        for name, checks in zip(HAND_NAMES, slotChecks):
+            for n, fullmatch in checks:
+                key = ('slot', name, n, fullmatch)
+                if key not in known:
+                    known[key] = self.slotBitmap(name, n, fullmatch)
+                bitmap &= known[key]
+                if not bitmap:
+                    return 0
+        for name, n, index, value in flagChecks:
+            bitmap &= self.flagBitmap(name, n, index, value)
+            if not bitmap:
+                return 0
+        return bitmap
+
+    def signsFromBitmap(self, bitmap):
+        '''
+        :return: a list of the signs in the bitmap, in gloss order
+        '''
+        glosses = self.glosses
+        wordlist = self.wordlist
+        return [wordlist[gloss] for gloss in sorted([glosses[n] for n in ids_from_bitmap(bitmap)])]
@@ -0,0 +1,315 @@
+import atexit
+import multiprocessing
+import pickle
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from lexicon import Corpus, CorpusIndex, CompactSign
+from slotstore import SlotStore, NUM_HANDS, ROW_SIZE
+from importer import available_cpus
+from analysis.streaming import flatten
+
+MIN_PARALLEL_SIGNS = 5000  # corpora smaller than this are always searched in the current process
+MIN_PARALLEL_TIME = 0.2  # nor are searches expected to take less than this many seconds
+RANGES_PER_PROCESS = 2
+STATE_BLOCK_ROWS = 256  # signs whose other attributes are pickled together in a snapshot
+FLAG_SIZE = 8  # bytes in the flags of one hand, see SlotStore.uncertain
+UNSHARED_ATTRIBUTES = ['_parameters', 'parameters', 'signNotes']  # not used by any search
+
+
+def release_memory(memory):
+    memory.close()
+    memory.unlink()
+
+
+class CorpusSnapshot(CorpusIndex):
+    """
+    A read-only copy of a corpus in shared memory, for searches in other processes. The slots and flags of the
+    signs are laid out as in a SlotStore, one row per sign in gloss order, followed by the symbols of the store and
+    the other attributes of the signs, pickled in blocks of STATE_BLOCK_ROWS rows so that a worker only unpickles
+    the rows it searches. Like a SlotMatrix, the snapshot keeps the gloss of each row, and is not updated in place
+    but made again the next time it is used after a word is added or removed.
+    """
+
+    def build(self, corpus):
+        self.stale = False
+        self.glosses = list()  # row: gloss
+        store = SlotStore()
+        states = list()
+        for sign in corpus:
+            self.glosses.append(sign.gloss)
+            state = CompactSign.fromSign(sign, store).compactState()
+            for name in UNSHARED_ATTRIBUTES:
+                state.pop(name, None)
+            states.append(state)
+        parts = [store.slots, store.uncertain.tobytes(), store.estimate.tobytes(),
+                 pickle.dumps(store.symbols, protocol=pickle.HIGHEST_PROTOCOL)]
+        blocks = [pickle.dumps(states[start:start+STATE_BLOCK_ROWS], protocol=pickle.HIGHEST_PROTOCOL)
+                  for start in range(0, len(states), STATE_BLOCK_ROWS)]
+        parts.extend(blocks)
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, sum(len(part) for part in parts)))
+        start = 0
+        for part in parts:
+            self.memory.buf[start:start+len(part)] = part
+            start += len(part)
+        # the shared memory lives as long as the snapshot
+        weakref.finalize(self, release_memory, self.memory)
+        self.layout = (self.memory.name, tuple(len(part) for part in parts[:4]), tuple(len(block) for block in blocks))
+
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and not self.stale
+
+    def wordAdded(self, sign, old):
+        self.stale = True
+
+    def wordRemoved(self, sign):
+        self.stale = True
+
+    def ranges(self, count):
+        '''
+        :return: a list of about count (start, stop) ranges of rows that cover all the signs
+        '''
+        rows = len(self.glosses)
+        size = max(1, -(-rows // count))
+        # every range starts at a block of pickled states, so no block is unpickled for two ranges
+        size = -(-size // STATE_BLOCK_ROWS) * STATE_BLOCK_ROWS
+        return [(start, min(start + size, rows)) for start in range(0, rows, size)]
+
+
+# in each worker process, the snapshot that was used last, as (name, symbols), and a corpus for each range of it
+# that the worker searched, which are always the same ranges, see ParallelSearcher.start
+_snapshot = None
+_corpora = dict()
+
+
+def read_snapshot(memory, layout):
+    '''
+    :return: the symbols of the slot store of a snapshot
+    '''
+    global _snapshot
+    name, sizes, blocks = layout
+    if _snapshot is None or _snapshot[0] != name:
+        _corpora.clear()
+        start = sum(sizes[:3])
+        _snapshot = (name, pickle.loads(memory.buf[start:start+sizes[3]]))
+    return _snapshot[1]
+
+
+def read_states(memory, layout, start, stop):
+    '''
+    :return: the pickled attributes of the signs in rows start to stop of a snapshot, which are unpickled from the
+    blocks that hold those rows only
+    '''
+    name, sizes, blocks = layout
+    first = start // STATE_BLOCK_ROWS
+    offset = sum(sizes) + sum(blocks[:first])
+    states = list()
+    for size in blocks[first:-(-stop // STATE_BLOCK_ROWS)]:
+        states.extend(pickle.loads(memory.buf[offset:offset+size]))
+        offset += size
+    skipped = start - first * STATE_BLOCK_ROWS
+    return states[skipped:skipped+stop-start]
+
+
+def range_corpus(layout, start, stop):
+    '''
+    :return: a Corpus of the signs in rows start to stop of a snapshot, whose rows are copied into a SlotStore of
+    its own
+    '''
+    name, sizes, blocks = layout
+    key = (name, start, stop)
+    if key in _corpora:
+        return _corpora[key]
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        symbols = read_snapshot(memory, layout)
+        states = read_states(memory, layout, start, stop)
+        buffer = memory.buf
+        uncertain = sizes[0]
+        estimate = uncertain + sizes[1]
+        flags = slice(start * NUM_HANDS * FLAG_SIZE, stop * NUM_HANDS * FLAG_SIZE)
+        store = SlotStore.fromBuffers(symbols, buffer[start*ROW_SIZE:stop*ROW_SIZE],
+                                      buffer[uncertain:estimate][flags], buffer[estimate:estimate+sizes[2]][flags])
+        del buffer
+    finally:
+        memory.close()
+    corpus = Corpus({'name': name})
+    for state in states:
+        sign = CompactSign.fromCompactState(state, store)
+        sign._row -= start
+        corpus.wordlist[sign.gloss] = sign
+    _corpora[key] = corpus
+    return corpus
+
+
+def search_range(layout, start, stop, function, args):
+    '''
+    Run in a worker process
+    :return: the rows of the signs that function finds among rows start to stop of the snapshot
+    '''
+    found = function(range_corpus(layout, start, stop), *args)
+    return [start + sign._row for sign in found]
+
+
+def query_search(corpus, query):
+    '''
+    :param query: a TranscriptionQuery
+    '''
+    return query.search(corpus)
+
+
+def nothing():
+    return None
+
+
+class ParallelSearcher:
+    """
+    Runs searches over ranges of a CorpusSnapshot in worker processes, and puts their results back together in
+    gloss order. How long each kind of search takes per sign is measured every time it runs, as is the time it
+    takes to send a task to every worker, and a search only goes to the workers if that is expected to be faster
+    than running it in the current process.
+    """
+
+    def __init__(self, processes=None, min_signs=MIN_PARALLEL_SIGNS):
+        '''
+        :param processes: the number of worker processes, defaults to the number of CPUs that are available
+        :param min_signs: corpora with fewer signs than this are always searched in the current process
+        '''
+        self.processes = processes if processes is not None else available_cpus()
+        self.minSigns = min_signs
+        self.executors = None
+        self.overhead = None  # seconds to send a task to every worker and get its result back
+        self.costs = dict()  # (module, name) of a search function: seconds per sign
+
+    def start(self):
+        if self.executors is None:
+            # the workers have to share the resource tracker of this process, or each of them would start one of its
+            # own that unlinks the shared memory of every snapshot it has read when the worker exits
+            resource_tracker.ensure_running()
+            # workers are started fresh rather than forked, so they do not inherit the threads, locks and open
+            # files of the GUI process. Each has an executor of its own, so that every range of a snapshot is sent
+            # to the same worker each time: the corpus a worker makes for a range is kept, and the workers together
+            # hold one copy of the corpus
+            context = multiprocessing.get_context('spawn')
+            self.executors = [ProcessPoolExecutor(1, mp_context=context) for process in range(self.processes)]
+            # the first tasks also start the processes, so the overhead is measured the second time
+            for n in range(2):
+                begin = time.perf_counter()
+                for future in [executor.submit(nothing) for executor in self.executors]:
+                    future.result()
+                self.overhead = time.perf_counter() - begin
+
+    def shutdown(self):
+        if self.executors is not None:
+            for executor in self.executors:
+                executor.shutdown()
+            self.executors = None
+
+    def threshold(self, function):
+        '''
+        :return: the number of signs above which function is expected to be faster in parallel, or None if that is
+        not known yet
+        '''
+        cost = self.costs.get((function.__module__, function.__name__))
+        if not cost or self.overhead is None or self.processes <= 1:
+            return None
+        return max(self.minSigns, int(self.overhead / (cost * (1 - 1 / self.processes))) + 1)
+
+    def useProcesses(self, function, size, args):
+        if self.processes <= 1 or size < self.minSigns:
+            return False
+        cost = self.costs.get((function.__module__, function.__name__))
+        if cost is None or size * cost < MIN_PARALLEL_TIME:
+            return False
+        try:
+            pickle.dumps(args)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # e.g. a lambda in the arguments
+            return False
+        self.start()
+        threshold = self.threshold(function)
+        return threshold is not None and size > threshold
+
+    def search(self, corpus, function, *args):
+        '''
+        :param function: a search function that takes a corpus and args and returns a list of signs in gloss order
+        :return: the same signs as function(corpus, *args)
+        '''
+        return flatten(self.searchBatches(corpus, function, *args))
+
+    def searchBatches(self, corpus, function, *args, call_back=None, stop_check=None):
+        '''
+        The same as search, one range of the snapshot at a time, see analysis.streaming.in_batches. A search that
+        runs in the current process is one batch.
+        '''
+        size = len(corpus.wordlist)
+        key = (function.__module__, function.__name__)
+        begin = time.perf_counter()
+        if not self.useProcesses(function, size, args):
+            results = function(corpus, *args)
+            if size:
+                self.costs[key] = (time.perf_counter() - begin) / size
+            if call_back is not None:
+                call_back(size, size)
+            if results:
+                yield results
+            return
+
+        snapshot = corpus.getIndex(CorpusSnapshot)
+        begin = time.perf_counter()
+        ranges = snapshot.ranges(self.processes * RANGES_PER_PROCESS)
+        futures = [self.executors[n % self.processes].submit(search_range, snapshot.layout, start, stop,
+                                                              function, args)
+                   for n, (start, stop) in enumerate(ranges)]
+        glosses = snapshot.glosses
+        wordlist = corpus.wordlist
+        try:
+            for (start, stop), future in zip(ranges, futures):
+                if stop_check is not None and stop_check():
+                    return
+                results = [wordlist[glosses[row]] for row in future.result()]
+                if call_back is not None:
+                    call_back(stop, size)
+                if results:
+                    yield results
+        finally:
+            for future in futures:
+                future.cancel()
+        elapsed = time.perf_counter() - begin
+        self.costs[key] = max(elapsed - self.overhead, 0.0) * self.processes / size
+
+
+searcher = None
+
+
+def shared_searcher():
+    '''
+    :return: the ParallelSearcher of this process, which is made the first time it is needed
+    '''
+    global searcher
+    if searcher is None:
+        searcher = ParallelSearcher()
+    return searcher
+
+
+def parallel_search(function, corpus, *args):
+    '''
+    Run function(corpus, *args) with the shared ParallelSearcher
+    '''
+    return shared_searcher().search(corpus, function, *args)
+
+
+def parallel_batches(function, corpus, *args, call_back=None, stop_check=None):
+    '''
+    parallel_search a batch of matches at a time, see ParallelSearcher.searchBatches
+    '''
+    return shared_searcher().searchBatches(corpus, function, *args, call_back=call_back, stop_check=stop_check)
+
+
+def shutdown():
+    if searcher is not None:
+        searcher.shutdown()
+
+
+atexit.register(shutdown)
@@ -1,5 +1,14 @@
 import regex as re
+from functools import lru_cache
 from pprint import pprint
+from lexicon import CorpusIndex
+from slotstore import HAND_NAMES
+from analysis.streaming import in_batches, flatten
+
+SPECIFICATION_CACHE_SIZE = 32
+CONFIG_GROUP = 'finger_config_specification'
+NUMBER_GROUP = 'finger_number_specification'
+ALL_LOGIC = 'All four hand/configuration specifications'
 
 def run_phonological_search(corpus, query):
     # returned object should be a list: ([words], [matched_part], [token_freq])
@@ -9,8 +18,7 @@ def run_phonological_search(corpus, query):
     match_list = tuple()
     for word in corpus:
         for config_num, hand_num in [(1, 1), (1, 2), (2, 1), (2, 2)]:
-            slots = getattr(word, 'config{}hand{}'.format(config_num, hand_num))
-            slots = ''.join([slot if slot else '_' for slot in slots])
+            slots = word.slotSummary.strings[(config_num - 1) * 2 + hand_num - 1]
             regex = re.compile(reg_expressions[config_num - 1][hand_num - 1])
             if regex.match(slots) is None:
                 break
@@ -21,9 +29,7 @@ def run_phonological_search(corpus, query):
 
 
 def check_finger_match(word, reg_exps):
-    for config_num, hand_num in [(1, 1), (1, 2), (2, 1), (2, 2)]:
-        slots = getattr(word, 'config{}hand{}'.format(config_num, hand_num))
-        slots = ''.join([slot if slot else '_' for slot in slots])
+    for slots in word.slotSummary.strings:
         for reg_exp in reg_exps:
             reg_exp = re.compile(reg_exp)
             if reg_exp.match(slots):
@@ -31,59 +37,94 @@ def check_finger_match(word, reg_exps):
     return False
 
 
-def match_specification(slots, spec):
-    finger_config_reg_exps = spec['fingerConfigRegExps']  # a set
-    finger_number_reg_exps = spec['fingerNumberRegExps']  # a set
-    relation_logic = spec['relationLogic']
-    search_mode = spec['searchMode']
-
-    for finger_config_reg_exp in finger_config_reg_exps:
-        finger_config_reg_exp = re.compile(finger_config_reg_exp)
-        if finger_config_reg_exp.match(slots):
-            match_finger_config = True
-            break
-    else:
-        match_finger_config = False
+def pattern_text(reg_exp):
+    '''
+    :param reg_exp: a regular expression, either as a string or compiled
+    '''
+    return reg_exp.pattern if hasattr(reg_exp, 'pattern') else reg_exp
+
+
+def lookahead(name, patterns):
+    '''
+    :return: a pattern that always matches the empty string, and captures group name if any of patterns matches at the
+    start of the slots
+    '''
+    alternatives = '|'.join('(?:{})'.format(pattern) for pattern in patterns)
+    return '(?:(?=(?P<{}>{}))|)'.format(name, alternatives)
 
-    for finger_number_reg_exp in finger_number_reg_exps:
-        finger_number_reg_exp = re.compile(finger_number_reg_exp)
-        if finger_number_reg_exp.match(slots):
-            match_finger_number = True
-            break
-    else:
-        match_finger_number = False
 
+def apply_relation(relation_logic, match_finger_config, match_finger_number):
     if relation_logic == 'Apply both':
-        matched = all([match_finger_config, match_finger_number])
+        return all([match_finger_config, match_finger_number])
     elif relation_logic == 'Apply either':
-        matched = any([match_finger_config, match_finger_number])
+        return any([match_finger_config, match_finger_number])
     elif relation_logic == 'Apply only the finger configuration':
-        matched = match_finger_config
+        return match_finger_config
     else:  # relation_logic == 'Apply only the number of extended fingers'
-        matched = match_finger_number
+        return match_finger_number
 
-    if search_mode == 'Positive':
-        return matched
-    else:
-        return not matched
 
+class FingerSpecification:
+    """
+    A specification of one hand for extended finger search, compiled into a single regular expression. The finger
+    configuration and finger number expressions are each joined into one alternation inside a lookahead, so one
+    match of the slots tells whether any expression of either set matches.
+    """
 
-def find_sign_type(sign):
-    c1h1 = ''.join([slot if slot else '_' for slot in sign.config1hand1])
-    c1h2 = ''.join([slot if slot else '_' for slot in sign.config1hand2])
-    c2h1 = ''.join([slot if slot else '_' for slot in sign.config2hand1])
-    c2h2 = ''.join([slot if slot else '_' for slot in sign.config2hand2])
-
-    if (c1h1 == '_______∅/______1____2____3____4___' and c2h1 == '_______∅/______1____2____3____4___')\
-            or (c1h2 == '_______∅/______1____2____3____4___' and c2h2 == '_______∅/______1____2____3____4___'):
-        typ = 'one'
-    else:
-        if c1h1 == c1h2 and c2h1 == c2h2:
-            typ = 'two-same'
-        else:
-            typ = 'two-diff'
+    def __init__(self, finger_config_patterns, finger_number_patterns, relation_logic, search_mode):
+        self.relation_logic = relation_logic
+        self.positive = search_mode == 'Positive'
+        parts = list()
+        self.groups = list()
+        # the expressions that the relation logic ignores are left out
+        if finger_config_patterns and relation_logic != 'Apply only the number of extended fingers':
+            parts.append(lookahead(CONFIG_GROUP, finger_config_patterns))
+            self.groups.append(CONFIG_GROUP)
+        if finger_number_patterns and relation_logic != 'Apply only the finger configuration':
+            parts.append(lookahead(NUMBER_GROUP, finger_number_patterns))
+            self.groups.append(NUMBER_GROUP)
+        self.regex = re.compile(''.join(parts))
+
+    def matches(self, slots):
+        '''
+        :param slots: a hand as in SlotSummary.strings
+        '''
+        match = self.regex.match(slots)
+        match_finger_config = CONFIG_GROUP in self.groups and match.group(CONFIG_GROUP) is not None
+        match_finger_number = NUMBER_GROUP in self.groups and match.group(NUMBER_GROUP) is not None
+        matched = apply_relation(self.relation_logic, match_finger_config, match_finger_number)
+        return matched if self.positive else not matched
 
-    return typ
+
+@lru_cache(maxsize=SPECIFICATION_CACHE_SIZE)
+def make_specification(*args):
+    return FingerSpecification(*args)
+
+
+def freeze_specification(spec):
+    '''
+    :param spec: a hand specification from the extended finger search dialog
+    :return: the content of the specification that matters to FingerSpecification, as a tuple of its arguments
+    '''
+    return (tuple(sorted(set(pattern_text(reg_exp) for reg_exp in spec['fingerConfigRegExps']))),
+            tuple(sorted(set(pattern_text(reg_exp) for reg_exp in spec['fingerNumberRegExps']))),
+            spec['relationLogic'], spec['searchMode'])
+
+
+def compile_specification(spec):
+    '''
+    :param spec: a hand specification from the extended finger search dialog
+    :return: a FingerSpecification, which is not compiled again for a specification with the same content
+    '''
+    return make_specification(*freeze_specification(spec))
+
+
+def match_specification(slots, spec):
+    return compile_specification(spec).matches(slots)
+
+
+def find_sign_type(sign):
+    return sign.sign_type
 
 
 def filter_logic(logic, c1h1_match, c1h2_match, c2h1_match, c2h2_match):
@@ -113,31 +154,143 @@ def filter_type(actual, desired):
     # return matched
 
 
-def extended_finger_search(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type):
+def extended_finger_matcher(c1h1, c1h2, c2h1, c2h2, logic, sign_type):
+    '''
+    :return: a function that takes a sign and returns True if it matches the extended finger search
+    '''
     # loop through the words in the corpus
     # for each word, find if each hand/configuration matches the specification
     # logic part: if "and", means that all four have to be true
     # if "or", means that only one of them has to be true
+    specs = [compile_specification(spec) for spec in [c1h1, c1h2, c2h1, c2h2]]
+    # many signs have the same hands, so each distinct hand is only matched once per specification
+    known = [dict() for spec in specs]
 
-    ret = list()
-    for word in corpus:
-        actual_type = find_sign_type(word)
+    def hand_matches(n, slots):
+        try:
+            return known[n][slots]
+        except KeyError:
+            matched = known[n][slots] = specs[n].matches(slots)
+            return matched
+
+    def matches(word):
+        if not filter_type(find_sign_type(word), sign_type):
+            return False
+
+        hands = enumerate(word.slotSummary.strings)
+        if logic == ALL_LOGIC:
+            return all(hand_matches(n, slots) for n, slots in hands)
+        else:
+            return any(hand_matches(n, slots) for n, slots in hands)
+    return matches
+
+
+def extended_finger_key(c1h1, c1h2, c2h1, c2h2, logic, sign_type):
+    '''
+    Takes the same arguments as extended_finger_search, without the corpus
+    :return: a fingerprint of the search and a test of whether one sign matches it, for a result_cache.ResultCache
+    '''
+    fingerprint = ('extended finger search', tuple(freeze_specification(spec) for spec in [c1h1, c1h2, c2h1, c2h2]),
+                   logic, frozenset(sign_type))
+    return fingerprint, extended_finger_matcher(c1h1, c1h2, c2h1, c2h2, logic, sign_type)
+
+
+def extended_finger_search(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type):
+    return flatten(extended_finger_search_batches(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type))
+
+
+def extended_finger_search_batches(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type, call_back=None, stop_check=None):
+    '''
+    extended_finger_search a batch of matches at a time, see analysis.streaming.in_batches
+    '''
+    matches = extended_finger_matcher(c1h1, c1h2, c2h1, c2h2, logic, sign_type)
+
+    def test(words):
+        return [word for word in words if matches(word)]
+
+    return in_batches(corpus, len(corpus.wordlist), test, call_back=call_back, stop_check=stop_check)
 
-        c1h1_slots = ''.join([slot if slot else '_' for slot in word.config1hand1])
-        c1h2_slots = ''.join([slot if slot else '_' for slot in word.config1hand2])
-        c2h1_slots = ''.join([slot if slot else '_' for slot in word.config2hand1])
-        c2h2_slots = ''.join([slot if slot else '_' for slot in word.config2hand2])
 
-        c1h1_match = match_specification(c1h1_slots, c1h1)
-        c1h2_match = match_specification(c1h2_slots, c1h2)
-        c2h1_match = match_specification(c2h1_slots, c2h1)
-        c2h2_match = match_specification(c2h2_slots, c2h2)
+class HandStringIndex(CorpusIndex):
+    """
+    The glosses of the signs of a corpus by each of their hands, as in SlotSummary.strings, and by their sign type.
+    Many signs have the same hands, so a specification only has to be matched once for each distinct hand. The
+    signs found are looked up in the wordlist of the corpus.
+    """
 
-        logic_matched = filter_logic(logic, c1h1_match, c1h2_match, c2h1_match, c2h2_match)
-        type_matched = filter_type(actual_type, sign_type)
+    def build(self, corpus):
+        self.entries = dict()  # gloss: the hands and the sign type of the sign
+        self.groups = [dict() for name in HAND_NAMES]  # hand: set of glosses
+        self.types = dict()  # sign type: set of glosses
+        for sign in corpus.unorderedSigns():
+            self.add(sign)
 
-        if logic_matched and type_matched:
-            ret.append(word)
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and len(self.entries) == len(corpus.wordlist)
 
-    return ret
+    def add(self, sign):
+        # what is recorded is what gets removed again, even if the sign is changed in place in the meantime
+        entry = (sign.slotSummary.strings, find_sign_type(sign))
+        self.entries[sign.gloss] = entry
+        hands, signType = entry
+        for groups, hand in zip(self.groups, hands):
+            groups.setdefault(hand, set()).add(sign.gloss)
+        self.types.setdefault(signType, set()).add(sign.gloss)
 
+    def wordAdded(self, sign, old):
+        if old is not None:
+            self.wordRemoved(old)
+        self.add(sign)
+
+    def wordRemoved(self, sign):
+        hands, signType = self.entries.pop(sign.gloss)
+        for groups, key in list(zip(self.groups, hands)) + [(self.types, signType)]:
+            glosses = groups[key]
+            glosses.discard(sign.gloss)
+            if not glosses:
+                del groups[key]
+
+    def matching(self, h, specification, matched=None):
+        '''
+        :param h: the position of the hand in HAND_NAMES
+        :param specification: a FingerSpecification
+        :param matched: a dictionary of hands to whether they match specification, kept between calls, or None
+        :return: the set of glosses of the signs whose hand h matches
+        '''
+        if matched is None:
+            matched = dict()
+        found = set()
+        for hand, glosses in self.groups[h].items():
+            if hand not in matched:
+                matched[hand] = specification.matches(hand)
+            if matched[hand]:
+                found |= glosses
+        return found
+
+
+def extended_finger_search_shared(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type, known=None):
+    '''
+    extended_finger_search for analysis.batch_search, which looks up the hands of the signs in a HandStringIndex
+    :param known: a dictionary of the glosses whose hands match each specification, kept between searches that
+    share specifications, or None
+    '''
+    if known is None:
+        known = dict()
+    index = corpus.getIndex(HandStringIndex)
+    found = None
+    for h, spec in enumerate([c1h1, c1h2, c2h1, c2h2]):
+        # the same specification is often given for several hands, e.g. one that any hand matches
+        frozen = freeze_specification(spec)
+        key = ('extended fingers', h, frozen)
+        if key not in known:
+            matched = known.setdefault(('extended finger hands', frozen), dict())
+            known[key] = index.matching(h, compile_specification(spec), matched)
+        if found is None:
+            found = set(known[key])
+        elif logic == ALL_LOGIC:
+            found &= known[key]
+        else:
+            found |= known[key]
+    found &= set().union(*[glosses for signType, glosses in index.types.items() if filter_type(signType, sign_type)])
+    wordlist = corpus.wordlist
+    return [wordlist[gloss] for gloss in sorted(found)]
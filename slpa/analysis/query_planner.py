@@ -0,0 +1,132 @@
+import itertools
+from collections import Counter
+from lexicon import CorpusIndex
+from constants import GLOBAL_OPTIONS
+
+DEFAULT_SELECTIVITY = 0.5  # the fraction of signs assumed to pass a predicate that there are no statistics for
+MIN_REJECTION = 1e-6
+CHUNK_SIZE = 1024
+
+
+class CorpusStatistics(CorpusIndex):
+    """
+    How often each global option, hand type and config type occurs in a corpus. Searches use these to guess how
+    many signs each of their predicates lets through. Signs that are edited in place, without being added to the
+    corpus again, are not counted again, which only makes the guesses a little less accurate.
+    """
+
+    def build(self, corpus):
+        self.size = 0
+        self.options = Counter()
+        self.types = Counter()
+        for sign in corpus.unorderedSigns():
+            self.count(sign, 1)
+
+    def count(self, sign, n):
+        self.size += n
+        for option in GLOBAL_OPTIONS:
+            if getattr(sign, option):
+                self.options[option] += n
+        self.types['config_type', sign.config_type] += n
+        self.types['hand_type', sign.hand_type] += n
+
+    def wordAdded(self, sign, old):
+        if old is not None:
+            self.wordRemoved(old)
+        self.count(sign, 1)
+
+    def wordRemoved(self, sign):
+        self.count(sign, -1)
+
+    def fraction(self, count):
+        return count / self.size if self.size else 1.0
+
+    def optionSelectivity(self, option, value):
+        selected = self.fraction(self.options[option])
+        return selected if value else 1.0 - selected
+
+    def typeSelectivity(self, kind, value):
+        return self.fraction(self.types[kind, value])
+
+
+class Predicate:
+    """
+    One of the tests that a sign has to pass to be found by a search
+    """
+
+    def __init__(self, name, test, cost=1, selectivity=None):
+        '''
+        :param name: shown in QueryPlan.report
+        :param test: a function that takes a sign and returns True if it passes
+        :param cost: roughly how long test takes, relative to looking up one attribute of a sign
+        :param selectivity: a function that takes CorpusStatistics and returns the fraction of signs that are
+        expected to pass, or None if there is no way to tell
+        '''
+        self.name = name
+        self.test = test
+        self.cost = cost
+        self.selectivity = selectivity
+
+    def estimate(self, statistics):
+        if self.selectivity is None or statistics is None:
+            return DEFAULT_SELECTIVITY
+        return self.selectivity(statistics)
+
+
+class QueryPlan:
+    """
+    A list of predicates in the order they are evaluated. A sign is only tested by a predicate if it passed all
+    the ones before, so cheap predicates that reject many signs go first: predicates are sorted by their cost
+    divided by the fraction of signs they are expected to reject. The number of signs that each predicate rejected
+    is counted, see report.
+    """
+
+    def __init__(self, predicates, statistics=None):
+        estimates = [(predicate, predicate.estimate(statistics)) for predicate in predicates]
+        estimates.sort(key=lambda item: item[0].cost / max(1.0 - item[1], MIN_REJECTION))
+        self.predicates = [predicate for predicate, selectivity in estimates]
+        self.selectivities = [selectivity for predicate, selectivity in estimates]
+        self.checked = 0
+        self.rejected = [0] * len(self.predicates)
+
+    def run(self, signs, chunk_size=CHUNK_SIZE):
+        '''
+        :param signs: an iterable of signs
+        :param chunk_size: signs are tested this many at a time. Each predicate filters the whole chunk before the
+        next one is tried, which costs less than trying every predicate on one sign after the other
+        :return: an iterator of the signs that pass every predicate, in the order they were given
+        '''
+        tests = [predicate.test for predicate in self.predicates]
+        rejected = self.rejected
+        signs = iter(signs)
+        while True:
+            chunk = list(itertools.islice(signs, chunk_size))
+            if not chunk:
+                return
+            self.checked += len(chunk)
+            for n, test in enumerate(tests):
+                size = len(chunk)
+                chunk = [sign for sign in chunk if test(sign)]
+                rejected[n] += size - len(chunk)
+                if not chunk:
+                    break
+            yield from chunk
+
+    def rejections(self):
+        '''
+        :return: a dictionary of predicate names to the number of signs they rejected
+        '''
+        return {predicate.name: rejected for predicate, rejected in zip(self.predicates, self.rejected)}
+
+    def report(self):
+        '''
+        :return: a table of the predicates in the order they were evaluated, with the fraction of signs each was
+        expected to pass, the number of signs it tested, and the number it rejected
+        '''
+        lines = ['{:<24}{:>10}{:>10}{:>10}'.format('predicate', 'expected', 'tested', 'rejected')]
+        tested = self.checked
+        for predicate, selectivity, rejected in zip(self.predicates, self.selectivities, self.rejected):
+            lines.append('{:<24}{:>10.3f}{:>10}{:>10}'.format(predicate.name, selectivity, tested, rejected))
+            tested -= rejected
+        lines.append('{:<24}{:>10}{:>10}'.format('found', '', tested))
+        return '\n'.join(lines)
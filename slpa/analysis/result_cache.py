@@ -0,0 +1,205 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from lexicon import CorpusIndex
+from analysis.transcription_search import transcription_key, query_key
+from analysis.handshape_search import handshape_key
+from analysis.phonological_search import extended_finger_key
+
+RESULT_CACHE_SIZE = 128  # searches whose results are kept
+RESULT_CACHE_SIGNS = 500000  # glosses kept over all the searches, each is a reference to the gloss of a sign
+
+# the name of each search function to a function that takes its arguments, without the corpus, and returns a
+# fingerprint of the search and a test of whether one sign matches it
+SEARCH_KEYS = {'transcription_search': transcription_key,
+               'handshape_search': handshape_key,
+               'extended_finger_search': extended_finger_key}
+
+
+class CachedResult:
+    """
+    The glosses that a search found, in gloss order, the revision of the corpus they were found in, and a test of
+    whether one sign matches the search, or None if there is no such test
+    """
+
+    def __init__(self, glosses, revision, test):
+        self.glosses = glosses
+        self.revision = revision
+        self.test = test
+
+    def __contains__(self, gloss):
+        n = bisect_left(self.glosses, gloss)
+        return n < len(self.glosses) and self.glosses[n] == gloss
+
+
+class ResultCache(CorpusIndex):
+    """
+    The results of recent searches of a corpus, by a fingerprint of their arguments, least recently used first.
+    A result is only given back if the corpus has not changed since it was found, as told by Corpus.revision.
+    When a word is added or removed, results that it makes no difference to are kept for the new revision and the
+    others are thrown away, which takes a test of whether one sign matches the search. Results without a test are
+    thrown away by every change.
+    """
+
+    def __init__(self, corpus, max_results=RESULT_CACHE_SIZE, max_signs=RESULT_CACHE_SIGNS):
+        self.maxResults = max_results
+        self.maxSigns = max_signs
+        super().__init__(corpus)
+
+    def build(self, corpus):
+        self.results = OrderedDict()  # fingerprint: CachedResult
+        self.size = 0  # the number of glosses in all the results
+        self.revision = corpus.revision
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, corpus, fingerprint):
+        '''
+        :return: the signs found by the search with this fingerprint, or None if they are not known for the current
+        revision of the corpus
+        '''
+        result = self.results.get(fingerprint)
+        if result is None or result.revision != corpus.revision:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(fingerprint)
+        wordlist = corpus.wordlist
+        return [wordlist[gloss] for gloss in result.glosses]
+
+    def store(self, fingerprint, revision, signs, test=None):
+        '''
+        :param revision: the revision of the corpus when the search started, the result is not kept if the corpus
+        has changed since then
+        :param signs: the signs that the search found, in gloss order
+        '''
+        if revision != self.revision or len(signs) > self.maxSigns:
+            return
+        self.discard(fingerprint)
+        self.results[fingerprint] = CachedResult(tuple(sign.gloss for sign in signs), revision, test)
+        self.size += len(signs)
+        while len(self.results) > self.maxResults or self.size > self.maxSigns:
+            fingerprint, result = self.results.popitem(last=False)
+            self.size -= len(result.glosses)
+
+    def discard(self, fingerprint):
+        result = self.results.pop(fingerprint, None)
+        if result is not None:
+            self.size -= len(result.glosses)
+
+    def changed(self, affects):
+        '''
+        :param affects: a function that takes a CachedResult and returns True if the change makes a difference to it
+        '''
+        # the corpus counts every word that it adds or removes, and tells every index about it, so this keeps up
+        self.revision += 1
+        for fingerprint, result in list(self.results.items()):
+            if result.test is None or affects(result):
+                self.discard(fingerprint)
+            else:
+                result.revision = self.revision
+
+    def wordAdded(self, sign, old):
+        self.changed(lambda result: (old is not None and old.gloss in result) != bool(result.test(sign)))
+
+    def wordRemoved(self, sign):
+        self.changed(lambda result: sign.gloss in result)
+
+
+def fingerprint_is_usable(fingerprint):
+    try:
+        hash(fingerprint)
+    except TypeError:
+        # e.g. a list in the arguments, the search is then not cached
+        return False
+    return True
+
+
+def cached_search(corpus, fingerprint, search, test=None):
+    '''
+    :param fingerprint: a hashable description of the search, which is the same for searches that find the same signs
+    :param search: a function without arguments that runs the search and returns a list of signs in gloss order
+    :param test: a function that takes a sign and returns True if the search finds it, see ResultCache
+    :return: the signs found by the search, from the ResultCache of the corpus if it has them
+    '''
+    if not fingerprint_is_usable(fingerprint):
+        return search()
+    cache = corpus.getIndex(ResultCache)
+    results = cache.lookup(corpus, fingerprint)
+    if results is None:
+        revision = corpus.revision
+        results = search()
+        cache.store(fingerprint, revision, results, test)
+    return results
+
+
+def cached_batches(corpus, fingerprint, batches, test=None, call_back=None, stop_check=None):
+    '''
+    The same as cached_search for a search that finds its signs a batch at a time, see analysis.streaming. A result
+    from the cache is one batch, and a search that is stopped before the end is not kept.
+    :param batches: a function that takes call_back and stop_check and returns an iterator of lists of signs
+    '''
+    if not fingerprint_is_usable(fingerprint):
+        yield from batches(call_back=call_back, stop_check=stop_check)
+        return
+    cache = corpus.getIndex(ResultCache)
+    results = cache.lookup(corpus, fingerprint)
+    if results is not None:
+        if call_back is not None:
+            call_back(len(corpus.wordlist), len(corpus.wordlist))
+        if results:
+            yield results
+        return
+    revision = corpus.revision
+    results = list()
+    for batch in batches(call_back=call_back, stop_check=stop_check):
+        results.extend(batch)
+        yield batch
+    if stop_check is None or not stop_check():
+        cache.store(fingerprint, revision, results, test)
+
+
+def cached_function(function, search):
+    '''
+    :param function: transcription_search, handshape_search or extended_finger_search from analysis, which decides
+    the fingerprint of the search
+    :param search: a function with the same arguments and results as function, e.g. for another backend
+    :return: search, with its results kept in the ResultCache of the corpus
+    '''
+    key = SEARCH_KEYS[function.__name__]
+
+    def cached(corpus, *args, **kwargs):
+        fingerprint, test = key(*args, **kwargs)
+        return cached_search(corpus, fingerprint, lambda: search(corpus, *args, **kwargs), test)
+    return cached
+
+
+def cached_stream(function, batches):
+    '''
+    cached_function for a search that finds its signs a batch at a time, such as the ones from
+    analysis.vectorized.stream_function
+    '''
+    key = SEARCH_KEYS[function.__name__]
+
+    def cached(corpus, *args, call_back=None, stop_check=None, **kwargs):
+        fingerprint, test = key(*args, **kwargs)
+        return cached_batches(corpus, fingerprint, lambda **progress: batches(corpus, *args, **kwargs, **progress),
+                              test, call_back, stop_check)
+    return cached
+
+
+def cached_query(corpus, query, search):
+    '''
+    :param query: a TranscriptionQuery
+    :param search: a function that takes the corpus and the query and returns the signs that match it
+    '''
+    fingerprint, test = query_key(query)
+    return cached_search(corpus, fingerprint, lambda: search(corpus, query), test)
+
+
+def cached_query_batches(corpus, query, batches, call_back=None, stop_check=None):
+    '''
+    cached_query for a search that finds its signs a batch at a time
+    '''
+    fingerprint, test = query_key(query)
+    return cached_batches(corpus, fingerprint, lambda **progress: batches(corpus, query, **progress), test,
+                          call_back, stop_check)
@@ -0,0 +1,197 @@
+from heapq import nsmallest
+try:
+    import numpy as np
+except ImportError:
+    #NumPy is optional, SimilarityIndex compares one hand at a time without it
+    np = None
+from lexicon import CorpusIndex
+from handshapes import Fingers
+from slotstore import HAND_NAMES
+from analysis.handshape_classifier import FIELDS, symbol_distance
+
+SIMILAR_SIGNS = 10  # the number of signs returned by a similarity search unless asked for another number
+CONTACT_SLOT = 3  # the slot of the thumb that says whether it touches the fingers, see Fingers.contact
+DECIMALS = 9  # distances are rounded to this many decimals, so that sums in another order still tie
+
+
+def field_slots():
+    '''
+    :return: a dictionary of members of handshapes.Fingers to their slots, from 2 to 34, with the contact slot of
+    the thumb as a field of its own
+    '''
+    fields = {finger.num: finger for finger in Fingers}
+    slots = {fields[field]: [slot for slot in fieldSlots if slot != CONTACT_SLOT]
+             for field, fieldSlots in FIELDS.items()}
+    slots[Fingers.contact] = [CONTACT_SLOT]
+    return slots
+
+
+FIELD_SLOTS = field_slots()  # the slots of SlotSummary.filled in each field that has a weight of its own
+FIRST_SLOT = min(min(slots) for slots in FIELD_SLOTS.values())
+HAND_SIZE = sum(len(slots) for slots in FIELD_SLOTS.values())
+
+
+def slot_weights(weights=None, slots=None):
+    '''
+    :param weights: a dictionary of members of handshapes.Fingers, or their names, to the weight of the slots of
+    that field, which is 1 for fields that are not given
+    :param slots: a dictionary of slot numbers, from 2 to 34, to weights that take the place of the weight of their
+    field
+    :return: the weight of each slot of SlotSummary.filled
+    '''
+    weights = {Fingers[field] if isinstance(field, str) else field: weight
+               for field, weight in (weights or dict()).items()}
+    slotWeights = [1.0] * HAND_SIZE
+    for field, fieldSlots in FIELD_SLOTS.items():
+        for slot in fieldSlots:
+            slotWeights[slot - FIRST_SLOT] = float(weights.get(field, 1.0))
+    for slot, weight in (slots or dict()).items():
+        slotWeights[slot - FIRST_SLOT] = float(weight)
+    return tuple(slotWeights)
+
+
+class SimilarityIndex(CorpusIndex):
+    """
+    The hands of every sign of a corpus, for finding the signs closest to a transcription. The distance between two
+    signs is the sum over their four hands and the slots of each hand of the distance between the symbols, as in
+    analysis.handshape_classifier.symbol_distance, times the weight of the slot.
+    Few signs have a hand of their own, and fewer hands have a finger of their own, so the index keeps the distinct
+    values of each field, the distinct hands as the code of their value of each field, and the signs as the code of
+    each of their hands. A query is worked out once per field value, then summed for each distinct hand and then for
+    each sign, with NumPy if it is available. Like a SlotMatrix, the index keeps glosses rather than signs and is
+    made again after a word is added or removed.
+    """
+
+    def build(self, corpus):
+        self.stale = False
+        self.glosses = list()  # row: gloss, in gloss order
+        self.fields = [[slot - FIRST_SLOT for slot in slots] for slots in FIELD_SLOTS.values()]
+        hands = dict()
+        self.handCodes = list()  # sign: the distinct hand at each of HAND_NAMES
+        for sign in corpus:
+            self.glosses.append(sign.gloss)
+            self.handCodes.append([hands.setdefault(hand, len(hands)) for hand in sign.slotSummary.filled])
+        self.rows = {gloss: n for n, gloss in enumerate(self.glosses)}
+        values = [dict() for field in self.fields]  # field: value of its slots: code
+        self.fieldCodes = [[fieldValues.setdefault(tuple(hand[n] for n in field), len(fieldValues))
+                            for field, fieldValues in zip(self.fields, values)]
+                           for hand in hands]  # distinct hand: the code of the value of each field
+        self.symbols = sorted({symbol for fieldValues in values for value in fieldValues for symbol in value})
+        codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+        # field: value: the symbol code of each of its slots
+        self.values = [[[codes[symbol] for symbol in value] for value in fieldValues] for fieldValues in values]
+        if np is not None:
+            self.handCodes = np.array(self.handCodes, dtype=np.intp).reshape(-1, len(HAND_NAMES))
+            self.fieldCodes = np.array(self.fieldCodes, dtype=np.intp).reshape(-1, len(self.fields))
+            self.values = [np.array(fieldValues, dtype=np.intp).reshape(-1, len(field))
+                           for field, fieldValues in zip(self.fields, self.values)]
+
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and not self.stale
+
+    def wordAdded(self, sign, old):
+        self.stale = True
+
+    def wordRemoved(self, sign):
+        self.stale = True
+
+    def fieldDistances(self, hand, weights):
+        '''
+        :return: for each field, the weighted distance from the value of the field in hand to each of its values in
+        the corpus
+        '''
+        distances = list()
+        for field, values in zip(self.fields, self.values):
+            # the distance from the symbol of each slot to every symbol in the corpus, for the slots with a weight
+            tables = [(position, [weights[n] * symbol_distance(hand[n], other) for other in self.symbols])
+                      for position, n in enumerate(field) if weights[n]]
+            if np is not None:
+                fieldDistances = np.zeros(len(values))
+                for position, table in tables:
+                    fieldDistances += np.array(table)[values[:, position]]
+                distances.append(fieldDistances)
+            else:
+                distances.append([sum(table[value[position]] for position, table in tables) for value in values])
+        return distances
+
+    def handDistances(self, hand, weights):
+        '''
+        :param hand: slots 2 to 34 of a hand, as in SlotSummary.filled
+        :return: the distance from the hand to each distinct hand of the corpus
+        '''
+        fieldDistances = self.fieldDistances(hand, weights)
+        if np is not None:
+            distances = np.zeros(len(self.fieldCodes))
+            for f, fieldDistance in enumerate(fieldDistances):
+                distances += fieldDistance[self.fieldCodes[:, f]]
+            return distances
+        return [sum(fieldDistance[code] for fieldDistance, code in zip(fieldDistances, codes))
+                for codes in self.fieldCodes]
+
+    def distances(self, hands, weights):
+        '''
+        :param hands: the four hands of the query, in the order of HAND_NAMES
+        :param weights: the weight of each slot, see slot_weights
+        :return: the distance from the query to each sign, in gloss order
+        '''
+        known = dict()
+        for hand in hands:
+            if hand not in known:
+                known[hand] = self.handDistances(hand, weights)
+        if np is not None:
+            total = np.zeros(len(self.glosses))
+            for h, hand in enumerate(hands):
+                total += known[hand][self.handCodes[:, h]]
+            return np.round(total, DECIMALS)
+        perHand = [known[hand] for hand in hands]
+        return [round(sum(distances[code] for distances, code in zip(perHand, codes)), DECIMALS)
+                for codes in self.handCodes]
+
+    def nearest(self, hands, k=SIMILAR_SIGNS, weights=None, exclude=None):
+        '''
+        :param exclude: a gloss that is left out of the results, e.g. that of the sign the query comes from
+        :return: a list of (sign, distance) of the k signs closest to the query, closest first and in gloss order
+        for the same distance
+        '''
+        if weights is None:
+            weights = slot_weights()
+        distances = self.distances(hands, weights)
+        skip = self.rows.get(exclude)
+        glosses = self.glosses
+        wordlist = self.wordlist
+        if np is None:
+            rows = (n for n in range(len(glosses)) if n != skip)
+            closest = nsmallest(k, rows, key=lambda n: (distances[n], n))
+            return [(wordlist[glosses[n]], distances[n]) for n in closest]
+        if skip is not None:
+            distances[skip] = np.inf
+        count = min(k, len(glosses) - (skip is not None))
+        if count <= 0:
+            return list()
+        # every sign as close as the kth closest, ordered by distance and then by row, which is gloss order
+        limit = np.partition(distances, count - 1)[count - 1]
+        candidates = np.flatnonzero(distances <= limit)
+        closest = candidates[np.lexsort((candidates, distances[candidates]))][:count]
+        return [(wordlist[glosses[n]], float(distances[n])) for n in closest]
+
+
+def similar_signs(corpus, sign, k=SIMILAR_SIGNS, weights=None, slots=None):
+    '''
+    :param sign: a Sign, which need not be in the corpus, to compare the signs of the corpus to
+    :param weights: the weight of each field, see slot_weights
+    :param slots: the weight of single slots, see slot_weights
+    :return: a list of (sign, distance) of the k signs of the corpus closest to sign, not counting sign itself
+    '''
+    index = corpus.getIndex(SimilarityIndex)
+    return index.nearest(sign.slotSummary.filled, k, slot_weights(weights, slots), exclude=sign.gloss)
+
+
+def similar_signs_batches(corpus, sign, k=SIMILAR_SIGNS, weights=None, slots=None, call_back=None, stop_check=None):
+    '''
+    similar_signs as one batch, for the searches in analysis.streaming and the function windows
+    '''
+    results = similar_signs(corpus, sign, k, weights, slots)
+    if call_back is not None:
+        call_back(len(corpus.wordlist), len(corpus.wordlist))
+    if results:
+        yield results
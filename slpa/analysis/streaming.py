@@ -0,0 +1,38 @@
+import itertools
+
+SEARCH_BATCH_SIZE = 1000  # signs tested between progress reports and checks for a request to stop
+
+
+def in_batches(candidates, total, test, batch_size=SEARCH_BATCH_SIZE, call_back=None, stop_check=None):
+    '''
+    Test candidates for a search a batch at a time, so that matches can be shown before the search is over
+    :param candidates: an iterable of signs, in the order the results should be in
+    :param total: the number of candidates, or an estimate of it, for progress
+    :param test: a function that takes a list of signs and returns a list of those that match
+    :param call_back: called after each batch with the number of candidates tested so far and total
+    :param stop_check: called before each batch, the search stops if it returns True
+    :return: an iterator of the lists of matches of each batch that has any
+    '''
+    candidates = iter(candidates)
+    done = 0
+    while True:
+        if stop_check is not None and stop_check():
+            return
+        batch = list(itertools.islice(candidates, batch_size))
+        if not batch:
+            break
+        done += len(batch)
+        found = test(batch)
+        if call_back is not None:
+            call_back(min(done, total), total)
+        if found:
+            yield found
+    if call_back is not None:
+        call_back(total, total)
+
+
+def flatten(batches):
+    '''
+    :return: a list of the matches of every batch
+    '''
+    return list(itertools.chain.from_iterable(batches))
@@ -1,80 +1,30 @@
 import re
-from constants import RE_SYMBOLS
+from functools import lru_cache
+from operator import attrgetter
+from constants import RE_SYMBOLS, GLOBAL_OPTIONS
+from slotstore import HAND_NAMES
+from lexicon import FrequencyIndex
+from analysis.query_planner import Predicate, QueryPlan, CorpusStatistics
+from analysis.inverted_index import SlotIndex
+from analysis.streaming import SEARCH_BATCH_SIZE, in_batches
 from pprint import pprint
 
-
-def match_flag(sign_list, search_list):
-    search = list()
-    for flag in search_list:
-        if flag == 1:  #True
-            search.append({True})
-        elif flag == -1:  # False
-            search.append({False})
-        else:  # Either
-            search.append({True, False})
-
-    for sign_flag, search_flags in zip(sign_list, search):
-        if sign_flag not in search_flags:
-            return False
-    else:
-        return True
-
-
-def check_estimate_flag(sign, config1, config2):
-    # word.flags['config1hand1'][0][0] is isUncertain
-    # word.flags['config1hand1'][0][1] is isEstimate
-    c1h1 = config1[0]  # a tuple of dictionary
-    c1h2 = config1[1]
-    c2h1 = config2[0]
-    c2h2 = config2[1]
-
-    sign_c1h1_estimate = [sign.flags['config1hand1'][i][1] for i in range(1, 34)]
-    sign_c1h2_estimate = [sign.flags['config1hand2'][i][1] for i in range(1, 34)]
-    sign_c2h1_estimate = [sign.flags['config2hand1'][i][1] for i in range(1, 34)]
-    sign_c2h2_estimate = [sign.flags['config2hand2'][i][1] for i in range(1, 34)]
-
-    search_c1h1_estimate = [slot['flag_estimate'] for slot in c1h1]
-    search_c1h2_estimate = [slot['flag_estimate'] for slot in c1h2]
-    search_c2h1_estimate = [slot['flag_estimate'] for slot in c2h1]
-    search_c2h2_estimate = [slot['flag_estimate'] for slot in c2h2]
-
-    return all([match_flag(sign_c1h1_estimate, search_c1h1_estimate),
-                match_flag(sign_c1h2_estimate, search_c1h2_estimate),
-                match_flag(sign_c2h1_estimate, search_c2h1_estimate),
-                match_flag(sign_c2h2_estimate, search_c2h2_estimate)])
-
-
-def check_uncertain_flag(sign, config1, config2):
-    # word.flags['config1hand1'][0][0] is isUncertain
-    # word.flags['config1hand1'][0][1] is isEstimate
-    c1h1 = config1[0]  # a tuple of dictionary
-    c1h2 = config1[1]
-    c2h1 = config2[0]
-    c2h2 = config2[1]
-
-    sign_c1h1_estimate = [sign.flags['config1hand1'][i][0] for i in range(1, 34)]
-    sign_c1h2_estimate = [sign.flags['config1hand2'][i][0] for i in range(1, 34)]
-    sign_c2h1_estimate = [sign.flags['config2hand1'][i][0] for i in range(1, 34)]
-    sign_c2h2_estimate = [sign.flags['config2hand2'][i][0] for i in range(1, 34)]
-
-    search_c1h1_estimate = [slot['flag_uncertain'] for slot in c1h1]
-    search_c1h2_estimate = [slot['flag_uncertain'] for slot in c1h2]
-    search_c2h1_estimate = [slot['flag_uncertain'] for slot in c2h1]
-    search_c2h2_estimate = [slot['flag_uncertain'] for slot in c2h2]
-
-    return all([match_flag(sign_c1h1_estimate, search_c1h1_estimate),
-                match_flag(sign_c1h2_estimate, search_c1h2_estimate),
-                match_flag(sign_c2h1_estimate, search_c2h1_estimate),
-                match_flag(sign_c2h2_estimate, search_c2h2_estimate)])
+QUERY_CACHE_SIZE = 32  # compiled queries kept for repeated and recent searches
+ANY_SYMBOL = r'.+'
+OPTION_VALUES = {'Yes': True, 'No': False}
+FLAG_VALUES = {1: True, -1: False}
+# the cost of checking one flag or slot, relative to looking up one attribute of a sign, see analysis.query_planner
+FLAG_COST = 2
+SLOT_COST = 4
+TYPE_COST = 3  # hand and config types are looked up through Sign.slotSummary
+# a frequency range that lets through at most this fraction of the corpus is looked up in its FrequencyIndex, wider
+# ranges are checked on the signs that match everything else
+FREQUENCY_LOOKUP_SHARE = 0.5
 
 
 def check_config_type(sign, config):
     if config == 'Either':
         return True
-    if not hasattr(sign, 'config_type'):
-        sign.determine_config_type()
-    #typ = sign.hand_type
-    #typ = find_config_type(sign)
     return sign.config_type == config[:3].lower()
 
 
@@ -96,11 +46,6 @@ def check_config_type(sign, config):
 def check_hand_type(sign, hand):
     if hand == 'Either':
         return True
-    if not hasattr(sign, 'hand_type'):
-        sign.determine_hand_type()
-    #typ = sign.hand_type
-    #typ = find_hand_type(sign)
-
     return sign.hand_type == hand[:3].lower()
 
 
@@ -135,42 +80,6 @@ def check_global_options(sign, options):
     return ret
 
 
-def check_slot_symbol(word, config1, config2):
-    c1h1 = config1[0]  # a tuple of dictionary
-    c1h2 = config1[1]
-    c2h1 = config2[0]
-    c2h2 = config2[1]
-
-    c1h1_slots = '.'.join([slot if slot else '_' for slot in word.config1hand1[1:]])
-    c1h2_slots = '.'.join([slot if slot else '_' for slot in word.config1hand2[1:]])
-    c2h1_slots = '.'.join([slot if slot else '_' for slot in word.config2hand1[1:]])
-    c2h2_slots = '.'.join([slot if slot else '_' for slot in word.config2hand2[1:]])
-
-    re_c1h1 = re.compile('^' + generate_hand_re(c1h1) + '$')
-    re_c1h2 = re.compile('^' + generate_hand_re(c1h2) + '$')
-    re_c2h1 = re.compile('^' + generate_hand_re(c2h1) + '$')
-    re_c2h2 = re.compile('^' + generate_hand_re(c2h2) + '$')
-
-    #print('====================')
-    #print(c1h1_slots)
-    #print(re_c1h1)
-    #print('====================')
-    #print(c1h2_slots)
-    #print(re_c1h2)
-    #print('====================')
-    #print(c2h1_slots)
-    #print(re_c2h1)
-    #print('====================')
-    #print(c2h2_slots)
-    #print(re_c2h2)
-    #print('====================')
-
-    return all([bool(re_c1h1.match(c1h1_slots)),
-                bool(re_c1h2.match(c1h2_slots)),
-                bool(re_c2h1.match(c2h1_slots)),
-                bool(re_c2h2.match(c2h2_slots))])
-
-
 def generate_slot_re(allowed_set):
     pattern = '(?:' + '|'.join([RE_SYMBOLS[s] if s in RE_SYMBOLS else s for s in allowed_set]) + ')'
     return pattern
@@ -189,6 +98,227 @@ def check_lastUpdated(sign, lastUpdateds):
     return sign.lastUpdated in lastUpdateds
 
 
+def freeze_hand(hand_slots):
+    '''
+    :param hand_slots: a list of 33 dictionaries, one for each of slots 2 to 34, as made by TransConfigTab
+    :return: the same information as a tuple, so that it can be part of the key of the query cache
+    '''
+    return tuple((slot['flag_estimate'], slot['flag_uncertain'], frozenset(slot['allowed'])) for slot in hand_slots)
+
+
+def compile_slot(allowed):
+    '''
+    :param allowed: a set of symbols or regular expressions
+    :return: None if the slot may hold anything, otherwise the fullmatch method of a compiled pattern
+    '''
+    if ANY_SYMBOL in allowed:
+        # every slot holds at least one character, empty slots are '_'
+        return None
+    return re.compile(generate_slot_re(sorted(allowed))).fullmatch
+
+
+def attribute_test(name, value):
+    get = attrgetter(name)
+    return lambda sign: get(sign) == value
+
+
+def range_test(name, minimum, maximum):
+    get = attrgetter(name)
+    return lambda sign: minimum <= get(sign) <= maximum
+
+
+def membership_test(name, values):
+    get = attrgetter(name)
+    return lambda sign: get(sign) in values
+
+
+def slot_test(n, slotChecks):
+    def test(sign):
+        slots = sign.slotSummary.filled[n]
+        for slot, fullmatch in slotChecks:
+            if fullmatch(slots[slot]) is None:
+                return False
+        return True
+    return test
+
+
+class TranscriptionQuery:
+    """
+    The arguments of transcription_search, compiled once so that they can be tested against any number of signs.
+    Queries are made by compile_query, which keeps the most recent ones, and a query can be kept and run again on
+    any corpus.
+    Matching a whole hand against one long regular expression made of 33 slots joined with dots backtracks very
+    badly whenever a slot allows anything, so every slot is matched against its own pattern instead. No symbol
+    contains a '.', which makes the two equivalent.
+    Each part of the query is a Predicate, and a search evaluates them in the order chosen by a QueryPlan, which
+    searchWithPlan returns to see which predicates rejected the most signs. A query is shared by every search that
+    compiles the same arguments, so it keeps nothing about any one search.
+    """
+
+    def __init__(self, forearm, estimated, uncertain, incomplete, configuration, hand, frequency_range,
+                 config1, config2, coders, lastUpdateds):
+        # config1 and config2 are pairs of hands made by freeze_hand
+        self.arguments = (forearm, estimated, uncertain, incomplete, configuration, hand, frequency_range,
+                          config1, config2, coders, lastUpdateds)
+        self.options = tuple((name, OPTION_VALUES[value])
+                             for name, value in zip(GLOBAL_OPTIONS, [forearm, estimated, uncertain, incomplete])
+                             if value in OPTION_VALUES)
+        self.config_type = None if configuration == 'Either' else configuration[:3].lower()
+        self.hand_type = None if hand == 'Either' else hand[:3].lower()
+        self.frequency_range = frequency_range
+        self.coders = coders
+        self.lastUpdateds = lastUpdateds
+
+        # only the slots whose flags are not 'Either' are checked, as (hand, slot, isUncertain or isEstimate, value)
+        self.flagChecks = list()
+        # and only the slots that do not allow anything, as (slot, fullmatch), for each hand in turn
+        self.slotChecks = list()
+        for name, hand_slots in zip(HAND_NAMES, config1 + config2):
+            slotChecks = list()
+            for n, (flag_estimate, flag_uncertain, allowed) in enumerate(hand_slots):
+                if flag_uncertain in FLAG_VALUES:
+                    self.flagChecks.append((name, n + 1, 0, FLAG_VALUES[flag_uncertain]))
+                if flag_estimate in FLAG_VALUES:
+                    self.flagChecks.append((name, n + 1, 1, FLAG_VALUES[flag_estimate]))
+                fullmatch = compile_slot(allowed)
+                if fullmatch is not None:
+                    slotChecks.append((n, fullmatch))
+            self.slotChecks.append(tuple(slotChecks))
+        self.flagChecks = tuple(self.flagChecks)
+        self.slotChecks = tuple(self.slotChecks)
+        # everything else that a SlotIndex can look up, as (attribute, allowed values)
+        self.attributeChecks = [(name, (value,)) for name, value in self.options]
+        for name, value in [('config_type', self.config_type), ('hand_type', self.hand_type)]:
+            if value is not None:
+                self.attributeChecks.append((name, (value,)))
+        if self.coders is not None:
+            self.attributeChecks.append(('coder', self.coders))
+        if self.lastUpdateds is not None:
+            self.attributeChecks.append(('lastUpdated', self.lastUpdateds))
+        self.attributeChecks = tuple(self.attributeChecks)
+        self.makePredicates()
+
+    def __reduce__(self):
+        # a query is pickled as its arguments and compiled again when it is loaded, e.g. in a worker process
+        return make_query, self.arguments
+
+    def makePredicates(self):
+        # frequency, coder and date, which some corpora can check without looking at every sign
+        self.frequencyPredicates = list()
+        if self.frequency_range is not None:
+            minimum, maximum = self.frequency_range
+            self.frequencyPredicates.append(Predicate('frequency', range_test('frequency', minimum, maximum), 2))
+        self.filterPredicates = self.frequencyPredicates[:]
+        if self.coders is not None:
+            self.filterPredicates.append(Predicate('coder', membership_test('coder', self.coders)))
+        if self.lastUpdateds is not None:
+            self.filterPredicates.append(Predicate('last updated', membership_test('lastUpdated', self.lastUpdateds)))
+
+        self.predicates = list()
+        for name, value in self.options:
+            self.predicates.append(Predicate(name, attribute_test(name, value), 1,
+                                             lambda statistics, name=name, value=value:
+                                             statistics.optionSelectivity(name, value)))
+        for kind, value in [('config_type', self.config_type), ('hand_type', self.hand_type)]:
+            if value is not None:
+                self.predicates.append(Predicate(kind.replace('_', ' '), attribute_test(kind, value), TYPE_COST,
+                                                 lambda statistics, kind=kind, value=value:
+                                                 statistics.typeSelectivity(kind, value)))
+
+        # flags and slots, which a SlotIndex can answer for the whole corpus at once
+        self.transcriptionPredicates = list()
+        if self.flagChecks:
+            self.transcriptionPredicates.append(Predicate('flags', self.checkFlags,
+                                                          FLAG_COST * len(self.flagChecks)))
+        for n, (name, slotChecks) in enumerate(zip(HAND_NAMES, self.slotChecks)):
+            if slotChecks:
+                self.transcriptionPredicates.append(Predicate(name + ' slots', slot_test(n, slotChecks),
+                                                              SLOT_COST * len(slotChecks)))
+
+    def checkFlags(self, sign):
+        flags = sign.flags
+        for name, n, index, value in self.flagChecks:
+            if flags[name][n][index] != value:
+                return False
+        return True
+
+    def matches(self, sign):
+        return all(predicate.test(sign)
+                   for predicate in self.filterPredicates + self.predicates + self.transcriptionPredicates)
+
+    def search(self, corpus):
+        '''
+        :return: a list of the signs in the corpus that match the query, in gloss order
+        '''
+        return self.searchWithPlan(corpus)[0]
+
+    def searchWithPlan(self, corpus):
+        '''
+        :return: the same list as search, and the QueryPlan that found it, whose counts show how many signs each
+        predicate rejected, see QueryPlan.report
+        '''
+        signs, total, plan = self.candidates(corpus)
+        return list(plan.run(signs)), plan
+
+    def searchBatches(self, corpus, batch_size=SEARCH_BATCH_SIZE, call_back=None, stop_check=None):
+        '''
+        The same as search, a batch at a time, see analysis.streaming.in_batches
+        :return: an iterator of lists of matching signs, in gloss order
+        '''
+        signs, total, plan = self.candidates(corpus)
+        return in_batches(signs, total, lambda batch: list(plan.run(batch)), batch_size, call_back, stop_check)
+
+    def candidates(self, corpus, known=None):
+        '''
+        :param known: see SlotIndex.select
+        :return: an iterable of the signs that might match, in gloss order, the number of them, and the QueryPlan
+        that picks out the ones that do
+        '''
+        if corpus.filtersInStore:
+            # frequency, coder and date are checked by the corpus itself, and the rest are planned from statistics
+            signs = corpus.filterSigns(self.frequency_range, self.coders, self.lastUpdateds)
+            return signs, len(corpus.wordlist), QueryPlan(self.predicates + self.transcriptionPredicates,
+                                                          corpus.getIndex(CorpusStatistics))
+        # the signs that match every slot, flag, option, type, coder and date are looked up in a SlotIndex
+        # rather than tested one by one, which leaves only the frequency to check, unless its range is narrow
+        # enough to look up as well
+        index = corpus.getIndex(SlotIndex)
+        bitmap = index.select(self.slotChecks, self.flagChecks, self.attributeChecks, known)
+        predicates = self.frequencyPredicates
+        if self.frequency_range is not None and bitmap:
+            frequencies = corpus.getIndex(FrequencyIndex)
+            count = frequencies.count(*self.frequency_range)
+            if count == len(frequencies):
+                predicates = list()
+            elif count <= FREQUENCY_LOOKUP_SHARE * len(frequencies):
+                bitmap &= index.glossBitmap(frequencies.glossesBetween(*self.frequency_range))
+                predicates = list()
+        if bitmap == index.everything:
+            return iter(corpus), len(corpus.wordlist), QueryPlan(predicates)
+        signs = index.signsFromBitmap(bitmap)
+        return signs, len(signs), QueryPlan(predicates)
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def make_query(*args):
+    return TranscriptionQuery(*args)
+
+
+def compile_query(forearm, estimated, uncertain, incomplete, configuration, hand, frequency_range, config1, config2,
+                  coders, lastUpdateds):
+    '''
+    Takes the same arguments as transcription_search. A query with the same content as a recent one is not
+    compiled again.
+    :return: a TranscriptionQuery
+    '''
+    return make_query(forearm, estimated, uncertain, incomplete, configuration, hand,
+                      tuple(frequency_range) if frequency_range is not None else None,
+                      (freeze_hand(config1[0]), freeze_hand(config1[1])),
+                      (freeze_hand(config2[0]), freeze_hand(config2[1])),
+                      frozenset(coders) if coders is not None else None,
+                      frozenset(lastUpdateds) if lastUpdateds is not None else None)
+
+
 def transcription_search(corpus, forearm, estimated, uncertain, incomplete, configuration, hand,
                          frequency_range, config1, config2, coders, lastUpdateds):
     '''
@@ -203,18 +333,33 @@ def transcription_search(corpus, forearm, estimated, uncertain, incomplete, conf
     :param config2: a dictionary of information
     :return: a list of signs matching the criteria
     '''
+    return compile_query(forearm, estimated, uncertain, incomplete, configuration, hand, frequency_range,
+                         config1, config2, coders, lastUpdateds).search(corpus)
 
-    ret = list()
-    for word in corpus:
-        if all([frequency_range[0] <= word.frequency <= frequency_range[1],
-                check_global_options(word, (forearm, estimated, uncertain, incomplete)),
-                check_config_type(word, configuration),
-                check_hand_type(word, hand),
-                check_estimate_flag(word, config1, config2),
-                check_uncertain_flag(word, config1, config2),
-                check_slot_symbol(word, config1, config2),
-                check_coder(word, coders),
-                check_lastUpdated(word, lastUpdateds)]):
-            ret.append(word)
-
-    return ret
\ No newline at end of file
+
+def query_key(query):
+    '''
+    :param query: a TranscriptionQuery
+    :return: a fingerprint of the query and a test of whether one sign matches it, for a result_cache.ResultCache
+    '''
+    return ('transcription search',) + query.arguments, query.matches
+
+
+def transcription_key(forearm, estimated, uncertain, incomplete, configuration, hand, frequency_range, config1, config2,
+                      coders, lastUpdateds):
+    '''
+    Takes the same arguments as transcription_search, without the corpus, see query_key
+    '''
+    return query_key(compile_query(forearm, estimated, uncertain, incomplete, configuration, hand, frequency_range,
+                                   config1, config2, coders, lastUpdateds))
+
+
+def transcription_search_batches(corpus, forearm, estimated, uncertain, incomplete, configuration, hand,
+                                 frequency_range, config1, config2, coders, lastUpdateds,
+                                 call_back=None, stop_check=None):
+    '''
+    transcription_search a batch of matches at a time, see analysis.streaming.in_batches
+    '''
+    query = compile_query(forearm, estimated, uncertain, incomplete, configuration, hand, frequency_range,
+                          config1, config2, coders, lastUpdateds)
+    return query.searchBatches(corpus, call_back=call_back, stop_check=stop_check)
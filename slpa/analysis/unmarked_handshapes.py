@@ -349,9 +349,9 @@ class HandshapeB1():  #B1 = Opposed B (Henner et al., 2013)  #checked
         PIPs = [sign[16], sign[21], sign[26], sign[31]]
         DIPs = [sign[17], sign[22], sign[27], sign[32]]
 
-        return all([difference(MCPs[i + 1] - MCPs[i]) <= 1 for i in range(3)]) and \
-               all([difference(PIPs[i + 1] - PIPs[i]) <= 1 for i in range(3)]) and \
-               all([difference(DIPs[i + 1] - DIPs[i]) <= 1 for i in range(3)])
+        return all([difference(MCPs[i + 1], MCPs[i]) <= 1 for i in range(3)]) and \
+               all([difference(PIPs[i + 1], PIPs[i]) <= 1 for i in range(3)]) and \
+               all([difference(DIPs[i + 1], DIPs[i]) <= 1 for i in range(3)])
 
     @staticmethod
     def match(sign):
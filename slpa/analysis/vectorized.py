@@ -0,0 +1,323 @@
+from functools import partial
+try:
+    import numpy as np
+except ImportError:
+    #NumPy is optional, the searches in analysis work without it
+    np = None
+from lexicon import CorpusIndex
+from slotstore import HAND_NAMES, NUM_SLOTS
+from constants import GLOBAL_OPTIONS
+from analysis.transcription_search import compile_query, transcription_search_batches, OPTION_VALUES
+from analysis.handshape_search import classify_hand, label_mask, handshape_search_batches
+from analysis.phonological_search import compile_specification, extended_finger_search_batches
+from analysis.parallel import parallel_search, parallel_batches, query_search
+from analysis.result_cache import cached_function, cached_stream, cached_query, cached_query_batches
+
+PYTHON = 'python'
+NUMPY = 'numpy'
+PARALLEL = 'processes'
+CODED_ATTRIBUTES = ['coder', 'lastUpdated', 'hand_type', 'config_type', 'sign_type']
+
+backend = PYTHON
+
+
+def available_backends():
+    return [PYTHON, NUMPY, PARALLEL] if np is not None else [PYTHON, PARALLEL]
+
+
+def select_backend(name):
+    '''
+    :param name: PYTHON to search one sign at a time, NUMPY to search the whole corpus with array operations, or
+    PARALLEL to split large corpora between worker processes that search one sign at a time
+    '''
+    global backend
+    if name not in available_backends():
+        raise ValueError('The {} search backend is not available'.format(name))
+    backend = name
+
+
+def search_function(function):
+    '''
+    :param function: transcription_search, handshape_search or extended_finger_search from analysis
+    :return: the version of the search for the selected backend, which takes the same arguments and returns the
+    same signs, and keeps its results in the ResultCache of the corpus
+    '''
+    if backend == NUMPY:
+        return cached_function(function, NUMPY_SEARCHES[function.__name__])
+    if backend == PARALLEL:
+        return cached_function(function, partial(parallel_search, function))
+    return cached_function(function, function)
+
+
+def run_query(corpus, query):
+    '''
+    :param query: a TranscriptionQuery
+    :return: the signs that match the query, found with the selected backend
+    '''
+    if backend == NUMPY:
+        return cached_query(corpus, query, search_query)
+    if backend == PARALLEL:
+        return cached_query(corpus, query, partial(parallel_search, query_search))
+    return cached_query(corpus, query, query_search)
+
+
+def one_batch(function):
+    '''
+    :return: a version of function that returns an iterator of its whole result as one batch, with the same
+    arguments as the searches in analysis.streaming
+    '''
+    def search(corpus, *args, call_back=None, stop_check=None):
+        results = function(corpus, *args)
+        if call_back is not None:
+            call_back(len(corpus.wordlist), len(corpus.wordlist))
+        if results:
+            yield results
+    return search
+
+
+def stream_function(function):
+    '''
+    :param function: transcription_search, handshape_search or extended_finger_search from analysis
+    :return: a version of the search for the selected backend that returns an iterator of batches of signs, and
+    also takes call_back and stop_check, see analysis.streaming.in_batches. Only searches in the current process
+    are really split into batches, NumPy finds all the signs at once and worker processes a range at a time.
+    '''
+    if backend == NUMPY:
+        return cached_stream(function, one_batch(NUMPY_SEARCHES[function.__name__]))
+    if backend == PARALLEL:
+        return cached_stream(function, partial(parallel_batches, function))
+    return cached_stream(function, BATCH_SEARCHES[function.__name__])
+
+
+def stream_query(corpus, query, call_back=None, stop_check=None):
+    '''
+    run_query a batch of matches at a time, see stream_function
+    '''
+    if backend == NUMPY:
+        batches = one_batch(search_query)
+    elif backend == PARALLEL:
+        batches = partial(parallel_batches, query_search)
+    else:
+        batches = query_batches
+    return cached_query_batches(corpus, query, batches, call_back, stop_check)
+
+
+def query_batches(corpus, query, call_back=None, stop_check=None):
+    return query.searchBatches(corpus, call_back=call_back, stop_check=stop_check)
+
+
+def encode(values):
+    '''
+    :return: an array of a code for each value, and the list of distinct values in the order of their codes
+    '''
+    codes = dict()
+    array = np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int32)
+    return array, list(codes)
+
+
+class SlotMatrix(CorpusIndex):
+    """
+    The whole corpus as NumPy arrays, one row per sign in gloss order: the symbol code of every slot that
+    transcription search matches (slots 2 to 34 of each hand), every flag, every global option, and codes for the
+    coder, date, types, frequency and distinct hands. A search is a series of boolean masks over the rows.
+    The matrix cannot be updated in place, so it is made again the next time it is used after a word is added or
+    removed. It keeps the gloss of each row, and the signs found are looked up in the wordlist of the corpus.
+    """
+
+    def build(self, corpus):
+        self.stale = False
+        self.glosses = list()  # row: gloss
+
+        # signs with the same hand share a row of symbol codes
+        self.hands = dict()
+        self.strings = dict()
+        flagRows = dict()
+        handCodes, stringCodes, flagCodes = list(), list(), list()
+        options = {option: list() for option in GLOBAL_OPTIONS}
+        frequency = list()
+        values = {name: list() for name in CODED_ATTRIBUTES}
+        for sign in corpus:
+            self.glosses.append(sign.gloss)
+            summary = sign.slotSummary
+            handCodes.append([self.hands.setdefault(hand, len(self.hands)) for hand in summary.filled])
+            stringCodes.append([self.strings.setdefault(string, len(self.strings)) for string in summary.strings])
+            flagCodes.append([flagRows.setdefault(tuple(sign.flags[name]), len(flagRows)) for name in HAND_NAMES])
+            for option, column in options.items():
+                column.append(bool(getattr(sign, option)))
+            frequency.append(sign.frequency)
+            for name, column in values.items():
+                column.append(getattr(sign, name))
+        self.hands = list(self.hands)
+        self.strings = list(self.strings)
+        self.handCodes = np.array(handCodes, dtype=np.int32).reshape(-1, len(HAND_NAMES))
+        self.stringCodes = np.array(stringCodes, dtype=np.int32).reshape(-1, len(HAND_NAMES))
+        flagCodes = np.array(flagCodes, dtype=np.int32).reshape(-1, len(HAND_NAMES))
+
+        self.symbols = dict()
+        handRows = [[self.symbols.setdefault(symbol, len(self.symbols)) for symbol in hand] for hand in self.hands]
+        self.symbols = list(self.symbols)
+        handRows = np.array(handRows, dtype=np.int32).reshape(len(self.hands), NUM_SLOTS - 1)
+        self.slots = handRows[self.handCodes]  # [signs, hands, slots]
+        flagRows = np.array([[[flag[0], flag[1]] for flag in flags] for flags in flagRows],
+                            dtype=bool).reshape(len(flagRows), NUM_SLOTS, 2)
+        self.flags = flagRows[flagCodes]  # [signs, hands, slots, isUncertain or isEstimate]
+
+        self.options = {option: np.array(column, dtype=bool) for option, column in options.items()}
+        self.frequency = np.array(frequency, dtype=float)
+        self.codes = {name: encode(column) for name, column in values.items()}
+
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and not self.stale
+
+    def wordAdded(self, sign, old):
+        self.stale = True
+
+    def wordRemoved(self, sign):
+        self.stale = True
+
+    def everything(self):
+        return np.ones(len(self.glosses), dtype=bool)
+
+    def isin(self, name, values):
+        '''
+        :return: a mask of the signs whose attribute name is one of values
+        '''
+        codes, distinct = self.codes[name]
+        values = set(values)
+        return np.isin(codes, [code for code, value in enumerate(distinct) if value in values])
+
+    def symbolTable(self, fullmatch):
+        '''
+        :return: a lookup table of which symbol codes are allowed by a slot pattern
+        '''
+        return np.array([fullmatch(symbol) is not None for symbol in self.symbols], dtype=bool)
+
+    def handTable(self, codes, distinct, test):
+        '''
+        :param codes: the hand or string codes of the signs that need the test
+        :param distinct: self.hands or self.strings
+        :param test: a function of one hand or string
+        :return: a lookup table of the result of test for each code, which is only called for codes that occur
+        '''
+        table = np.zeros(len(distinct), dtype=bool)
+        for code in np.unique(codes):
+            table[code] = test(distinct[code])
+        return table
+
+    def select(self, mask):
+        glosses = self.glosses
+        wordlist = self.wordlist
+        return [wordlist[glosses[n]] for n in np.flatnonzero(mask)]
+
+
+def option_mask(matrix, values):
+    '''
+    :param values: Yes, No or Either for each of GLOBAL_OPTIONS
+    '''
+    mask = matrix.everything()
+    for option, value in zip(GLOBAL_OPTIONS, values):
+        if value in OPTION_VALUES:
+            mask &= matrix.options[option] == OPTION_VALUES[value]
+    return mask
+
+
+def type_mask(matrix, name, value):
+    '''
+    :param value: the setting of the dialog, e.g. One-hand signs, or Either
+    '''
+    if value == 'Either':
+        return matrix.everything()
+    return matrix.isin(name, [value[:3].lower()])
+
+
+def search_query(corpus, query):
+    '''
+    :param query: a TranscriptionQuery
+    :return: the same signs as query.search(corpus)
+    '''
+    matrix = corpus.getIndex(SlotMatrix)
+    mask = matrix.everything()
+    for name, value in query.options:
+        mask &= matrix.options[name] == value
+    for name, value in [('config_type', query.config_type), ('hand_type', query.hand_type)]:
+        if value is not None:
+            mask &= matrix.isin(name, [value])
+    if query.frequency_range is not None:
+        minimum, maximum = query.frequency_range
+        mask &= (matrix.frequency >= minimum) & (matrix.frequency <= maximum)
+    if query.coders is not None:
+        mask &= matrix.isin('coder', query.coders)
+    if query.lastUpdateds is not None:
+        mask &= matrix.isin('lastUpdated', query.lastUpdateds)
+    hands = {name: h for h, name in enumerate(HAND_NAMES)}
+    for name, n, index, value in query.flagChecks:
+        mask &= matrix.flags[:, hands[name], n, index] == value
+    for h, slotChecks in enumerate(query.slotChecks):
+        for n, fullmatch in slotChecks:
+            mask &= matrix.symbolTable(fullmatch)[matrix.slots[:, h, n]]
+    return matrix.select(mask)
+
+
+def transcription_search(corpus, forearm, estimated, uncertain, incomplete, configuration, hand,
+                         frequency_range, config1, config2, coders, lastUpdateds):
+    '''
+    analysis.transcription_search.transcription_search with NumPy
+    '''
+    return search_query(corpus, compile_query(forearm, estimated, uncertain, incomplete, configuration, hand,
+                                              frequency_range, config1, config2, coders, lastUpdateds))
+
+
+def handshape_search(corpus, forearm, estimated, uncertain, incomplete, config, hand, logic, c1h1, c1h2, c2h1, c2h2):
+    '''
+    analysis.handshape_search.handshape_search with NumPy
+    '''
+    matrix = corpus.getIndex(SlotMatrix)
+    mask = option_mask(matrix, [forearm, estimated, uncertain, incomplete])
+    mask &= type_mask(matrix, 'config_type', config)
+    mask &= type_mask(matrix, 'hand_type', hand)
+
+    specs = [c1h1, c1h2, c2h1, c2h2]
+    if logic == 'Any of the above configurations':
+        # as in check_handshape, where the first hand decides whether every hand is searched positively
+        positives = [c1h1['positive']] * len(specs)
+    else:
+        positives = [spec['positive'] for spec in specs]
+    matches = np.zeros((len(matrix.glosses), len(specs)), dtype=bool)
+    for h, (spec, positive) in enumerate(zip(specs, positives)):
+        labels = label_mask(spec['labels'])
+        def test(filled):
+            return positive(bool(classify_hand(filled) & labels))
+        codes = matrix.handCodes[:, h]
+        matches[:, h] = matrix.handTable(codes[mask], matrix.hands, test)[codes]
+    if logic == 'Any of the above configurations':
+        mask &= matches.any(axis=1)
+    else:
+        mask &= matches.all(axis=1)
+    return matrix.select(mask)
+
+
+def extended_finger_search(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type):
+    '''
+    analysis.phonological_search.extended_finger_search with NumPy
+    '''
+    matrix = corpus.getIndex(SlotMatrix)
+    specs = [c1h1, c1h2, c2h1, c2h2]
+    matches = np.zeros((len(matrix.glosses), len(specs)), dtype=bool)
+    for h, spec in enumerate(specs):
+        codes = matrix.stringCodes[:, h]
+        matches[:, h] = matrix.handTable(codes, matrix.strings, compile_specification(spec).matches)[codes]
+    if logic == 'All four hand/configuration specifications':
+        mask = matches.all(axis=1)
+    else:
+        mask = matches.any(axis=1)
+    mask &= matrix.isin('sign_type', sign_type)
+    return matrix.select(mask)
+
+
+BATCH_SEARCHES = {'transcription_search': transcription_search_batches,
+                  'handshape_search': handshape_search_batches,
+                  'extended_finger_search': extended_finger_search_batches}
+
+NUMPY_SEARCHES = {'transcription_search': transcription_search,
+                  'handshape_search': handshape_search,
+                  'extended_finger_search': extended_finger_search}
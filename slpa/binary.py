@@ -1,6 +1,20 @@
+import os
+import mmap
+import struct
 import pickle
+import threading
+import copyreg
+from collections.abc import MutableMapping
 from gui import parameterwidgets
 import anytree
+from lexicon import Corpus, CompactCorpus
+from database import SQLiteCorpus, DATABASE_EXTENSION
+
+JOURNAL_EXTENSION = '.journal'
+COMPACTING_EXTENSION = '.compacting'
+COMPACTION_THRESHOLD = 500
+INDEXED_MAGIC = b'SLPAIDX1'
+HEADER_LENGTH = struct.Struct('<Q')
 
 class SLPAUnpickler(pickle._Unpickler):
 
@@ -34,3 +48,330 @@ def save_binary(obj, path):
     with open(path, 'wb') as f:
         pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
 
+
+class CorpusJournal:
+    """
+    Append-only log of the words added to or removed from a corpus (and of changes to its other attributes) since
+    its snapshot (the .corpus file) was last written. Saving a single sign only appends one small record, and the
+    log is periodically folded back into the snapshot by a background thread.
+    """
+
+    def __init__(self, path, threshold=COMPACTION_THRESHOLD):
+        self.path = path
+        self.journalPath = path + JOURNAL_EXTENSION
+        self.compactingPath = self.journalPath + COMPACTING_EXTENSION
+        self.threshold = threshold
+        self.records = 0
+        self.lock = threading.Lock()
+        self.compactionThread = None
+
+    def wordAdded(self, corpus, sign):
+        self.append(corpus, ('add', sign.gloss, sign))
+
+    def wordRemoved(self, corpus, gloss):
+        self.append(corpus, ('remove', gloss, None))
+
+    def attributeChanged(self, corpus, name, value):
+        self.append(corpus, ('set', name, value))
+
+    def append(self, corpus, record):
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            with open(self.journalPath, 'ab') as f:
+                f.write(data)
+            self.records += 1
+        if self.records >= self.threshold:
+            self.compact(corpus)
+
+    def replay(self, corpus):
+        """
+        Apply any records left over from previous sessions to a freshly loaded snapshot
+        :param corpus: the corpus loaded from self.path, which must not have a journal attached yet
+        :return: the number of records applied
+        """
+        applied = 0
+        for path in [self.compactingPath, self.journalPath]:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        # every record was pickled separately, so each needs an unpickler with a fresh memo
+                        action, key, value = SLPAUnpickler(f).load()
+                    except EOFError:
+                        break
+                    except (pickle.UnpicklingError, ValueError):
+                        # a record that was only partly written when the program stopped
+                        break
+                    if action == 'add':
+                        corpus.addWord(value)
+                    elif action == 'remove':
+                        if key in corpus.wordlist:
+                            corpus.removeWord(key)
+                    else:
+                        setattr(corpus, key, value)
+                    applied += 1
+        self.records = applied
+        return applied
+
+    def isCompacting(self):
+        return self.compactionThread is not None and self.compactionThread.is_alive()
+
+    def waitForCompaction(self):
+        if self.isCompacting():
+            self.compactionThread.join()
+
+    def compact(self, corpus, background=True):
+        """
+        Write the current state of the corpus to its snapshot file and discard the records it contains.
+        Records appended while the snapshot is being written go to a fresh journal, so they are never lost.
+        """
+        with self.lock:
+            if self.isCompacting():
+                return
+            if os.path.exists(self.journalPath):
+                if os.path.exists(self.compactingPath):
+                    with open(self.journalPath, 'rb') as source, open(self.compactingPath, 'ab') as target:
+                        target.write(source.read())
+                    os.remove(self.journalPath)
+                else:
+                    os.replace(self.journalPath, self.compactingPath)
+            self.records = 0
+            snapshot = corpus.snapshot()
+
+        if background:
+            self.compactionThread = threading.Thread(target=self.writeSnapshot, args=(snapshot,))
+            self.compactionThread.start()
+        else:
+            self.writeSnapshot(snapshot)
+
+    def writeSnapshot(self, snapshot):
+        write_snapshot(snapshot, self.path)
+        if os.path.exists(self.compactingPath):
+            os.remove(self.compactingPath)
+
+    def discard(self):
+        self.waitForCompaction()
+        with self.lock:
+            for path in [self.compactingPath, self.journalPath]:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.records = 0
+
+
+def write_snapshot(corpus, path):
+    temporaryPath = path + '.tmp'
+    if isinstance(corpus, CompactCorpus):
+        # a CompactCorpus pickles its slot store in one piece, which is already small and quick to load
+        save_binary(corpus, temporaryPath)
+    else:
+        save_indexed(corpus, temporaryPath)
+    mappedFile = getattr(corpus.wordlist, 'mappedFile', None)
+    if mappedFile is not None and mappedFile.path == path:
+        mappedFile.replace(temporaryPath)
+    else:
+        os.replace(temporaryPath, path)
+
+
+def save_indexed(corpus, path):
+    """
+    Write a corpus in the indexed format: a header with the corpus attributes and the byte offset of every sign,
+    followed by each sign pickled on its own, so that signs can be read one at a time by a LazyCorpus
+    """
+    attributes = {name: value for name, value in corpus.__dict__.items() if name not in ['wordlist', 'journal', 'indexes']}
+    wordlist = corpus.wordlist
+    index = dict()
+    offset = 0
+    with open(path + '.data', 'wb') as data:
+        for gloss in sorted(wordlist.keys()):
+            raw = wordlist.raw(gloss) if isinstance(wordlist, LazyWordlist) else None
+            if raw is None:
+                raw = pickle.dumps(wordlist[gloss], protocol=pickle.HIGHEST_PROTOCOL)
+            data.write(raw)
+            index[gloss] = (offset, len(raw))
+            offset += len(raw)
+    header = pickle.dumps({'attributes': attributes, 'index': index}, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path, 'wb') as f, open(path + '.data', 'rb') as data:
+        f.write(INDEXED_MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        while True:
+            chunk = data.read(1 << 20)
+            if not chunk:
+                break
+            f.write(chunk)
+    os.remove(path + '.data')
+
+
+def is_indexed(path):
+    with open(path, 'rb') as f:
+        return f.read(len(INDEXED_MAGIC)) == INDEXED_MAGIC
+
+
+class MappedCorpusFile:
+    """
+    A memory-mapped corpus file in the indexed format. Only the header is read when it is opened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.open()
+
+    def open(self):
+        self.file = open(self.path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = len(INDEXED_MAGIC)
+        length, = HEADER_LENGTH.unpack_from(self.mmap, start)
+        start += HEADER_LENGTH.size
+        header = pickle.loads(self.mmap[start:start+length])
+        self.attributes = header['attributes']
+        self.index = header['index']
+        self.dataStart = start + length
+
+    def close(self):
+        with self.lock:
+            self.mmap.close()
+            self.file.close()
+
+    def read(self, gloss):
+        # the index and the data start change with the mapped file when a compaction replaces it
+        with self.lock:
+            offset, length = self.index[gloss]
+            start = self.dataStart + offset
+            return self.mmap[start:start+length]
+
+    def load(self, gloss):
+        return pickle.loads(self.read(gloss))
+
+    def replace(self, newPath):
+        """
+        Swap in a new version of the file, which must hold the same signs as the one currently mapped,
+        apart from those that were overridden since it was opened
+        """
+        with self.lock:
+            self.close()
+            os.replace(newPath, self.path)
+            self.open()
+
+
+class LazyWordlist(MutableMapping):
+    """
+    The wordlist of a LazyCorpus. Signs are unpickled from the mapped file every time they are asked for and are
+    not kept, except for signs that were added or replaced since the file was opened.
+    """
+
+    def __init__(self, mappedFile, overlay=None, deleted=None):
+        self.mappedFile = mappedFile
+        self.overlay = dict() if overlay is None else overlay
+        self.deleted = set() if deleted is None else deleted
+
+    def copy(self):
+        return LazyWordlist(self.mappedFile, self.overlay.copy(), self.deleted.copy())
+
+    def raw(self, gloss):
+        """
+        :return: the pickled sign as stored in the mapped file, or None if it has been replaced since
+        """
+        if gloss in self.overlay or gloss in self.deleted:
+            return None
+        return self.mappedFile.read(gloss)
+
+    def __getitem__(self, gloss):
+        try:
+            return self.overlay[gloss]
+        except KeyError:
+            pass
+        if gloss in self.deleted or gloss not in self.mappedFile.index:
+            raise KeyError(gloss)
+        return self.mappedFile.load(gloss)
+
+    def __setitem__(self, gloss, sign):
+        self.overlay[gloss] = sign
+        self.deleted.discard(gloss)
+
+    def __delitem__(self, gloss):
+        if gloss not in self:
+            raise KeyError(gloss)
+        self.overlay.pop(gloss, None)
+        # even if the mapped file does not have it now, it may have after a compaction that is under way
+        self.deleted.add(gloss)
+
+    def __contains__(self, gloss):
+        return gloss in self.overlay or (gloss in self.mappedFile.index and gloss not in self.deleted)
+
+    def __iter__(self):
+        glosses = [gloss for gloss in self.mappedFile.index if gloss not in self.deleted and gloss not in self.overlay]
+        glosses.extend(self.overlay)
+        return iter(glosses)
+
+    def __len__(self):
+        index = self.mappedFile.index
+        return (len(index) + sum(1 for gloss in self.overlay if gloss not in index)
+                - sum(1 for gloss in self.deleted if gloss in index))
+
+
+class LazyCorpus(Corpus):
+    """
+    A Corpus opened from a file in the indexed format, whose signs are only unpickled when they are used.
+    Pickling a LazyCorpus gives an ordinary Corpus.
+    """
+
+    def __init__(self, path):
+        mappedFile = MappedCorpusFile(path)
+        super().__init__(mappedFile.attributes)
+        self.wordlist = LazyWordlist(mappedFile)
+
+    def __reduce__(self):
+        state = self.__getstate__()
+        state['wordlist'] = dict(self.wordlist.items())
+        return copyreg._reconstructor, (Corpus, object, None), state
+
+    def snapshot(self):
+        snapshot = LazyCorpus.__new__(LazyCorpus)
+        snapshot.__dict__.update(self.__getstate__())
+        snapshot.wordlist = self.wordlist.copy()
+        return snapshot
+
+
+def load_corpus(path, compact=False):
+    """
+    Load a corpus snapshot, bring it up to date with its journal, and attach the journal so that
+    later calls to Corpus.addWord and Corpus.removeWord are recorded
+    :param compact: if True, convert the corpus to a lexicon.CompactCorpus, which keeps all transcription slots
+    in one array instead of in lists on every sign
+    """
+    if path.endswith(DATABASE_EXTENSION):
+        return SQLiteCorpus(path)
+    if is_indexed(path):
+        corpus = LazyCorpus(path)
+    else:
+        corpus = load_binary(path)
+    if compact and not isinstance(corpus, CompactCorpus):
+        corpus = CompactCorpus.fromCorpus(corpus)
+    corpus.path = path
+    journal = CorpusJournal(path)
+    journal.replay(corpus)
+    corpus.journal = journal
+    return corpus
+
+def save_corpus(corpus, path=None):
+    """
+    Write the whole corpus to disk, replacing its snapshot and any journal records. Paths ending in
+    DATABASE_EXTENSION are written as an SQLite database instead.
+    """
+    if path is None:
+        path = corpus.path
+    if path.endswith(DATABASE_EXTENSION):
+        if isinstance(corpus, SQLiteCorpus) and corpus.path == path:
+            corpus.flush()
+        else:
+            SQLiteCorpus.fromCorpus(corpus, path).close()
+        return
+    journal = getattr(corpus, 'journal', None)
+    if journal is not None:
+        journal.waitForCompaction()
+    write_snapshot(corpus, path)
+    journal = CorpusJournal(path)
+    journal.discard()
+    corpus.journal = journal
@@ -1,3 +1,5 @@
+from collections import namedtuple
+
 GLOBAL_OPTIONS = ['forearm', 'estimated', 'uncertain', 'incomplete']#, 'reduplicated']
 FINGERSPELL_OPTIONS = ['fingerspelled', 'initialized']
 
@@ -8,6 +10,8 @@ NULL = '\u2205'
 STANDARD_SYMBOLS = ['_', '+', '-', '/', '1', '2', '3', '4', '<', '=', '?', 'E', 'F', 'H', 'L', 'M', 'O', 'U', 'V',
                     'b', 'd', 'e', 'f', 'fr', 'i', 'm', 'p', 'r', 't', 'u', 'x', 'x+', 'x-', '{', NULL, X_IN_BOX]
 
+Flag = namedtuple('Flag', ['isUncertain', 'isEstimate'])
+
 FINGER_SYMBOLS = ['H', 'E', 'e', 'i', 'F', 'f', '?']
 
 CONTACT_SYMBOLS = ['{', '<', '=', 'x-', 'x', 'x+', X_IN_BOX, '?']
@@ -0,0 +1,263 @@
+import os
+import pickle
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from datetime import date
+from lexicon import Corpus, Sign, DERIVED_ATTRIBUTES, FREQUENCY_BINS, histogram_bins
+from slotstore import HAND_NAMES, NUM_SLOTS
+from constants import GLOBAL_OPTIONS, FINGERSPELL_OPTIONS, Flag
+
+DATABASE_EXTENSION = '.corpusdb'
+SCHEMA_VERSION = 1
+
+OPTIONS = GLOBAL_OPTIONS + FINGERSPELL_OPTIONS
+SLOT_COLUMNS = ['{}slot{}'.format(hand, n) for hand in HAND_NAMES for n in range(1, NUM_SLOTS+1)]
+UNCERTAIN_COLUMNS = ['{}uncertain'.format(hand) for hand in HAND_NAMES]
+ESTIMATE_COLUMNS = ['{}estimated'.format(hand) for hand in HAND_NAMES]
+SIGN_COLUMNS = (['gloss'] + SLOT_COLUMNS + UNCERTAIN_COLUMNS + ESTIMATE_COLUMNS + OPTIONS +
+                ['coder', 'last_updated', 'frequency', 'notes', 'parameters', 'extra'])
+# attributes of a Sign that have a column of their own, or that are recomputed when the sign is loaded
+STORED_ATTRIBUTES = set(['gloss', 'config1', 'config2', 'flags', 'signNotes', '_coder', '_lastUpdated', '_frequency',
+                         'parameters', '_parameters', 'hand_type', 'config_type'] +
+                        HAND_NAMES + OPTIONS + DERIVED_ATTRIBUTES)
+# corpus attributes that are not kept in the metadata table
+UNSTORED_CORPUS_ATTRIBUTES = ['wordlist', 'path', 'journal', 'indexes', 'store', 'connection', 'lock']
+
+SCHEMA = ['CREATE TABLE IF NOT EXISTS signs ({})'.format(
+              ', '.join(['gloss TEXT PRIMARY KEY'] +
+                        ['{} TEXT'.format(column) for column in SLOT_COLUMNS] +
+                        ['{} INTEGER'.format(column) for column in UNCERTAIN_COLUMNS + ESTIMATE_COLUMNS + OPTIONS] +
+                        ['coder TEXT', 'last_updated TEXT', 'frequency REAL', 'notes TEXT',
+                         'parameters BLOB', 'extra BLOB'])),
+          'CREATE INDEX IF NOT EXISTS signs_coder ON signs (coder)',
+          'CREATE INDEX IF NOT EXISTS signs_last_updated ON signs (last_updated)',
+          'CREATE INDEX IF NOT EXISTS signs_frequency ON signs (frequency)',
+          'CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value BLOB)']
+
+INSERT_SIGN = 'INSERT OR REPLACE INTO signs ({}) VALUES ({})'.format(', '.join(SIGN_COLUMNS),
+                                                                      ', '.join('?' * len(SIGN_COLUMNS)))
+
+
+def sign_to_row(sign):
+    row = [sign.gloss]
+    for hand in HAND_NAMES:
+        row.extend(getattr(sign, hand))
+    flags = sign.flags
+    for index in [0, 1]:  # isUncertain, isEstimate
+        for hand in HAND_NAMES:
+            mask = 0
+            for n, flag in enumerate(flags[hand]):
+                if flag[index]:
+                    mask |= 1 << n
+            row.append(mask)
+    row.extend(int(bool(getattr(sign, option, False))) for option in OPTIONS)
+    lastUpdated = sign.lastUpdated
+    row.append(sign.coder)
+    row.append(lastUpdated.isoformat() if lastUpdated is not None else None)
+    row.append(sign.frequency)
+    row.append(sign.signNotes)
+    row.append(pickle.dumps(sign.parameters, protocol=pickle.HIGHEST_PROTOCOL))
+    extra = {name: value for name, value in sign.__dict__.items() if name not in STORED_ATTRIBUTES}
+    row.append(pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL))
+    return row
+
+
+def sign_from_row(row):
+    hands = [[row[column] for column in SLOT_COLUMNS[n*NUM_SLOTS:(n+1)*NUM_SLOTS]] for n in range(len(HAND_NAMES))]
+    flags = dict()
+    for hand, uncertainColumn, estimateColumn in zip(HAND_NAMES, UNCERTAIN_COLUMNS, ESTIMATE_COLUMNS):
+        uncertain, estimate = row[uncertainColumn], row[estimateColumn]
+        flags[hand] = [Flag(bool(uncertain >> n & 1), bool(estimate >> n & 1)) for n in range(NUM_SLOTS)]
+    kwargs = {'gloss': row['gloss'],
+              'config1': hands[0:2],
+              'config2': hands[2:4],
+              'flags': flags,
+              'signNotes': row['notes'],
+              '_coder': row['coder'],
+              '_lastUpdated': date.fromisoformat(row['last_updated']) if row['last_updated'] else None,
+              '_frequency': row['frequency'],
+              'parameters': pickle.loads(row['parameters'])}
+    for option in OPTIONS:
+        kwargs[option] = bool(row[option])
+    sign = Sign(kwargs)
+    sign.__dict__.update(pickle.loads(row['extra']))
+    return sign
+
+
+class SignTable(MutableMapping):
+    """
+    The wordlist of an SQLiteCorpus. Signs are read from the database the first time they are asked for and kept
+    afterwards, and every assignment is written straight to the database as a single-row upsert. A cached sign that
+    is changed in place is not saved until it is assigned back, as Corpus.addWord does.
+    """
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.cache = dict()
+
+    def execute(self, query, parameters=()):
+        with self.corpus.lock:
+            return self.corpus.connection.execute(query, parameters).fetchall()
+
+    def signFromRow(self, row):
+        try:
+            return self.cache[row['gloss']]
+        except KeyError:
+            sign = sign_from_row(row)
+            self.cache[sign.gloss] = sign
+            return sign
+
+    def select(self, where='', parameters=()):
+        rows = self.execute('SELECT * FROM signs {} ORDER BY gloss'.format(where), parameters)
+        return [self.signFromRow(row) for row in rows]
+
+    def __getitem__(self, gloss):
+        try:
+            return self.cache[gloss]
+        except KeyError:
+            rows = self.execute('SELECT * FROM signs WHERE gloss = ?', (gloss,))
+            if not rows:
+                raise KeyError(gloss)
+            return self.signFromRow(rows[0])
+
+    def __setitem__(self, gloss, sign):
+        self.update({gloss: sign})
+
+    def update(self, other=(), **kwargs):
+        signs = dict(other, **kwargs)
+        with self.corpus.lock, self.corpus.connection:
+            self.corpus.connection.executemany(INSERT_SIGN, [sign_to_row(sign) for sign in signs.values()])
+        self.cache.update(signs)
+
+    def __delitem__(self, gloss):
+        with self.corpus.lock, self.corpus.connection:
+            cursor = self.corpus.connection.execute('DELETE FROM signs WHERE gloss = ?', (gloss,))
+        self.cache.pop(gloss, None)
+        if not cursor.rowcount:
+            raise KeyError(gloss)
+
+    def __contains__(self, gloss):
+        return gloss in self.cache or bool(self.execute('SELECT 1 FROM signs WHERE gloss = ?', (gloss,)))
+
+    def __iter__(self):
+        return iter([row['gloss'] for row in self.execute('SELECT gloss FROM signs ORDER BY gloss')])
+
+    def __len__(self):
+        return self.execute('SELECT COUNT(*) FROM signs')[0][0]
+
+    def values(self):
+        return self.select()
+
+    def items(self):
+        return [(sign.gloss, sign) for sign in self.select()]
+
+
+
+class SQLiteCorpus(Corpus):
+    """
+    A Corpus kept in an SQLite database rather than a pickle. Opening it only reads the corpus metadata, signs
+    are loaded when they are used, and saving a sign only writes that sign's row.
+    """
+    filtersInStore = True
+
+    def __init__(self, path, kwargs=None):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        with self.lock, self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+        attributes = self.loadMetadata()
+        if kwargs is not None:
+            attributes.update(kwargs)
+        super().__init__(attributes)
+        self.path = path
+        self.wordlist = SignTable(self)
+        if kwargs is not None:
+            self.saveMetadata()
+
+    @classmethod
+    def fromCorpus(cls, corpus, path):
+        if os.path.exists(path):
+            os.remove(path)
+        attributes = {name: value for name, value in corpus.__dict__.items()
+                      if name not in UNSTORED_CORPUS_ATTRIBUTES}
+        database = cls(path, attributes)
+        database.wordlist.update(corpus.wordlist)
+        return database
+
+    def __getstate__(self):
+        raise TypeError('An SQLiteCorpus cannot be pickled, use SQLiteCorpus.fromCorpus to copy it')
+
+    def loadMetadata(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT key, value FROM metadata').fetchall()
+        return {row['key']: pickle.loads(row['value']) for row in rows}
+
+    def saveMetadata(self):
+        attributes = [(name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+                      for name, value in self.__dict__.items() if name not in UNSTORED_CORPUS_ATTRIBUTES]
+        attributes.append(('_schema', pickle.dumps(SCHEMA_VERSION)))
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', attributes)
+
+    def updateAttribute(self, name, value):
+        super().updateAttribute(name, value)
+        self.saveMetadata()
+
+    def flush(self):
+        # signs are written when they are assigned, so only the corpus attributes are left to save
+        self.saveMetadata()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __iter__(self):
+        return iter(self.wordlist.values())
+
+    def filterSigns(self, frequency_range=None, coders=None, lastUpdateds=None):
+        conditions, parameters = list(), list()
+        if frequency_range is not None:
+            conditions.append('frequency BETWEEN ? AND ?')
+            parameters.extend(frequency_range)
+        if coders is not None:
+            conditions.append('coder IN ({})'.format(', '.join('?' * len(coders))))
+            parameters.extend(coders)
+        if lastUpdateds is not None:
+            conditions.append('last_updated IN ({})'.format(', '.join('?' * len(lastUpdateds))))
+            parameters.extend(lastUpdated.isoformat() for lastUpdated in lastUpdateds)
+        where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return iter(self.wordlist.select(where, parameters))
+
+    def getFrequencyRange(self):
+        with self.lock:
+            return tuple(self.connection.execute('SELECT MIN(frequency), MAX(frequency) FROM signs').fetchone())
+
+    def countFrequencyRange(self, minimum, maximum):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM signs WHERE frequency BETWEEN ? AND ?',
+                                           (minimum, maximum)).fetchone()[0]
+
+    def frequencyHistogram(self, bins=FREQUENCY_BINS):
+        # one count for each edge, each answered from the index on frequency
+        edges = histogram_bins(*self.getFrequencyRange(), bins=bins)
+        with self.lock:
+            below = [self.connection.execute('SELECT COUNT(*) FROM signs WHERE frequency < ?', (low,)).fetchone()[0]
+                     for low, high in edges]
+            below.append(self.connection.execute('SELECT COUNT(*) FROM signs').fetchone()[0])
+        return [(low, high, end - start) for (low, high), start, end in zip(edges, below, below[1:])]
+
+    def coderCounts(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT coder, COUNT(*) FROM signs GROUP BY coder').fetchall()
+        return {coder: count for coder, count in rows}
+
+    def lastUpdatedCounts(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT last_updated, COUNT(*) FROM signs GROUP BY last_updated').fetchall()
+        return {date.fromisoformat(lastUpdated) if lastUpdated else None: count for lastUpdated, count in rows}
+
+    def signsUpdatedBetween(self, first, last):
+        return self.wordlist.select('WHERE last_updated BETWEEN ? AND ?', (first.isoformat(), last.isoformat()))
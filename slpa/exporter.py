@@ -0,0 +1,202 @@
+import json
+import os
+import parameters
+from lexicon import Sign
+from slotstore import HAND_NAMES
+from constants import GLOBAL_OPTIONS, FINGERSPELL_OPTIONS, X_IN_BOX, NULL
+
+BATCH_SIZE = 1000  # rows rendered before they are handed to the file
+BUFFER_SIZE = 1 << 20
+FORMATS = ['tsv', 'jsonl']
+HEADERS = Sign.headers.split('\t')
+OPTIONS = GLOBAL_OPTIONS + FINGERSPELL_OPTIONS
+
+
+def add_fields(transcription):
+    return '[{}]1[{}]2[{}]3[{}]4[{}]5[{}]6[{}]7'.format(transcription[0],
+                                                         ''.join(transcription[1:5]),
+                                                         ''.join(transcription[5:15]),
+                                                         ''.join(transcription[15:19]),
+                                                         ''.join(transcription[19:24]),
+                                                         ''.join(transcription[24:29]),
+                                                         ''.join(transcription[29:34]))
+
+
+def flag_numbers(flags, index):
+    numbers = [str(n + 1) for n, flag in enumerate(flags) if flag[index]]
+    return '-'.join(numbers) if numbers else 'None'
+
+
+def flag_columns(flags):
+    return flag_numbers(flags, 0), flag_numbers(flags, 1)
+
+
+def export_parameters(record, parameter_format='xml'):
+    # exportRecordXML and exportRecordTree are memoized on the record, and most signs share the same few records
+    if parameter_format == 'xml':
+        return parameters.exportXML(record)
+    elif parameter_format == 'txt':
+        return parameters.exportTree(record)
+    return ' '
+
+
+class RowRenderer:
+    """
+    Turns signs into the columns of an exported corpus, one value per entry of Sign.headers. The options of the
+    export dialog are fixed when the renderer is made, and the signs themselves are never modified.
+    Many signs share the same handshapes, flags and parameters, so the columns made for each distinct hand and set
+    of flags, and the encoded parameters, are kept for as long as the renderer is.
+    """
+
+    def __init__(self, include_fields=False, blank_space='_', x_in_box=X_IN_BOX, null=NULL, parameter_format='xml'):
+        self.include_fields = include_fields
+        self.blank_space = blank_space
+        self.null = null
+        self.parameter_format = parameter_format
+        self.replacements = {X_IN_BOX: x_in_box, NULL: null}
+        self.hands = dict()
+        self.flags = dict()
+        self.encodedParameters = {'tsv': dict(), 'jsonl': dict()}
+
+    def hand_columns(self, hand):
+        '''
+        :param hand: a list of 34 slot symbols
+        :return: the transcription string and the list of slot values
+        '''
+        key = tuple(hand)
+        try:
+            return self.hands[key]
+        except KeyError:
+            pass
+        blank_space = self.blank_space
+        first = blank_space if hand[0] == '_' or not hand[0] else 'V'
+        transcription = [first] + [symbol if symbol else blank_space for symbol in hand[1:]]
+        transcription[7] = self.null
+        for n in [19, 24, 29]:
+            if transcription[n] == X_IN_BOX:
+                transcription[n] = self.replacements[X_IN_BOX]
+        if self.include_fields:
+            transcription = add_fields(transcription)
+        else:
+            transcription = ''.join(transcription)
+        replacements = self.replacements
+        slots = [replacements.get(symbol, symbol) for symbol in [first] + hand[1:]]
+        self.hands[key] = transcription, slots
+        return transcription, slots
+
+    def flag_columns(self, flags):
+        key = tuple(flags)
+        try:
+            return self.flags[key]
+        except KeyError:
+            columns = self.flags[key] = flag_columns(flags)
+            return columns
+
+    def columns(self, sign):
+        '''
+        :return: a list of strings, in the order of Sign.headers, without the parameters
+        '''
+        output = [sign.gloss]
+        slots = list()
+        for name in HAND_NAMES:
+            transcription, values = self.hand_columns(getattr(sign, name))
+            output.append(transcription)
+            slots.extend(values)
+            slots.extend(self.flag_columns(sign.flags[name]))
+        output.extend(slots)
+        output.append(str(sign.frequency))
+        output.append(sign.coder)
+        output.append(str(sign.lastUpdated))
+        output.extend('True' if getattr(sign, option) else 'False' for option in OPTIONS)
+        notes = sign.notes if sign.notes else ''
+        output.append(notes.replace('\n', '  ').replace('\t', '    '))
+        return output
+
+    def render(self, sign):
+        '''
+        :return: a list of strings, in the order of Sign.headers
+        '''
+        output = self.columns(sign)
+        output.append(export_parameters(sign.parameters, self.parameter_format))
+        return output
+
+    def tsv(self, sign):
+        return '\t'.join(self.render(sign))
+
+    def jsonl(self, sign):
+        return json.dumps(dict(zip(HEADERS, self.render(sign))), ensure_ascii=False)
+
+    def encoded_parameters(self, record, format):
+        # the parameters are by far the longest column, so they are only encoded once for each distinct record
+        encoded = self.encodedParameters[format]
+        try:
+            return encoded[record]
+        except KeyError:
+            text = export_parameters(record, self.parameter_format)
+            if format == 'jsonl':
+                text = json.dumps(text, ensure_ascii=False)
+            data = encoded[record] = text.encode('utf-8')
+            return data
+
+    def tsv_line(self, sign):
+        '''
+        :return: the same row as tsv(), encoded as UTF-8 and ending in a line break
+        '''
+        return b''.join(['\t'.join(self.columns(sign)).encode('utf-8'), b'\t',
+                         self.encoded_parameters(sign.parameters, 'tsv'), b'\n'])
+
+    def jsonl_line(self, sign):
+        '''
+        :return: the same object as jsonl(), encoded as UTF-8 and ending in a line break
+        '''
+        data = json.dumps(dict(zip(HEADERS, self.columns(sign))), ensure_ascii=False)
+        return b''.join([data[:-1].encode('utf-8'), b', "parameters": ',
+                         self.encoded_parameters(sign.parameters, 'jsonl'), b'}\n'])
+
+
+def export_corpus(corpus, path, format='tsv', include_fields=False, blank_space='_', x_in_box=X_IN_BOX, null=NULL,
+                  parameter_format='xml', batch_size=BATCH_SIZE, call_back=None, stop_check=None):
+    '''
+    Write every sign of a corpus to a file, in batches through a large write buffer. The file at path is only
+    replaced once every sign has been written
+    :param format: 'tsv', which can be imported again, or 'jsonl', one JSON object per sign keyed by the TSV
+    column names
+    :param parameter_format: 'xml', 'txt', or 'none'
+    :param call_back: called with the number of signs written so far and the size of the corpus
+    :param stop_check: called between batches, the export is cancelled if it returns True
+    :return: the number of signs written, or None if the export was cancelled
+    '''
+    if format not in FORMATS:
+        raise ValueError('Unknown export format {}, expected one of {}'.format(format, ', '.join(FORMATS)))
+    renderer = RowRenderer(include_fields, blank_space, x_in_box, null, parameter_format)
+    render = getattr(renderer, format + '_line')
+    total = len(corpus)
+    done = 0
+    # the rows go to a temporary file next to the target, which only replaces it once the export is complete, so
+    # a cancelled or failed export leaves any earlier file at path as it was
+    temporaryPath = path + '.tmp'
+    try:
+        with open(temporaryPath, mode='wb', buffering=BUFFER_SIZE) as f:
+            if format == 'tsv':
+                f.write((Sign.headers + '\n').encode('utf-8'))
+            batch = list()
+            for sign in corpus:
+                batch.append(render(sign))
+                if len(batch) >= batch_size:
+                    if stop_check is not None and stop_check():
+                        return None
+                    f.writelines(batch)
+                    done += len(batch)
+                    batch = list()
+                    if call_back is not None:
+                        call_back(done, total)
+            if batch:
+                f.writelines(batch)
+                done += len(batch)
+        os.replace(temporaryPath, path)
+    finally:
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+    if call_back is not None:
+        call_back(done, total)
+    return done
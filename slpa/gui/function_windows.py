@@ -1,52 +1,70 @@
 from imports import (QThread, Signal, QDialog, QVBoxLayout, QPushButton, QScrollArea, QWidget,
-                     QHBoxLayout, Slot)
+                     QHBoxLayout, Slot, QProgressBar)
+
+PROGRESS_STEPS = 100
 
 
 class FunctionWorker(QThread):
     dataReady = Signal(object)
+    batchReady = Signal(object)
+    updateProgress = Signal(object)
+    updateProgressText = Signal(str)
 
     def __init__(self):
         super().__init__()
-        #self.stopped = False
+        self.stopped = False
 
     def run(self):
         pass  #implement in subclass
 
     def setParams(self, kwargs):
         self.kwargs = kwargs
-        #self.kwargs['call_back'] = self.emitProgress
-        #self.kwargs['stop_check'] = self.stopCheck
-        #self.stopped = False
-        #self.total = None
-
-#    def closeEvent(self, event):
-#        self.stop()
-
-#    def stop(self):
-#        self.stopped = True
-
-#    def stopCheck(self):
-#        return self.stopped
-
-#    def emitProgress(self,*args):
-#        if isinstance(args[0],str):
-#            self.updateProgressText.emit(args[0])
-#            return
-#        elif isinstance(args[0],dict):
-#            self.updateProgressText.emit(args[0]['status'])
-#            return
-#        else:
-#            progress = args[0]
-#            if len(args) > 1:
-#                self.total = args[1]
-#        if self.total:
-#            self.updateProgress.emit((progress/self.total))
+        self.kwargs['call_back'] = self.emitProgress
+        self.kwargs['stop_check'] = self.stopCheck
+        self.stopped = False
+        self.total = None
+
+    def emitBatches(self, batches):
+        '''
+        Emit each batch of results of a search as soon as it is found, then all of them together once the search
+        is over or has been stopped
+        :param batches: an iterator of lists, e.g. from analysis.vectorized.stream_function
+        '''
+        results = list()
+        for batch in batches:
+            results.extend(batch)
+            self.batchReady.emit(batch)
+        self.dataReady.emit(results)
+
+    def closeEvent(self, event):
+        self.stop()
+
+    def stop(self):
+        self.stopped = True
+
+    def stopCheck(self):
+        return self.stopped
+
+    def emitProgress(self, *args):
+        if isinstance(args[0], str):
+            self.updateProgressText.emit(args[0])
+            return
+        elif isinstance(args[0], dict):
+            self.updateProgressText.emit(args[0]['status'])
+            return
+        else:
+            progress = args[0]
+            if len(args) > 1:
+                self.total = args[1]
+        if self.total:
+            self.updateProgress.emit((progress/self.total))
 
 
 class FunctionDialog(QDialog):
     header = None
     about = None
     name = ''
+    rowsReady = Signal(object)
 
     def __init__(self, parent, settings, worker):
         super().__init__(parent)
@@ -65,6 +83,10 @@ class FunctionDialog(QDialog):
         self.cancelButton = QPushButton('Cancel')
         self.cancelButton.clicked.connect(self.reject)
 
+        self.progressBar = QProgressBar()
+        self.progressBar.setRange(0, PROGRESS_STEPS)
+        self.progressBar.hide()
+
         self.aboutButton = QPushButton('About {}...'.format(self.name))
         self.aboutButton.clicked.connect(self.open_about)
 
@@ -74,8 +96,13 @@ class FunctionDialog(QDialog):
         acLayout.addWidget(self.cancelButton)
         acLayout.addWidget(self.aboutButton)
 
+        self.results = list()
+        self.update = False
         self.thread = worker
+        self.thread.batchReady.connect(self.addResults)
         self.thread.dataReady.connect(self.setResults)
+        self.thread.updateProgress.connect(self.updateProgress)
+        self.thread.finished.connect(self.progressBar.hide)
 
         #if self.settings['tooltips']:
         #    self.aboutButton.setToolTip(('<FONT COLOR=black>'
@@ -85,13 +112,35 @@ class FunctionDialog(QDialog):
 
         majorLayout = QVBoxLayout()
         majorLayout.addLayout(acLayout)
+        majorLayout.addWidget(self.progressBar)
 
         self.setLayout(majorLayout)
         self.resize(1000, 500)
 
+    def resultRow(self, sign):
+        pass  # Implemented in subclasses, returns a dictionary with a value for each column of header
+
+    @Slot(object)
+    def addResults(self, signs):
+        '''
+        Add a batch of signs to the results while the search is still running. The dialog is accepted with the
+        first batch, so that the results window can show them and the rest as they come.
+        '''
+        rows = [self.resultRow(sign) for sign in signs]
+        self.results.extend(rows)
+        self.rowsReady.emit(rows)
+        if self.isVisible():
+            self.accept()
+
     @Slot(object)
     def setResults(self, results):
-        pass  # Implemented in subclasses
+        # every batch has already been added, but a search that found nothing still has to close the dialog
+        if self.isVisible():
+            self.accept()
+
+    @Slot(object)
+    def updateProgress(self, progress):
+        self.progressBar.setValue(int(progress * PROGRESS_STEPS))
 
     def generateKwargs(self):
         pass  # Implemented in subclasses
@@ -100,6 +149,10 @@ class FunctionDialog(QDialog):
         kwargs = self.generateKwargs()
         #if kwargs is None:
         #    return
+        self.stop()
+        self.results = list()
+        self.progressBar.setValue(0)
+        self.progressBar.show()
         self.thread.setParams(kwargs)
         self.thread.start()
 
@@ -109,6 +162,18 @@ class FunctionDialog(QDialog):
         #if result:
         #self.accept()
 
+    def stop(self):
+        '''
+        Stop the search that is running, if any, and wait for it to return what it has found so far
+        '''
+        if self.thread.isRunning():
+            self.thread.stop()
+            self.thread.wait()
+
+    def reject(self):
+        self.stop()
+        super().reject()
+
     def newTable(self):
         self.update = False
         self.calc()
@@ -179,7 +179,7 @@ class FunctionalLoadDialog(QDialog):
             print('{} DUCTION'.format(duction.upper()))
             print('Starting size = {}\nStarting entropy = {}'.format(corpus_size, starting_h))
             new_corpus = defaultdict(int)
-            for word in self.corpus:
+            for word in self.corpus.unorderedSigns():
                 ch = word.config1hand1.copy()
                 ch[slot] = 'X'
                 new_corpus[''.join(ch)] += 1
@@ -191,7 +191,7 @@ class FunctionalLoadDialog(QDialog):
             print('{} DUCTION'.format(duction.upper()))
             print('Starting size = {}\nStarting entropy = {}'.format(corpus_size, starting_h))
             new_corpus = defaultdict(int)
-            for word in self.corpus:
+            for word in self.corpus.unorderedSigns():
                 ch = word.config1hand1.copy()
                 ch[2] = 'X'
                 ch[19] = 'X'
@@ -218,7 +218,7 @@ class FunctionalLoadDialog(QDialog):
         print('Merging {} and {}'.format(symbolA, symbolB))
         print('Starting size = {}\nStarting entropy = {}'.format(corpus_size, starting_h))
         new_corpus = defaultdict(int)
-        for word in self.corpus:
+        for word in self.corpus.unorderedSigns():
             ch = word.config1hand1.copy()
             for slot in slots:
                 if ch[slot] in [symbolA, symbolB]:
@@ -260,7 +260,7 @@ class FunctionalLoadDialog(QDialog):
             print('{} {} JOINTS'.format(finger.upper(), joint.upper()))
             print('Starting size = {}\nStarting entropy = {}'.format(corpus_size, starting_h))
             new_corpus = defaultdict(int)
-            for word in self.corpus:
+            for word in self.corpus.unorderedSigns():
                 ch = word.config1hand1.copy()
                 ch[slot] = 'X'
                 new_corpus[''.join(ch)] += 1
@@ -280,7 +280,7 @@ class FunctionalLoadDialog(QDialog):
                 print('ALL {} JOINTS'.format(finger.upper()))
                 print('Starting size = {}\nStarting entropy = {}'.format(corpus_size, starting_h))
                 new_corpus = defaultdict(int)
-                for word in self.corpus:
+                for word in self.corpus.unorderedSigns():
                     ch = word.config1hand1.copy()
                     ch[slot] = 'X' #proximal
                     ch[slot+1] = 'X' #medial
@@ -307,7 +307,7 @@ class FunctionalLoadDialog(QDialog):
                 print('Starting size = {}\nStarting entropy = {}'.format(corpus_size, starting_h))
                 # for finger,slot in [('INDEX', 17), ('MIDDLE',22), ('RING',27), ('PINKY',32)]:
                 new_corpus = defaultdict(int)
-                for word in self.corpus:
+                for word in self.corpus.unorderedSigns():
                     ch = word.config1hand1.copy()
                     ch[slot] = 'X'
                     ch[slot+5] = 'X'
@@ -326,7 +326,7 @@ class FunctionalLoadDialog(QDialog):
                     print('ALL {} JOINTS'.format(joint.upper()))
                     print('Starting size = {}\nStarting entropy = {}'.format(corpus_size, starting_h))
                     new_corpus = defaultdict(int)
-                    for word in self.corpus:
+                    for word in self.corpus.unorderedSigns():
                         ch = word.config1hand1.copy()
                         ch[slot] = 'X'
                         ch[slot+1] = 'X'
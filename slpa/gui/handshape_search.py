@@ -6,7 +6,9 @@ from constants import GLOBAL_OPTIONS
 from gui.function_windows import FunctionDialog, FunctionWorker
 from gui.helperwidgets import LogicRadioButtonGroup
 from analysis.handshape_search import handshape_search
+from analysis.vectorized import stream_function
 import sys
+from operator import not_, truth
 from pprint import pprint
 from image import getMediaFilePath
 
@@ -119,9 +121,9 @@ class ConfigHandPanel(QGroupBox):
     def value(self):
         labels = {self.selectionList.item(i).text() for i in range(self.selectionList.count())}
         if self.positive.isChecked():  # Set negative
-            operator = lambda x: not x
+            operator = not_
         else:
-            operator = lambda x: x
+            operator = truth
         #labels = set()
         #numItems = self.selectionList.count()
         #for i in range(numItems):
@@ -186,8 +188,9 @@ class HSWorker(FunctionWorker):
         c2h1 = self.kwargs.pop('config2hand1')
         c2h2 = self.kwargs.pop('config2hand2')
 
-        results = handshape_search(corpus, forearm, estimated, uncertain, incomplete, configuration, hand, logic, c1h1, c1h2, c2h1, c2h2)
-        self.dataReady.emit(results)
+        search = stream_function(handshape_search)
+        self.emitBatches(search(corpus, forearm, estimated, uncertain, incomplete, configuration, hand, logic,
+                                c1h1, c1h2, c2h1, c2h2, call_back=self.emitProgress, stop_check=self.stopCheck))
 
 
 class HandshapeSearchDialog(FunctionDialog):
@@ -397,17 +400,12 @@ class HandshapeSearchDialog(FunctionDialog):
 
         return kwargs
 
-    @Slot(object)
-    def setResults(self, results):
+    def resultRow(self, sign):
         #TODO: need to modify token frequency when implemented (right not there is not frquency info)
-        #TODO: double check thread method to properly place accept()
-        self.results = list()
-        for sign in results:
-            self.results.append({'Corpus': self.corpus.name,
-                                 'Sign': sign.gloss,
-                                 'Token frequency': 1,
-                                 'Note': self.notePanel.text()})
-        self.accept()
+        return {'Corpus': self.corpus.name,
+                'Sign': sign.gloss,
+                'Token frequency': 1,
+                'Note': self.notePanel.text()}
 
 #app = QApplication(sys.argv)
 #main = HandshapeSearchDialog(None, None, None, None)
@@ -1,3 +1,4 @@
+import re
 import itertools
 import subprocess
 import collections
@@ -20,7 +21,13 @@ from gui.parameterwidgets import ParameterDialog, ParameterTreeModel
 from gui.transcription_search import TranscriptionSearchDialog
 from gui.handshape_search import HandshapeSearchDialog
 from gui.phonological_search import ExtendedFingerSearchDialog
+from gui.similarity_search import SimilaritySearchDialog
 from gui.results_windows import ResultsWindow, SearchResultsWindow
+from gui.function_windows import FunctionWorker
+from importer import import_corpus
+from exporter import export_corpus, RowRenderer
+from analysis import vectorized
+from analysis.result_cache import cached_search
 from gui.helperwidgets import PredefinedHandshapeDialog
 import __init__
 from pprint import pprint
@@ -31,6 +38,21 @@ FONT_NAME = 'Arial'
 FONT_SIZE = 12
 
 
+class ImportWorker(FunctionWorker):
+    def run(self):
+        corpus = import_corpus(**self.kwargs)
+        self.dataReady.emit(corpus)
+
+
+class ExportWorker(FunctionWorker):
+    def run(self):
+        try:
+            exported = export_corpus(**self.kwargs)
+        except PermissionError as e:
+            exported = e
+        self.dataReady.emit((self.kwargs['path'], exported))
+
+
 class DockWidget(QWidget):
     def sizeHint(self):
         return QSize(100, 500)
@@ -449,7 +471,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(mainScroll)
 
         self.parameterDialog = None
-        self.setupParameterDialog(ParameterTreeModel(parameters.defaultParameters))
+        self.setupParameterDialog(parameters.defaultRecord)
         self.initCorpusNotes()
         #self.initSignNotes()
         self.makeCorpusDock()
@@ -513,14 +535,15 @@ class MainWindow(QMainWindow):
         if alert.buttonRole(alert.clickedButton()) == QMessageBox.NoRole:
             return
         else:
-            del self.corpus.wordlist[gloss]
+            self.corpus.removeWord(gloss)
             for n in range(self.corpusList.count()):
                 item = self.corpusList.item(n)
                 if item.text() == gloss:
                     goodbye = self.corpusList.takeItem(n)
                     del goodbye
                     break
-            save_binary(self.corpus, self.corpus.path)
+            if self.corpus.journal is None:
+                save_corpus(self.corpus)
             self.newGloss()
 
     def setupGlobalOptions(self):
@@ -539,20 +562,24 @@ class MainWindow(QMainWindow):
     def checkForearm(self):
         self.forearmChecked.emit(self.forearmCheckBox.isChecked())
 
-    def setupParameterDialog(self, model):
-        currentGloss = self.currentGloss()
-        # if self.corpus is not None and currentGloss:
-        #     model = self.corpus[currentGloss].parameters
-        # else:
-        #     model = ParameterTreeModel(parameters.defaultParameters)
+    def setupParameterDialog(self, record):
+        #the dialog and its tree model are only built once the user wants to see them, see getParameterDialog()
+        self.parameterRecord = record
+        if self.parameterDialog is not None:
+            self.parameterDialog.close()
+            self.parameterDialog.deleteLater()
+            self.parameterDialog = None
 
+    def getParameterDialog(self):
         if self.parameterDialog is None:
+            model = ParameterTreeModel(parameters.parametersFromRecord(self.parameterRecord))
             self.parameterDialog = ParameterDialog(model)
-            #self.parameterDialog.reset()
-        else:
-            self.parameterDialog.close()
-            self.parameterDialog.deleteLater()
-            self.parameterDialog = ParameterDialog(model, checkStrategy='load')
+        return self.parameterDialog
+
+    def currentParameters(self):
+        if self.parameterDialog is None:
+            return self.parameterRecord
+        return parameters.recordFromParameters(self.parameterDialog.saveParameters())
 
     def currentHandShape(self):
         kwargs = self.generateKwargs()
@@ -563,9 +590,10 @@ class MainWindow(QMainWindow):
         return self.gloss.glossEdit.text()
 
     def showParameterTree(self):
-        self.parameterDialog.resize(self.parameterDialog.adjustedWidth, self.parameterDialog.adjustedHeight)
-        self.parameterDialog.move(self.parameterDialog.adjustedPos)
-        self.parameterDialog.show()
+        parameterDialog = self.getParameterDialog()
+        parameterDialog.resize(parameterDialog.adjustedWidth, parameterDialog.adjustedHeight)
+        parameterDialog.move(parameterDialog.adjustedPos)
+        parameterDialog.show()
 
     def keyPressEvent(self, e):
         key = e.key()
@@ -678,6 +706,7 @@ class MainWindow(QMainWindow):
         self.settings.setValue('parametersAlwaysOnTop', self.keepParametersOnTopAct.isChecked())
         self.settings.setValue('restrictedTranscriptions', self.setRestrictionsAct.isChecked())
         self.settings.setValue('autoSave', self.autoSaveAct.isChecked())
+        self.settings.setValue('searchBackend', vectorized.backend)
         self.settings.setValue('blenderPath', self.blenderPath)
         self.settings.setValue('previousFolderPath', self.previousFolderPath)
         self.settings.endGroup()
@@ -722,6 +751,13 @@ class MainWindow(QMainWindow):
         self.transcriptionRestrictionsChanged.emit(self.restrictedTranscriptions)
         self.autoSave = self.settings.value('autosave', type=bool)
         self.autoSaveAct.setChecked(self.autoSave)
+        searchBackend = self.settings.value('searchBackend', defaultValue=vectorized.PYTHON, type=str)
+        if searchBackend not in vectorized.available_backends():
+            # e.g. NumPy was uninstalled since the setting was saved
+            searchBackend = vectorized.PYTHON
+        vectorized.select_backend(searchBackend)
+        self.useNumpyAct.setChecked(searchBackend == vectorized.NUMPY)
+        self.useProcessesAct.setChecked(searchBackend == vectorized.PARALLEL)
         self.blenderPath = self.settings.value('blenderPath')
         self.previousFolderPath = self.settings.value('previousFolderPath', defaultValue=os.getcwd(), type=str)
         self.settings.endGroup()
@@ -753,8 +789,8 @@ class MainWindow(QMainWindow):
             word.flags = Sign.sign_attributes['flags'].copy()
             newCorpus.addWord(word)
         newCorpus.path = path
-        save_binary(newCorpus, newCorpus.path)
-        self.corpus = load_binary(newCorpus.path)
+        save_corpus(newCorpus)
+        self.corpus = newCorpus
 
     def checkForFlags(self):
         for word in self.corpus:
@@ -763,6 +799,7 @@ class MainWindow(QMainWindow):
                 newflags[key] = [Flag(v, False) for v in value]
                 #SET TO UNCERTAIN
             word.flags = newflags
+            self.corpus.wordlist[word.gloss] = word
 
     def checkBackwardsComptibility(self, forceUpdate=False):
 
@@ -772,14 +809,8 @@ class MainWindow(QMainWindow):
 
         word = self.corpus.randomWord()
 
-        oldParameterTreeMethods = dir(word.parameters)
-        currentParameterTreeMethods = dir(ParameterTreeModel)
-        for method in currentParameterTreeMethods:
-            if not method in oldParameterTreeMethods:
-                updateParameters = True
-                break
-        else:
-            updateParameters = False
+        #parameters that are not yet stored as a ParameterRecord are converted by Sign.parameters
+        updateParameters = 'parameters' in word.__dict__
 
 
         for attribute, default_value in Sign.sign_attributes.items():
@@ -817,15 +848,11 @@ class MainWindow(QMainWindow):
                         word.oneHandMovement = word.movement
                         del word.movement
             if updateParameters:
-                try:
-                    params = word.parameters.parameterList
-                    newTree = ParameterTreeModel(params)
-                except AttributeError:#occurs with older copora where ParameterNode and anytree.Nodes are intermixed
-                    newTree = ParameterTreeModel(parameters.defaultParameters)
-                word.parameters = newTree
+                word.parameters = word.parameters
+            # signs are not necessarily kept in memory, so the updated copy has to be put back
+            self.corpus.wordlist[word.gloss] = word
 
-        save_binary(self.corpus, self.corpus.path)
-        self.corpus = load_binary(self.corpus.path)
+        save_corpus(self.corpus)
 
     def getOrCreateCorpusPath(self):
         if os.path.exists(self.corpus.path):
@@ -994,14 +1021,14 @@ class MainWindow(QMainWindow):
         self.addDockWidget(Qt.RightDockWidgetArea, self.corpusDock)
 
     def loadCorpus(self, showFileDialog = True):
-        file_path = QFileDialog.getOpenFileName(self, 'Open Corpus File', self.previousFolderPath, '*.corpus')
+        file_path = QFileDialog.getOpenFileName(self, 'Open Corpus File', self.previousFolderPath,
+                                                '*.corpus *{}'.format(DATABASE_EXTENSION))
         file_path = file_path[0]
 
         if not file_path:
             return None
         self.previousFolderPath = file_path
-        self.corpus = load_binary(file_path)
-        self.corpus.path = file_path
+        self.corpus = load_corpus(file_path)
         #self.checkBackwardsComptibility()
         self.setupNewCorpus()
 
@@ -1011,10 +1038,8 @@ class MainWindow(QMainWindow):
         self.newGloss()
         self.corpusDock.setWindowTitle(self.corpus.name)
 
-        for sign in self.corpus:
-            self.corpusList.addItem(sign.gloss)
-
-        self.corpusList.sortItems()
+        #glosses() is already sorted
+        self.corpusList.addItems(self.corpus.glosses())
         self.corpusList.setCurrentRow(0)
         self.corpusList.itemClicked.emit(self.corpusList.currentItem())
         self.corpusNotes.setText(self.corpus.notes)
@@ -1030,16 +1055,18 @@ class MainWindow(QMainWindow):
         if self.corpus is None:
             self.saveCorpus()
         else:
-            savename = QFileDialog.getSaveFileName(self, 'Save Corpus File As', 'corpus', '*.corpus')
+            savename = QFileDialog.getSaveFileName(self, 'Save Corpus File As', 'corpus',
+                                                   '*.corpus;;*{}'.format(DATABASE_EXTENSION))
             path = savename[0]
             if not path:
                 return
-            if not path.endswith('.corpus'):
+            if not path.endswith('.corpus') and not path.endswith(DATABASE_EXTENSION):
                 path = path + '.corpus'
             self.corpus.path = path
             self.corpus.name = os.path.split(path)[1].split('.')[0]
-            save_binary(self.corpus, path)
-            self.corpus = load_binary(path)
+            save_corpus(self.corpus, path)
+            if path.endswith(DATABASE_EXTENSION):
+                self.corpus = load_corpus(path)
 
     @decorators.checkForGloss
     #@decorators.checkForCorpus
@@ -1066,6 +1093,7 @@ class MainWindow(QMainWindow):
                 kwargs['path'] = path
                 kwargs['name'] = os.path.split(path)[1].split('.')[0]
                 self.corpus = Corpus(kwargs)
+                save_corpus(self.corpus)
 
             elif role == QMessageBox.NoRole:  # load existing corpus and add to it
                 self.loadCorpus()
@@ -1094,8 +1122,9 @@ class MainWindow(QMainWindow):
                 return
 
         self.updateCorpus(kwargs, isDuplicate)
-        save_binary(self.corpus, self.corpus.path)
-        self.corpus = load_binary(self.corpus.path)
+        if self.corpus.journal is None:
+            # e.g. a corpus that was imported from a text file and has never been written out
+            save_corpus(self.corpus)
         if self.showSaveAlert:
             QMessageBox.information(self, 'Success', 'Corpus successfully updated!')
         self.askSaveChanges = False
@@ -1104,7 +1133,7 @@ class MainWindow(QMainWindow):
     def updateCorpus(self, kwargs, isDuplicate=False):
         sign = Sign(kwargs)
         self.corpus.addWord(sign)
-        self.corpus.corpusNotes = kwargs['corpusNotes']
+        self.corpus.updateAttribute('corpusNotes', kwargs['corpusNotes'])
         if not isDuplicate:
             self.corpusList.addItem(kwargs['gloss'])
             self.corpusList.sortItems()
@@ -1162,8 +1191,7 @@ class MainWindow(QMainWindow):
                     slot.setText('' if text == '_' else text)
                     slot.updateFlags(sign.flags[name][slot.num - 1])
 
-        model = ParameterTreeModel(sign.parameters)
-        self.setupParameterDialog(model)
+        self.setupParameterDialog(sign.parameters)
         for option in GLOBAL_OPTIONS:
             name = option+'CheckBox'
             widget = getattr(self, name)
@@ -1205,7 +1233,7 @@ class MainWindow(QMainWindow):
                  'config2hand1': self.configTabs.widget(1).hand1Transcription.flags(),
                  'config2hand2': self.configTabs.widget(1).hand2Transcription.flags()}
         kwargs['flags'] = flags
-        kwargs['parameters'] = self.parameterDialog.saveParameters()
+        kwargs['parameters'] = self.currentParameters()
         kwargs['corpusNotes'] = self.corpusNotes.getText()
         kwargs['signNotes'] = self.transcriptionInfo.signNoteText.text()
         #kwargs['signNotes'] = self.signNotes.getText()
@@ -1259,6 +1287,8 @@ class MainWindow(QMainWindow):
 
         self.settingsMenu = self.menuBar().addMenu('&Options')
         self.settingsMenu.addAction(self.autoSaveAct)
+        self.settingsMenu.addAction(self.useNumpyAct)
+        self.settingsMenu.addAction(self.useProcessesAct)
         self.settingsMenu.addAction(self.alertOnCorpusSaveAct)
         self.settingsMenu.addAction(self.keepParametersOnTopAct)
         self.settingsMenu.addAction(self.askAboutDuplicatesAct)
@@ -1308,9 +1338,9 @@ class MainWindow(QMainWindow):
 
     def keepParametersOnTop(self):
         if self.keepParametersOnTopAct.isChecked():
-            self.parameterDialog.setWindowFlags(Qt.WindowStaysOnTopHint)
+            self.getParameterDialog().setWindowFlags(Qt.WindowStaysOnTopHint)
             self.parameterDialog.show()
-        else:
+        elif self.parameterDialog is not None:
             self.parameterDialog.setWindowFlags(self.parameterDialog.windowFlags() ^ Qt.WindowStaysOnTopHint)
             self.parameterDialog.hide()
 
@@ -1329,6 +1359,19 @@ class MainWindow(QMainWindow):
         else:
             self.autoSave = False
 
+    def setSearchBackend(self):
+        # the two options exclude each other, the one that was just checked wins
+        if self.sender() is self.useProcessesAct and self.useProcessesAct.isChecked():
+            self.useNumpyAct.setChecked(False)
+        elif self.useNumpyAct.isChecked():
+            self.useProcessesAct.setChecked(False)
+        if self.useNumpyAct.isChecked():
+            vectorized.select_backend(vectorized.NUMPY)
+        elif self.useProcessesAct.isChecked():
+            vectorized.select_backend(vectorized.PARALLEL)
+        else:
+            vectorized.select_backend(vectorized.PYTHON)
+
     def changeTranscriptionFlags(self):
         config1 = self.configTabs.widget(0)
         config2 = self.configTabs.widget(1)
@@ -1352,6 +1395,14 @@ class MainWindow(QMainWindow):
         transcriptions.append(self.configTabs.widget(1).hand2Transcription)
         return transcriptions
 
+    def regExSearch(self, expressions):
+        # running a recent search again on a corpus that has not changed takes its results from the cache
+        expressions = tuple(expressions)
+        patterns = [re.compile(expression) for expression in expressions]
+        return cached_search(self.corpus, ('regular expressions',) + expressions,
+                             lambda: self.corpus.regExSearch(expressions),
+                             lambda sign: self.corpus.matchesRegEx(sign, patterns))
+
     def searchCorpus(self, searchType = 'transcriptions'):
         if not self.corpus:
             alert = QMessageBox()
@@ -1375,13 +1426,13 @@ class MainWindow(QMainWindow):
 
 
         if searchType == 'transcriptions':
-            matches = self.corpus.regExSearch(dialog.regularExpressions)
+            matches = self.regExSearch(dialog.regularExpressions)
             search = RecentSearch(dialog.transcriptions, dialog.regularExpressions, matches)
             self.recentTranscriptionSearches.appendleft(search)
             self.transcriptionSearchBlankOption = dialog.blankValue
             self.transcriptionSearchWildcard = dialog.wildcard
         elif searchType == 'phrases':
-            matches = self.corpus.regExSearch(dialog.regularExpressions)
+            matches = self.regExSearch(dialog.regularExpressions)
             search = RecentSearch(dialog.phrases, dialog.regularExpressions, matches)
             self.recentPhraseSearches.appendleft(search)
         elif searchType == 'gloss':
@@ -1505,7 +1556,7 @@ class MainWindow(QMainWindow):
         dialog.exec_()
 
         if dialog.filename:
-            corpus2 = load_binary(dialog.filename)
+            corpus2 = load_corpus(dialog.filename)
             for sign in corpus2:
                 if sign.gloss in self.corpus:
                     alert = MergeCorpusMessageBox()
@@ -1513,7 +1564,7 @@ class MainWindow(QMainWindow):
                     alert.exec_()
                 else:
                     self.corpus.addWord(sign)
-            save_binary(self.corpus, self.corpus.path)
+            save_corpus(self.corpus)
             currentGloss = self.currentGloss()
             self.setupNewCorpus()
 
@@ -1592,6 +1643,19 @@ class MainWindow(QMainWindow):
                                    checkable=True,
                                    triggered=self.setAutoSave)
 
+        self.useNumpyAct = QAction('Use &NumPy for searches',
+                                   self,
+                                   statusTip='Search the whole corpus at once with NumPy arrays',
+                                   checkable=True,
+                                   enabled=vectorized.NUMPY in vectorized.available_backends(),
+                                   triggered=self.setSearchBackend)
+
+        self.useProcessesAct = QAction('Search in &parallel processes',
+                                       self,
+                                       statusTip='Split searches of large corpora between several processes',
+                                       checkable=True,
+                                       triggered=self.setSearchBackend)
+
         self.forceCompatibilityUpdateAct = QAction('Force compatibility update',
                                                    self,
                                                    triggered=self.forceComptibilityUpdate)
@@ -1742,10 +1806,8 @@ class MainWindow(QMainWindow):
         if not file_path:
             return
         self.previousFolderPath = file_path
-        self.corpus = load_binary(file_path)
-        self.corpus.path = file_path
+        self.corpus = load_corpus(file_path)
         self.checkBackwardsComptibility(forceUpdate=True)
-        save_binary(self.corpus, self.corpus.path)
         alert = QMessageBox()
         alert.setText('Corpus updated!')
         alert.exec_()
@@ -1822,104 +1884,45 @@ class MainWindow(QMainWindow):
                 kwargs['x_in_box'] = x_in_box
             if null:
                 kwargs['null'] = null
-            #output = [word.export(**kwargs) for word in self.corpus]
-            try:
-                with open(path, encoding='utf-8', mode='w') as f:
-                    print(Sign.headers, file=f)
-                    for sign in self.corpus:
-                        kwargs['sign'] = sign
-                        output = self.getSignDataForExport(**kwargs)
-                        print(output, file=f)
-                if self.showSaveAlert:
-                    QMessageBox.information(self, 'Success', 'Corpus successfully exported!')
-            except PermissionError:
-                filename = os.path.split(path)[-1]
-                alert = QMessageBox()
-                alert.setWindowTitle('Error encountered')
-                alert.setText('The file {} is already open in a program on your computer. Please close the file before '
-                              'saving, or else choose a different file name.'.format(filename))
-                alert.exec_()
+            kwargs['corpus'] = self.corpus
+            kwargs['path'] = path
+            kwargs['format'] = dialog.exportFormat
+            filename = os.path.split(path)[-1]
+            self.exportWorker = ExportWorker()
+            self.exportWorker.setParams(kwargs)
+            self.exportProgress = QProgressDialog('Exporting {}...'.format(filename), 'Cancel', 0, 100, self)
+            self.exportProgress.setWindowTitle('Export corpus')
+            self.exportProgress.setWindowModality(Qt.WindowModal)
+            self.exportProgress.setAutoClose(False)
+            self.exportProgress.setAutoReset(False)
+            self.exportProgress.canceled.connect(self.exportWorker.stop)
+            self.exportWorker.updateProgress.connect(self.updateExportProgress)
+            self.exportWorker.dataReady.connect(self.finishExport)
+            self.exportWorker.finished.connect(self.exportProgress.close)
+            self.exportWorker.start()
+            self.exportProgress.show()
+
+    def updateExportProgress(self, progress):
+        self.exportProgress.setValue(int(progress * 100))
+
+    def finishExport(self, result):
+        path, exported = result
+        if isinstance(exported, PermissionError):
+            filename = os.path.split(path)[-1]
+            alert = QMessageBox()
+            alert.setWindowTitle('Error encountered')
+            alert.setText('The file {} is already open in a program on your computer. Please close the file before '
+                          'saving, or else choose a different file name.'.format(filename))
+            alert.exec_()
+        elif exported is not None and self.showSaveAlert:
+            #exported is None if the export was cancelled
+            QMessageBox.information(self, 'Success', 'Corpus successfully exported!')
 
     @classmethod
     def getSignDataForExport(self, sign=None, include_fields=False, blank_space='_', x_in_box=X_IN_BOX, null=NULL,
                              parameter_format='xml'):
-
-        def add_fields(transcription):
-            transcription = '[{}]1[{}]2[{}]3[{}]4[{}]5[{}]6[{}]7'.format(transcription[0],
-                                                                         ''.join(transcription[1:5]),
-                                                                         ''.join(transcription[5:15]),
-                                                                         ''.join(transcription[15:19]),
-                                                                         ''.join(transcription[19:24]),
-                                                                         ''.join(transcription[24:29]),
-                                                                         ''.join(transcription[29:34]))
-            return transcription
-
-        output = list()
-        output.append(sign.gloss)
-        for config_num in [1, 2]:
-            for hand_num in [1, 2]:
-                hand = getattr(sign, 'config{}hand{}'.format(config_num, hand_num))
-                if hand[0] == '_' or not hand[0]:
-                    hand[0] = blank_space
-                else:
-                    hand[0] = 'V'
-                transcription = [x if x else blank_space for x in hand]
-                transcription[7] = null
-                if transcription[19] == X_IN_BOX:
-                    transcription[19] = x_in_box
-                if transcription[24] == X_IN_BOX:
-                    transcription[24] = x_in_box
-                if transcription[29] == X_IN_BOX:
-                    transcription[29] = x_in_box
-                if include_fields:
-                    transcription = add_fields(transcription)
-                output.append(''.join(transcription))
-
-        for config_num in [1, 2]:
-            for hand_num in [1, 2]:
-                slot_list = getattr(sign, 'config{}hand{}'.format(config_num, hand_num))
-                for slot_num in range(34):
-                    symbol = slot_list[slot_num]
-                    if symbol == X_IN_BOX:
-                        symbol = x_in_box
-                    if symbol == NULL:
-                        symbol = null
-                    output.append(symbol)
-
-                uncertain, estimates = list(), list()
-                key_name = 'config{}hand{}'.format(config_num, hand_num)
-                for i, flag in enumerate(sign.flags[key_name]):
-                    if flag.isUncertain:
-                        uncertain.append(str(i + 1))
-                    if flag.isEstimate:
-                        estimates.append(str(i + 1))
-                uncertain = 'None' if not uncertain else '-'.join(uncertain)
-                estimates = 'None' if not estimates else '-'.join(estimates)
-                output.append(uncertain)
-                output.append(estimates)
-
-        output.append(str(sign.frequency))
-        output.append(sign.coder)
-        output.append(str(sign.lastUpdated))
-
-        for option in GLOBAL_OPTIONS:
-            output.append('True' if getattr(sign, option) else 'False')
-
-        for option in FINGERSPELL_OPTIONS:
-            output.append('True' if getattr(sign, option) else 'False')
-
-        notes = ''.join([n.replace('\n', '  ').replace('\t', '    ') for n in sign.notes])
-        output.append(notes)
-        if parameter_format == 'xml':
-            outputParameters = parameters.exportXML(sign.parameters)
-        elif parameter_format == 'txt':
-            outputParameters = parameters.exportTree(sign.parameters)
-        elif parameter_format == 'none':
-            outputParameters = ' '
-        output.append(outputParameters)
-        output = '\t'.join(output)
-
-        return output
+        renderer = RowRenderer(include_fields, blank_space, x_in_box, null, parameter_format)
+        return renderer.tsv(sign)
 
     def importCorpus(self):
         if self.corpus is not None:
@@ -1967,69 +1970,36 @@ class MainWindow(QMainWindow):
         else:
             corpus = Corpus({'name': filename, 'path':os.path.join(filepath, filename+'.corpus')})
 
-        with open(os.path.join(filepath, filename+'.tsv'), mode='r', encoding='utf-8') as f:
-            headers = f.readline().strip()
-            headers = headers.split('\t')
-            #print('headers', headers)
-            start = f.tell()
-            #print('start', start)
+        path = os.path.join(filepath, filename+'.tsv')
+        with open(path, mode='r', encoding='utf-8') as f:
+            f.readline()
             firstline = f.readline()
-            #print('firstline', firstline)
             params = firstline.split('\t')[-1].strip()
-            verfied, useDefaultParameters = self.verifyParametersForImport(params)
-            if not verfied:
-                return
-            f.seek(start)
-
-            for line in f:
-                line = line.strip()
-                line = line.split('\t')
-                data = {h: l for h, l in zip(headers, line)}
-                kwargs = dict()
-                flags = dict()
-                transcriptions = [[[None for n in range(34)], [None for n in range(34)]],
-                                  [[None for n in range(34)], [None for n in range(34)]]]
-                for config in [1, 2]:
-                    for hand in [1, 2]:
-                        for n in range(1,35):
-                            name = 'config{}hand{}slot{}'.format(config, hand, n)
-                            transcriptions[config-1][hand-1][n-1] = data[name]
-
-                        uncertain = data['config{}hand{}uncertain'.format(config, hand)]
-                        if uncertain == 'None':
-                            uncertain = list()
-                        else:
-                            uncertain = [int(n) for n in uncertain.split('-')]
-
-                        estimated = data['config{}hand{}estimated'.format(config, hand)]
-                        if estimated == 'None':
-                            estimated = list()
-                        else:
-                            estimated = [int(n) for n in estimated.split('-')]
-
-                        confighand = 'config{}hand{}'.format(config, hand)
-                        flags[confighand] = [Flag(True if n in uncertain else False, True if n in estimated else False)
-                                             for n in range(34)]
-                kwargs['config1'] = transcriptions[0]
-                kwargs['config2'] = transcriptions[1]
-                kwargs['flags'] = flags
-                kwargs['gloss'] = data['gloss']
-                for option in GLOBAL_OPTIONS:  #GLOBAL_OPTIONS = ['forearm', 'estimated', 'uncertain', 'incomplete']
-                    kwargs[option] = True if data[option] == 'True' else False
-                for option in FINGERSPELL_OPTIONS:
-                    kwargs[option] = True if data[option] == 'True' else False
-                if useDefaultParameters:
-                    model = ParameterTreeModel(parameters.defaultParameters)
-                else:
-                    model = ParameterTreeModel(data['parameters'], fromXML=True)
-                kwargs['_frequency'] = float(data['frequency'])
-                kwargs['_coder'] = data['coder']
-                year, month, day = tuple(data['date'].split(sep='-'))
-                kwargs['_lastUpdated'] = date(int(year), int(month), int(day))
-                kwargs['parameters'] = model.params
-                kwargs['signNotes'] = '' if data['notes'] == 'None' else data['notes']
-                sign = Sign(kwargs)
-                corpus.addWord(sign)
+        verfied, useDefaultParameters = self.verifyParametersForImport(params)
+        if not verfied:
+            return
+
+        self.importWorker = ImportWorker()
+        self.importWorker.setParams({'path': path, 'corpus': corpus, 'use_default_parameters': useDefaultParameters})
+        self.importProgress = QProgressDialog('Importing {}...'.format(filename), 'Cancel', 0, 100, self)
+        self.importProgress.setWindowTitle('Import corpus')
+        self.importProgress.setWindowModality(Qt.WindowModal)
+        self.importProgress.setAutoClose(False)
+        self.importProgress.setAutoReset(False)
+        self.importProgress.canceled.connect(self.importWorker.stop)
+        self.importWorker.updateProgress.connect(self.updateImportProgress)
+        self.importWorker.dataReady.connect(self.finishImport)
+        self.importWorker.finished.connect(self.importProgress.close)
+        self.importWorker.start()
+        self.importProgress.show()
+
+    def updateImportProgress(self, progress):
+        self.importProgress.setValue(int(progress * 100))
+
+    def finishImport(self, corpus):
+        if corpus is None:
+            #the import was cancelled
+            return
         self.corpus = corpus
         self.setupNewCorpus()
 
@@ -2092,8 +2062,9 @@ class MainWindow(QMainWindow):
         self.configTabs.setCurrentIndex(0)
         self.transcriptionRestrictionsChanged.emit(self.restrictedTranscriptions)
 
-        self.parameterDialog.accept()
-        self.setupParameterDialog(ParameterTreeModel(parameters.defaultParameters))
+        if self.parameterDialog is not None:
+            self.parameterDialog.accept()
+        self.setupParameterDialog(parameters.defaultRecord)
         self.transcriptionInfo.clearSignNoteText()
         self.transcriptionInfo.changeCoderName(self.coder)
         #self.initSignNotes()
@@ -2242,6 +2213,24 @@ class ExportCorpusDialog(QDialog):
         self.parameterOptions.setId(noParametersOption, 2)
         xmlOption.setChecked(True)
 
+        formatLayout = QVBoxLayout()
+        formatLabel = QLabel('What kind of file should be written?')
+        formatLayout.addWidget(formatLabel)
+        formatOptionsLayout = QHBoxLayout()
+        self.formatOptions = QButtonGroup()
+        tsvOption = QRadioButton('tab-separated values (.tsv)')
+        jsonlOption = QRadioButton('JSON Lines (.jsonl)')
+        formatOptionsLayout.addWidget(tsvOption)
+        formatOptionsLayout.addWidget(jsonlOption)
+        formatOptionsLayout.insertSpacing(-1, 100)
+        formatLayout.addLayout(formatOptionsLayout)
+        self.formatOptions.addButton(tsvOption)
+        self.formatOptions.addButton(jsonlOption)
+        self.formatOptions.setId(tsvOption, 0)
+        self.formatOptions.setId(jsonlOption, 1)
+        tsvOption.setChecked(True)
+        self.formatOptions.buttonClicked.connect(self.changeFormat)
+
         altSymbolsLabel = QLabel('Some programs have trouble displaying the "ultracrossed" symbol (x-in-a-box) and the '
                                  'empty set symbol. If you would like to use alternatives in the output file, you can '
                                  'enter them below.')
@@ -2254,6 +2243,7 @@ class ExportCorpusDialog(QDialog):
         self.nullEdit.setMaximumWidth(170)
         self.nullEdit.setPlaceholderText('Alternative empty set symbol')
 
+        outputOptionsLayout.addLayout(formatLayout)
         outputOptionsLayout.addWidget(self.includeFields)
         outputOptionsLayout.addLayout(blankSpaceLayout)
         outputOptionsLayout.addLayout(parametersLayout)
@@ -2262,8 +2252,8 @@ class ExportCorpusDialog(QDialog):
         outputOptionsLayout.addWidget(self.nullEdit)
 
         noteLabel = QLabel('NOTE: If you are exporting a corpus that you want to re-import into SLP-Annotator, you '
-                           'must use the default options (no fields, underscore for blanks, xml parameters, no '
-                           'alternative symbols).')
+                           'must use the default options (tab-separated values, no fields, underscore for blanks, '
+                           'xml parameters, no alternative symbols).')
         noteLabel.setWordWrap(True)
         outputOptionsLayout.addWidget(noteLabel)
 
@@ -2279,13 +2269,27 @@ class ExportCorpusDialog(QDialog):
         layout.addLayout(buttonLayout)
         self.setLayout(layout)
 
+    def selectedFormat(self):
+        return 'jsonl' if self.formatOptions.checkedId() == 1 else 'tsv'
+
+    def changeFormat(self):
+        path = self.fileNameEdit.text()
+        if not path:
+            return
+        extension = '.' + self.selectedFormat()
+        root, oldExtension = os.path.splitext(path)
+        if oldExtension in ['.tsv', '.jsonl']:
+            self.fileNameEdit.setText(root + extension)
+
     def getSaveName(self):
-        savename = QFileDialog.getSaveFileName(self, 'Export Corpus as TSV', 'corpus', '*.tsv')
+        extension = '.' + self.selectedFormat()
+        title = 'Export Corpus as JSON Lines' if extension == '.jsonl' else 'Export Corpus as TSV'
+        savename = QFileDialog.getSaveFileName(self, title, 'corpus', '*' + extension)
         path = savename[0]
         if not path:
             return
-        if not path.endswith('.tsv'):
-            path = path + '.tsv'
+        if not path.endswith(extension):
+            path = path + extension
         self.fileNameEdit.setText(path)
 
     def accept(self):
@@ -2316,6 +2320,8 @@ class ExportCorpusDialog(QDialog):
         else:
             self.parameterFormat = 'none'
 
+        self.exportFormat = self.selectedFormat()
+
         if os.path.exists(os.path.split(self.fileNameEdit.text())[0]):
             super().accept()
         else:
@@ -2411,6 +2417,7 @@ class AnalyzerMainWindow(QMainWindow):
         super().__init__()
 
         self.corpus = corpus
+        self.currentSign = None
         self.setWindowTitle('SLP-Analyzer')
 
         centralWidget = QWidget()
@@ -2535,10 +2542,7 @@ class AnalyzerMainWindow(QMainWindow):
         splitter.addWidget(rightFrame)
         mainLayout.addWidget(splitter)
 
-        for word in self.corpus:
-            wordList.addItem(word.gloss)
-
-        wordList.sortItems()
+        wordList.addItems(self.corpus.glosses())
         wordList.setCurrentRow(0)
         wordList.itemClicked.emit(wordList.currentItem())
         # create an item with a caption
@@ -2566,6 +2570,7 @@ class AnalyzerMainWindow(QMainWindow):
         self.searchMenu.addAction(self.searchByTranscriptionAct)
         self.searchMenu.addAction(self.searchByExtendedFingersAct)
         self.searchMenu.addAction(self.searchByHandshapesAct)
+        self.searchMenu.addAction(self.searchBySimilarityAct)
 
     def createActions(self):
         self.loadCorporaAction = QAction('&Load corpora...', self, statusTip='Load a corpus',
@@ -2581,6 +2586,9 @@ class AnalyzerMainWindow(QMainWindow):
                                                   triggered=self.searchByExtendedFingers)
         self.searchByHandshapesAct = QAction('Search by handshapes...', self,
                                              triggered=self.searchByHandshapes)
+        self.searchBySimilarityAct = QAction('Find signs like this one...', self,
+                                             statusTip='Find the signs whose transcription is closest to this one',
+                                             triggered=self.searchBySimilarity)
 
     def searchByHandshapes(self):
         searchDialog = HandshapeSearchDialog(self.corpus, self, None, None)
@@ -2603,6 +2611,15 @@ class AnalyzerMainWindow(QMainWindow):
             EFResultWindow = SearchResultsWindow('Extended Finger Search Results', searchDialog, self)
             EFResultWindow.show()
 
+    def searchBySimilarity(self):
+        if self.currentSign is None:
+            return
+        searchDialog = SimilaritySearchDialog(self.corpus, self.currentSign, self, None)
+        success = searchDialog.exec_()
+        if success:
+            SSResultWindow = SearchResultsWindow('Signs like {}'.format(self.currentSign.gloss), searchDialog, self)
+            SSResultWindow.show()
+
     def switchMode(self):
         #pass
         self.close()
@@ -2617,6 +2634,7 @@ class AnalyzerMainWindow(QMainWindow):
     def loadData(self, item):
         gloss = item.text()
         sign = self.corpus[gloss]
+        self.currentSign = sign
 
         self.freqLineEdit.clear()
         self.freqLineEdit.setText(str(sign.frequency))
@@ -9,6 +9,7 @@ import regex as re
 from itertools import combinations
 from pprint import pprint
 from analysis.phonological_search import extended_finger_search
+from analysis.vectorized import stream_function
 from gui.helperwidgets import LogicRadioButtonGroup
 
 class EFWorker(FunctionWorker):
@@ -21,9 +22,9 @@ class EFWorker(FunctionWorker):
         logic = self.kwargs.pop('logic')
         sign_type = self.kwargs.pop('signType')
 
-        results = extended_finger_search(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type)
-        #pprint(self.results)
-        self.dataReady.emit(results)
+        search = stream_function(extended_finger_search)
+        self.emitBatches(search(corpus, c1h1, c1h2, c2h1, c2h2, logic, sign_type,
+                                call_back=self.emitProgress, stop_check=self.stopCheck))
 
 
 class PhonologicalSearchDialog(QDialog):
@@ -411,17 +412,12 @@ class ExtendedFingerSearchDialog(FunctionDialog):
         self.note = value['note']
         return kwargs
 
-    @Slot(object)
-    def setResults(self, results):
+    def resultRow(self, sign):
         #TODO: need to modify token frequency when implemented (right not there is not frquency info)
-        #TODO: double check thread method to properly place accept()
-        self.results = list()
-        for sign in results:
-            self.results.append({'Corpus': self.corpus.name,
-                                 'Sign': sign.gloss,
-                                 'Token frequency': 1,
-                                 'Note': self.note})
-        self.accept()
+        return {'Corpus': self.corpus.name,
+                'Sign': sign.gloss,
+                'Token frequency': 1,
+                'Note': self.note}
 
 
 class NumExtendedFingerPanel(QGroupBox):
@@ -4,9 +4,9 @@ from pprint import pprint
 from imports import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QFrame,
                      QFileDialog, QAbstractTableModel, QHeaderView, Qt, QModelIndex,
                      QTableView, QAbstractItemView, QSizePolicy, QApplication, QVariant,
-                     QAbstractScrollArea)
+                     QAbstractScrollArea, QProgressBar, Slot)
 from lexicon import Corpus, Sign
-from binary import save_binary
+from binary import save_corpus
 
 
 class ResultsTableModel(QAbstractTableModel):
@@ -19,6 +19,8 @@ class ResultsTableModel(QAbstractTableModel):
         return len(self.results)
 
     def appendRows(self, entries):
+        if not entries:
+            return
         numOfRows = self.rowCount()
         self.beginInsertRows(QModelIndex(), numOfRows, numOfRows+len(entries)-1)
         for entry in entries:
@@ -56,7 +58,8 @@ class ResultsWindow(QDialog):
         super().__init__(parent=parent)
         self.setWindowTitle(title)
         self.dialog = dialog
-        dataModel = ResultsTableModel(self.dialog.header, self.dialog.results)
+        # the model keeps its own list, the results of the dialog start again with every search
+        dataModel = ResultsTableModel(self.dialog.header, list(self.dialog.results))
 
         self.table = ResultsTableView()
         self.table.setModel(dataModel)
@@ -72,6 +75,19 @@ class ResultsWindow(QDialog):
         self.closeButton = QPushButton('Close window')
         self.closeButton.clicked.connect(self.reject)
 
+        # the search may still be running, its other results are added as they are found
+        self.stopButton = QPushButton('Stop search')
+        self.stopButton.clicked.connect(self.dialog.stop)
+        self.progressBar = QProgressBar()
+        self.progressBar.setRange(0, self.dialog.progressBar.maximum())
+        self.progressBar.setValue(self.dialog.progressBar.value())
+        self.dialog.rowsReady.connect(self.addRows)
+        self.dialog.thread.started.connect(self.startSearch)
+        self.dialog.thread.updateProgress.connect(self.updateProgress)
+        self.dialog.thread.finished.connect(self.finishSearch)
+        if not self.dialog.thread.isRunning():
+            self.finishSearch()
+
         # Appearance
         self.table.resizeColumnsToContents()
         self.table.resizeRowsToContents()
@@ -84,9 +100,11 @@ class ResultsWindow(QDialog):
         self.buttonLayout.addWidget(self.reopenButton)
         self.buttonLayout.addWidget(self.saveButton)
         self.buttonLayout.addWidget(self.closeButton)
+        self.buttonLayout.addWidget(self.stopButton)
 
         mainLayout = QVBoxLayout()
         mainLayout.addWidget(self.table)
+        mainLayout.addWidget(self.progressBar)
         mainLayout.addLayout(self.buttonLayout)
 
         self.setLayout(mainLayout)
@@ -101,21 +119,40 @@ class ResultsWindow(QDialog):
     #         sz.setHeight(400)
     #     return sz
 
+    @Slot()
+    def startSearch(self):
+        if not self.dialog.update:
+            self.table.setModel(ResultsTableModel(self.dialog.header, list()))
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.stopButton.show()
+
+    @Slot(object)
+    def addRows(self, rows):
+        self.table.model().appendRows(rows)
+        self.table.resizeColumnsToContents()
+        self.table.resizeRowsToContents()
+
+    @Slot(object)
+    def updateProgress(self, progress):
+        self.progressBar.setValue(int(progress * self.progressBar.maximum()))
+
+    @Slot()
+    def finishSearch(self):
+        self.progressBar.hide()
+        self.stopButton.hide()
+
     def reopen(self):
         #TODO: maybe modify this so that function and result windows can appear together
-        if self.dialog.exec_():
-            if self.dialog.update:
-                self.table.model().appendRows(self.dialog.results)
-                self.table.resizeColumnsToContents()
-                self.table.resizeRowsToContents()
-            else:
-                dataModel = ResultsTableModel(self.dialog.header, self.dialog.results)
-                self.table.setModel(dataModel)
-                self.table.resizeColumnsToContents()
-                self.table.resizeRowsToContents()
+        # the table is cleared or added to by the search itself, see startSearch and addRows
+        self.dialog.exec_()
         self.raise_()
         self.activateWindow()
 
+    def reject(self):
+        self.dialog.stop()
+        super().reject()
+
     def save(self):
         fileDialog = QFileDialog(caption='Save results')
         fileDialog.setAcceptMode(QFileDialog.AcceptSave)
@@ -165,7 +202,7 @@ class SearchResultsWindow(ResultsWindow):
             if sign.gloss in subset:
                 sign.flags = Sign.sign_attributes['flags'].copy()
                 newCorpus.addWord(sign)
-        save_binary(newCorpus, newCorpus.path)
+        save_corpus(newCorpus)
 
 
 class BaseTableModel(QAbstractTableModel):
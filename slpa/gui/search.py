@@ -7,6 +7,7 @@ from constants import GLOBAL_OPTIONS, FINGER_SYMBOLS, SYMBOL_DESCRIPTIONS
 
 FONT_NAME = 'Arial'
 FONT_SIZE = 12
+MAX_COMPLETIONS = 50
 
 class ConfigComboBox(QComboBox):
 
@@ -555,13 +556,16 @@ class GlossSearchDialog(QDialog):
         searchLabel = QLabel('Enter gloss to search for: ')
         searchLayout.addWidget(searchLabel)
 
+        self.corpus = corpus
         self.searchEdit = QLineEdit()
-        completer = QCompleter()
-        model = QStringListModel()
-        model.setStringList([word.gloss for word in corpus])
-        completer.setModel(model)
-        completer.setCaseSensitivity(Qt.CaseInsensitive)
-        self.searchEdit.setCompleter(completer)
+        #the corpus finds the matching glosses as the user types, rather than the completer filtering every gloss
+        self.completerModel = QStringListModel()
+        self.completer = QCompleter()
+        self.completer.setModel(self.completerModel)
+        self.completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.searchEdit.setCompleter(self.completer)
+        self.searchEdit.textEdited.connect(self.updateCompletions)
         searchLayout.addWidget(self.searchEdit)
 
         buttonLayout = QHBoxLayout()
@@ -577,6 +581,13 @@ class GlossSearchDialog(QDialog):
 
         self.setLayout(layout)
 
+    def updateCompletions(self, text):
+        if not text:
+            self.completerModel.setStringList(list())
+            return
+        self.completerModel.setStringList(self.corpus.matchGlosses(text, MAX_COMPLETIONS))
+        self.completer.complete()
+
     def reject(self):
         self.accepted = False
         super().reject()
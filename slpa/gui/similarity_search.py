@@ -0,0 +1,83 @@
+from imports import QGroupBox, QGridLayout, QHBoxLayout, QLabel, QLineEdit
+from gui.function_windows import FunctionDialog, FunctionWorker
+from handshapes import Fingers
+from analysis.similarity import similar_signs_batches, FIELD_SLOTS, SIMILAR_SIGNS
+
+FIELD_NAMES = {Fingers.thumb: 'Thumb',
+               Fingers.contact: 'Thumb contact',
+               Fingers.thumbAndFinger: 'Thumb/finger contact',
+               Fingers.index: 'Index',
+               Fingers.middle: 'Middle',
+               Fingers.ring: 'Ring',
+               Fingers.pinky: 'Pinky'}
+
+
+class SSWorker(FunctionWorker):
+    def run(self):
+        corpus = self.kwargs.pop('corpus')
+        sign = self.kwargs.pop('sign')
+        number = self.kwargs.pop('number')
+        weights = self.kwargs.pop('weights')
+
+        self.emitBatches(similar_signs_batches(corpus, sign, number, weights,
+                                               call_back=self.emitProgress, stop_check=self.stopCheck))
+
+
+class SimilaritySearchDialog(FunctionDialog):
+    header = ['Corpus', 'Sign', 'Distance', 'Token frequency', 'Note']
+    about = 'Similarity search'
+    name = 'similarity search'
+
+    def __init__(self, corpus, sign, parent, settings):
+        super().__init__(parent, settings, SSWorker())
+
+        self.corpus = corpus
+        self.sign = sign
+
+        signGroup = QGroupBox('Signs like')
+        signLayout = QHBoxLayout()
+        signGroup.setLayout(signLayout)
+        signLayout.addWidget(QLabel(sign.gloss))
+
+        numberGroup = QGroupBox('Number of signs')
+        numberLayout = QHBoxLayout()
+        numberGroup.setLayout(numberLayout)
+        self.numberLineEdit = QLineEdit(str(SIMILAR_SIGNS))
+        numberLayout.addWidget(self.numberLineEdit)
+
+        weightGroup = QGroupBox('Weight of each field')
+        weightLayout = QGridLayout()
+        weightGroup.setLayout(weightLayout)
+        self.weightLineEdits = dict()
+        for column, field in enumerate(FIELD_SLOTS):
+            self.weightLineEdits[field] = QLineEdit('1')
+            weightLayout.addWidget(QLabel(FIELD_NAMES[field]), 0, column)
+            weightLayout.addWidget(self.weightLineEdits[field], 1, column)
+
+        self.notePanel = QLineEdit()
+        self.notePanel.setPlaceholderText('Enter notes here...')
+
+        mainLayout = QGridLayout()
+        mainLayout.addWidget(signGroup, 0, 0, 1, 1)
+        mainLayout.addWidget(numberGroup, 0, 1, 1, 1)
+        mainLayout.addWidget(weightGroup, 1, 0, 1, 2)
+        mainLayout.addWidget(self.notePanel, 2, 0, 1, 2)
+        self.layout().insertLayout(0, mainLayout)
+
+    def generateKwargs(self):
+        kwargs = dict()
+
+        kwargs['corpus'] = self.corpus
+        kwargs['sign'] = self.sign
+        kwargs['number'] = int(self.numberLineEdit.text())
+        kwargs['weights'] = {field: float(lineEdit.text()) for field, lineEdit in self.weightLineEdits.items()}
+
+        return kwargs
+
+    def resultRow(self, result):
+        sign, distance = result
+        return {'Corpus': self.corpus.name,
+                'Sign': sign.gloss,
+                'Distance': round(distance, 3),
+                'Token frequency': sign.frequency,
+                'Note': self.notePanel.text()}
@@ -4,7 +4,8 @@ from imports import (QVBoxLayout, QHBoxLayout, QGroupBox, QPushButton, QLabel, Q
 from gui.function_windows import FunctionDialog, FunctionWorker
 from pprint import pprint
 from gui.helperwidgets import LogicRadioButtonGroup
-from analysis.transcription_search import transcription_search
+from analysis.transcription_search import compile_query
+from analysis.vectorized import stream_query
 
 
 NULL = '\u2205'
@@ -492,12 +493,14 @@ class CoderSlot(QPushButton):
 
         self.menu = QMenu()
 
-        self.options = sorted(list({sign.coder for sign in self.corpus}))
+        # the number of signs of each coder comes from the coder index of the corpus
+        counts = self.corpus.coderCounts()
+        self.options = sorted(counts)
 
         for option in self.options:
-            if not option:
-                option = '(empty)'
-            coder = QAction(option, self, checkable=True, triggered=self.updateText)
+            coder = QAction('{} ({})'.format(option if option else '(empty)', counts[option]), self,
+                            checkable=True, triggered=self.updateText)
+            coder.setData(option)
             coder.setChecked(True)
             self.menu.addAction(coder)
 
@@ -516,7 +519,7 @@ class CoderSlot(QPushButton):
         selectedCoders = list()
         for act in self.menu.actions()[:-3]:
             if act.isChecked():
-                selectedCoders.append(act.text())
+                selectedCoders.append(act.data())
         return selectedCoders
 
     def updateText(self):
@@ -525,7 +528,7 @@ class CoderSlot(QPushButton):
             if selectedCoders == self.options:
                 self.setText(self.default)
             else:
-                first = selectedCoders[0]
+                first = selectedCoders[0] if selectedCoders[0] else '(empty)'
                 if len(selectedCoders) == 1:
                     self.setText(first)
                 else:
@@ -555,7 +558,7 @@ class CoderSlot(QPushButton):
         self.setStyleSheet(style)
 
     def value(self):
-        selected = {'' if coder == '(empty)' else coder for coder in self.getSelectedCoders()}
+        selected = set(self.getSelectedCoders())
         if self.positive:
             return selected
         else:
@@ -581,12 +584,14 @@ class LastUpdateSlot(QPushButton):
 
         self.menu = QMenu()
 
-        self.options = sorted(list({str(sign.lastUpdated) for sign in self.corpus}))
+        # the number of signs last updated on each date comes from the date index of the corpus
+        counts = {str(lastUpdated): count for lastUpdated, count in self.corpus.lastUpdatedCounts().items()}
+        self.options = sorted(counts)
 
         for option in self.options:
-            if not option:
-                option = '(empty)'
-            date = QAction(option, self, checkable=True, triggered=self.updateText)
+            date = QAction('{} ({})'.format(option if option else '(empty)', counts[option]), self,
+                           checkable=True, triggered=self.updateText)
+            date.setData(option)
             date.setChecked(True)
             self.menu.addAction(date)
 
@@ -605,7 +610,7 @@ class LastUpdateSlot(QPushButton):
         selectedDates = list()
         for act in self.menu.actions()[:-3]:
             if act.isChecked():
-                selectedDates.append(act.text())
+                selectedDates.append(act.data())
         return selectedDates
 
     def updateText(self):
@@ -680,9 +685,10 @@ class TSWorker(FunctionWorker):
         coder = self.kwargs.pop('coder')
         lastUpdated = self.kwargs.pop('lastUpdated')
 
-        results = transcription_search(corpus, forearm, estimated, uncertain, incomplete, configuration, hand,
-                                       frequency_range, config1, config2, coder, lastUpdated)
-        self.dataReady.emit(results)
+        # running the same search again, or one of the last few, reuses its compiled query
+        query = compile_query(forearm, estimated, uncertain, incomplete, configuration, hand,
+                              frequency_range, config1, config2, coder, lastUpdated)
+        self.emitBatches(stream_query(corpus, query, call_back=self.emitProgress, stop_check=self.stopCheck))
 
 
 class TranscriptionSearchDialog(FunctionDialog):
@@ -733,12 +739,21 @@ class TranscriptionSearchDialog(FunctionDialog):
         frequencyGroup.setFixedWidth(100)
         freqeuncyLayout = QVBoxLayout()
         frequencyGroup.setLayout(freqeuncyLayout)
-        self.minLineEdit = QLineEdit(str(self.corpus.getFrequencyRange()[0]))
-        self.maxLineEdit = QLineEdit(str(self.corpus.getFrequencyRange()[1]))
+        minFreq, maxFreq = self.corpus.getFrequencyRange()
+        self.minLineEdit = QLineEdit(str(minFreq))
+        self.maxLineEdit = QLineEdit(str(maxFreq))
+        self.frequencyCountLabel = QLabel()
         freqeuncyLayout.addWidget(QLabel('From:'))
         freqeuncyLayout.addWidget(self.minLineEdit)
         freqeuncyLayout.addWidget(QLabel('To:'))
         freqeuncyLayout.addWidget(self.maxLineEdit)
+        freqeuncyLayout.addWidget(self.frequencyCountLabel)
+        frequencyGroup.setToolTip('\n'.join('{:g} to {:g}: {} signs'.format(low, high, count)
+                                             for low, high, count in self.corpus.frequencyHistogram()))
+        # the count comes from the frequency index of the corpus, so it can follow every keystroke
+        self.minLineEdit.textChanged.connect(self.showFrequencyCount)
+        self.maxLineEdit.textChanged.connect(self.showFrequencyCount)
+        self.showFrequencyCount()
 
         globalLayout.addWidget(self.forearmLogic)
         globalLayout.addWidget(self.estimateLogic)
@@ -791,6 +806,14 @@ class TranscriptionSearchDialog(FunctionDialog):
         #self.testButton.clicked.connect(self.test)
         self.layout().insertLayout(0, mainLayout)
 
+    def showFrequencyCount(self):
+        try:
+            count = self.corpus.countFrequencyRange(float(self.minLineEdit.text()), float(self.maxLineEdit.text()))
+        except ValueError:
+            self.frequencyCountLabel.setText('')
+        else:
+            self.frequencyCountLabel.setText('{} signs'.format(count))
+
     #def test(self):
     #    pprint(self.lastUpdatedSlot.value())
     #     results = {'forearmLogic': self.forearmLogic.value(),
@@ -824,19 +847,13 @@ class TranscriptionSearchDialog(FunctionDialog):
 
         return kwargs
 
-    @Slot(object)
-    def setResults(self, results):
-        #TODO: need to modify token frequency when implemented (right not there is not frquency info)
-        #TODO: double check thread method to properly place accept()
-        self.results = list()
-        for sign in results:
-            self.results.append({'Corpus': self.corpus.name,
-                                 'Sign': sign.gloss,
-                                 'Coder': sign.coder,
-                                 'Last updated': str(sign.lastUpdated),
-                                 'Token frequency': sign.frequency,
-                                 'Note': self.note})
-        self.accept()
+    def resultRow(self, sign):
+        return {'Corpus': self.corpus.name,
+                'Sign': sign.gloss,
+                'Coder': sign.coder,
+                'Last updated': str(sign.lastUpdated),
+                'Token frequency': sign.frequency,
+                'Note': self.note}
 
 
 #app = QApplication(sys.argv)
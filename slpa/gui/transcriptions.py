@@ -1,4 +1,3 @@
-from collections import namedtuple
 from imports import *
 from image import getMediaFilePath
 from datetime import date
@@ -17,6 +16,8 @@ from analysis.unmarked_handshapes import (
     HandshapeEmpty
 )
 
+from analysis.handshape_classifier import HandshapeClassifier, fill
+
 from analysis.marked_handshapes import (
     HandshapeExtendedA, HandshapeClosedAIndex, HandshapeOpenA, HandshapeModifiedA,
     HandshapeBentB, HandshapeClawedExtendedB, HandshapeContractedB, HandshapeCrookedExtendedB, HandshapeExtendedB, HandshapeSlantedExtendedB,
@@ -48,7 +49,6 @@ from analysis.marked_handshapes import (
     HandshapeMiddleFinger
 )
 
-Flag = namedtuple('Flag', ['isUncertain', 'isEstimate'])
 predefined_handshape_mapping = {
     Handshape1.canonical: '1',
     Handshape5.canonical: '5',
@@ -216,6 +216,9 @@ predefined_handshape_mapping = {
     HandshapeMiddleFinger.canonical: 'middle-finger'
 }
 
+handshape_classifier = HandshapeClassifier({label: canonical
+                                           for canonical, label in predefined_handshape_mapping.items()})
+
 
 class TranscriptionLayout(QVBoxLayout):
     updateSignal = Signal(bool)
@@ -363,6 +366,13 @@ class TranscriptionLayout(QVBoxLayout):
         handshapeImage = QPixmap(getMediaFilePath(handshapeLabel + '.png'))
         self.predefinedLabel.setText(handshapeLabel)
         self.predefinedLabel.setToolTip('Matched handshape: ' + handshapeLabel)
+        hand = fill(self.values())
+        if not handshapeLabel and not HandshapeEmpty.match(hand):
+            closest = handshape_classifier.nearest(hand)
+            self.predefinedLabel.setText('~ ' + closest[0][0])
+            self.predefinedLabel.setToolTip('Closest handshapes: ' +
+                                            ', '.join('{} ({:.1f})'.format(label, distance)
+                                                      for label, distance in closest))
         self.predefinedImage.setPixmap(handshapeImage.scaled(self.predefinedImage.width(), self.predefinedImage.height(), Qt.KeepAspectRatio))
 
     def emitUpdateSignal(self, p_str):
@@ -0,0 +1,176 @@
+import os
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from datetime import date
+import parameters
+from lexicon import Sign
+from constants import GLOBAL_OPTIONS, FINGERSPELL_OPTIONS, Flag
+
+CHUNK_SIZE = 1000  # rows sent to a worker process at a time
+MIN_PARALLEL_SIZE = 1 << 20  # files smaller than this (in bytes) are parsed without starting any processes
+HANDS = ['config{}hand{}'.format(config, hand) for config in [1, 2] for hand in [1, 2]]
+SLOT_COLUMNS = {confighand: ['{}slot{}'.format(confighand, n) for n in range(1, 35)] for confighand in HANDS}
+FLAGS = {(uncertain, estimated): Flag(uncertain, estimated) for uncertain in [False, True] for estimated in [False, True]}
+NO_FLAGS = [FLAGS[(False, False)]] * 34
+PARAMETER_CACHE_SIZE = 256  # distinct parameter settings kept parsed, far more than most corpora use
+
+
+@lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+def parse_parameters(xmlstring):
+    # the same few parameter settings are shared by most signs, so each distinct XML string is only parsed once
+    return parameters.recordFromXML(xmlstring)
+
+
+def parse_flag_numbers(text):
+    '''
+    :param text: slot numbers joined with '-' (counting from 1, as written by the exporter), or 'None'
+    :return: a set of slot indices counting from 0
+    '''
+    if text == 'None':
+        return set()
+    return {int(n) - 1 for n in text.split('-')}
+
+
+def parse_flags(uncertain, estimated):
+    uncertain = parse_flag_numbers(uncertain)
+    estimated = parse_flag_numbers(estimated)
+    if not uncertain and not estimated:
+        return NO_FLAGS[:]
+    return [FLAGS[(n in uncertain, n in estimated)] for n in range(34)]
+
+
+def parse_row(columns, line, use_default_parameters=False):
+    '''
+    Turn one line of an exported TSV file into a Sign
+    :param columns: a dictionary of column names to column numbers, made from the first line of the file
+    :param line: the line, without its line break
+    :param use_default_parameters: ignore the parameters column and give the sign the default parameters
+    :return: a Sign
+    '''
+    values = line.split('\t')
+    kwargs = dict()
+    flags = dict()
+    transcriptions = list()
+    for confighand in HANDS:
+        transcriptions.append([values[columns[name]] for name in SLOT_COLUMNS[confighand]])
+        flags[confighand] = parse_flags(values[columns[confighand + 'uncertain']],
+                                        values[columns[confighand + 'estimated']])
+    kwargs['config1'] = transcriptions[0:2]
+    kwargs['config2'] = transcriptions[2:4]
+    kwargs['flags'] = flags
+    kwargs['gloss'] = values[columns['gloss']]
+    for option in GLOBAL_OPTIONS + FINGERSPELL_OPTIONS:
+        kwargs[option] = True if values[columns[option]] == 'True' else False
+    if use_default_parameters:
+        kwargs['parameters'] = parameters.defaultRecord
+    else:
+        kwargs['parameters'] = parse_parameters(values[columns['parameters']])
+    kwargs['_frequency'] = float(values[columns['frequency']])
+    kwargs['_coder'] = values[columns['coder']]
+    year, month, day = tuple(values[columns['date']].split(sep='-'))
+    kwargs['_lastUpdated'] = date(int(year), int(month), int(day))
+    notes = values[columns['notes']]
+    kwargs['signNotes'] = '' if notes == 'None' else notes
+    return Sign(kwargs)
+
+
+def parse_chunk(headers, lines, use_default_parameters=False):
+    '''
+    :param lines: a list of undecoded lines from the TSV file
+    :return: a list of Signs, in the same order as the lines
+    '''
+    columns = {name: n for n, name in enumerate(headers)}
+    signs = list()
+    for line in lines:
+        line = line.decode('utf-8').strip()
+        if line:
+            signs.append(parse_row(columns, line, use_default_parameters))
+    return signs
+
+
+def read_chunks(f, chunk_size):
+    while True:
+        lines = list(itertools.islice(f, chunk_size))
+        if not lines:
+            return
+        yield lines
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        #not available on Windows or macOS
+        return os.cpu_count() or 1
+
+
+def import_corpus(path, corpus, use_default_parameters=False, processes=None, chunk_size=CHUNK_SIZE,
+                  call_back=None, stop_check=None):
+    '''
+    Add every sign of an exported TSV file to a corpus. The file is read in chunks which are parsed in a pool of
+    worker processes; only a few chunks are in flight at any time, so the whole file is never held in memory.
+    :param path: the TSV file, whose first line holds the column names
+    :param corpus: the corpus that the signs are added to
+    :param use_default_parameters: ignore the parameters column and give every sign the default parameters
+    :param processes: the number of worker processes, defaults to the number of CPUs that are available. If this
+    is 1, or the file is small, everything is parsed in the current process
+    :param chunk_size: the number of lines in a chunk
+    :param call_back: called with the number of bytes imported so far and the size of the file
+    :param stop_check: called between chunks, the import is cancelled if it returns True
+    :return: the corpus, or None if the import was cancelled
+    '''
+    total = os.path.getsize(path)
+    records = dict()
+
+    def add_signs(signs):
+        for sign in signs:
+            # identical parameter settings coming back from different processes are stored only once
+            sign.parameters = records.setdefault(sign.parameters, sign.parameters)
+            corpus.addWord(sign)
+
+    with open(path, 'rb') as f:
+        header = f.readline()
+        headers = header.decode('utf-8').strip().split('\t')
+        done = len(header)
+        chunks = read_chunks(f, chunk_size)
+
+        if processes is None:
+            processes = available_cpus()
+        if processes <= 1 or total < MIN_PARALLEL_SIZE:
+            for lines in chunks:
+                if stop_check is not None and stop_check():
+                    return None
+                add_signs(parse_chunk(headers, lines, use_default_parameters))
+                done += sum(len(line) for line in lines)
+                if call_back is not None:
+                    call_back(done, total)
+            return corpus
+
+        # workers are started fresh rather than forked, so they do not inherit the threads, locks and open files of
+        # the GUI process, whose import runs on a QThread
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = deque()
+            max_pending = 2 * processes
+            while True:
+                while len(pending) < max_pending:
+                    lines = next(chunks, None)
+                    if lines is None:
+                        break
+                    future = executor.submit(parse_chunk, headers, lines, use_default_parameters)
+                    pending.append((future, sum(len(line) for line in lines)))
+                if not pending:
+                    break
+                if stop_check is not None and stop_check():
+                    for future, size in pending:
+                        future.cancel()
+                    return None
+                # results are used in file order, so a gloss that appears twice keeps its last row
+                future, size = pending.popleft()
+                add_signs(future.result())
+                done += size
+                if call_back is not None:
+                    call_back(done, total)
+    return corpus
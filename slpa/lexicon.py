@@ -1,16 +1,383 @@
 #from slpa import __version__ as currentSLPAversion
 import os
 import re
-from collections import OrderedDict
+import copy
+import copyreg
+import itertools
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
 from random import choice
 from datetime import date
-from parameters import defaultParameters
-from gui.parameterwidgets import ParameterTreeModel
-from gui.transcriptions import Flag
-from constants import GLOBAL_OPTIONS, FINGERSPELL_OPTIONS
+from parameters import defaultRecord, toParameterRecord, exportXML, exportTree
+from constants import GLOBAL_OPTIONS, FINGERSPELL_OPTIONS, Flag
+from slotstore import SlotStore, HAND_NAMES
 
 X_IN_BOX = '\u2327'
 NULL = '\u2205'
+EMPTY_HAND_TAIL = '______\u2205/______1____2____3____4___'  # an empty hand without its first slot, blanks as '_'
+EMPTY_HAND = '_' + EMPTY_HAND_TAIL
+#the fields of SlotSummary are tuples of four values, one for each hand in the order of HAND_NAMES, apart from the types
+SlotSummary = namedtuple('SlotSummary', ['strings',  # all 34 slots joined, with '_' for empty slots
+                                         'tails',  # the same without the first slot
+                                         'dotted',  # slots 2-34 joined with '.', as matched by transcription search
+                                         'filled',  # slots 2-34 as a tuple, with '_' for empty slots
+                                         'hand_type', 'config_type', 'sign_type'])
+DERIVED_ATTRIBUTES = ['_slotSummary']  # caches kept on a Sign, which are never pickled
+SLOT_ATTRIBUTES = frozenset(HAND_NAMES + ['config1', 'config2'])
+FREQUENCY_BINS = 20  # bars in the frequency histogram of a corpus unless asked for another number
+
+
+@lru_cache(maxsize=4096)
+def summarize_slots(hands):
+    '''
+    :param hands: a tuple of four tuples of 34 slot symbols, in the order of HAND_NAMES
+    :return: a SlotSummary. Many signs have the same hands, and they share a single summary
+    '''
+    filled = tuple(tuple(slot if slot else '_' for slot in hand[1:]) for hand in hands)
+    tails = tuple(''.join(hand) for hand in filled)
+    strings = tuple((hand[0] if hand[0] else '_') + tail for hand, tail in zip(hands, tails))
+    dotted = tuple('.'.join(hand) for hand in filled)
+
+    c1h1, c1h2, c2h1, c2h2 = tails
+    if (c1h1 == EMPTY_HAND_TAIL and c2h1 == EMPTY_HAND_TAIL) or (c1h2 == EMPTY_HAND_TAIL and c2h2 == EMPTY_HAND_TAIL):
+        hand_type = 'one'
+    else:
+        hand_type = 'two'
+    if (c1h1 == EMPTY_HAND_TAIL and c1h2 == EMPTY_HAND_TAIL) or (c2h1 == EMPTY_HAND_TAIL and c2h2 == EMPTY_HAND_TAIL):
+        config_type = 'one'
+    else:
+        config_type = 'two'
+
+    #unlike the hand type, this also looks at the first slot (the forearm)
+    c1h1, c1h2, c2h1, c2h2 = strings
+    if (c1h1 == EMPTY_HAND and c2h1 == EMPTY_HAND) or (c1h2 == EMPTY_HAND and c2h2 == EMPTY_HAND):
+        sign_type = 'one'
+    elif c1h1 == c1h2 and c2h1 == c2h2:
+        sign_type = 'two-same'
+    else:
+        sign_type = 'two-diff'
+
+    return SlotSummary(strings, tails, dotted, filled, hand_type, config_type, sign_type)
+
+
+class CorpusIndex:
+    """
+    Base class for lookup structures that a Corpus keeps up to date as words are added and removed, see
+    Corpus.getIndex. An index is thrown away and built again if the wordlist of its corpus is replaced.
+    """
+
+    def __init__(self, corpus):
+        self.wordlist = corpus.wordlist
+        self.build(corpus)
+
+    def isCurrent(self, corpus):
+        return self.wordlist is corpus.wordlist
+
+    def build(self, corpus):
+        raise NotImplementedError
+
+    def wordAdded(self, sign, old):
+        '''
+        :param sign: the sign that was added
+        :param old: the sign with the same gloss that it replaced, or None
+        '''
+        raise NotImplementedError
+
+    def wordRemoved(self, sign):
+        raise NotImplementedError
+
+
+class GlossIndex(CorpusIndex):
+    """
+    The glosses of a corpus in sorted order, kept sorted as words are added and removed
+    """
+
+    def build(self, corpus):
+        self.glosses = sorted(corpus.wordlist.keys())
+
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and len(self.glosses) == len(corpus.wordlist)
+
+    def wordAdded(self, sign, old):
+        if old is None:
+            insort(self.glosses, sign.gloss)
+
+    def wordRemoved(self, sign):
+        n = bisect_left(self.glosses, sign.gloss)
+        if n < len(self.glosses) and self.glosses[n] == sign.gloss:
+            del self.glosses[n]
+
+
+class FoldedGlossIndex(CorpusIndex):
+    """
+    Case-insensitive lookup of glosses. Glosses are casefolded and kept in sorted order, so glosses starting with
+    some text are found by bisection, and glosses containing some text by a single search through all the
+    folded glosses joined together.
+    """
+
+    def build(self, corpus):
+        self.keys = sorted((gloss.casefold(), gloss) for gloss in corpus.wordlist.keys())
+        self.text = None
+
+    def wordAdded(self, sign, old):
+        if old is None:
+            insort(self.keys, (sign.gloss.casefold(), sign.gloss))
+            self.text = None
+
+    def wordRemoved(self, sign):
+        key = (sign.gloss.casefold(), sign.gloss)
+        n = bisect_left(self.keys, key)
+        if n < len(self.keys) and self.keys[n] == key:
+            del self.keys[n]
+            self.text = None
+
+    def lookup(self, text):
+        '''
+        :return: the gloss that matches text regardless of case, or None. If several glosses differ only in case,
+        the first in sorted order is returned
+        '''
+        folded = text.casefold()
+        n = bisect_left(self.keys, (folded,))
+        if n < len(self.keys) and self.keys[n][0] == folded:
+            return self.keys[n][1]
+        return None
+
+    def startingWith(self, prefix):
+        folded = prefix.casefold()
+        n = bisect_left(self.keys, (folded,))
+        keys = self.keys
+        while n < len(keys) and keys[n][0].startswith(folded):
+            yield keys[n][1]
+            n += 1
+
+    def containing(self, text):
+        folded = text.casefold()
+        if not folded:
+            yield from (gloss for key, gloss in self.keys)
+            return
+        if self.text is None:
+            # a separator that cannot be typed into a gloss, so that no match runs across two glosses
+            self.text = '\n'.join(key for key, gloss in self.keys)
+            starts, start = list(), 0
+            for key, gloss in self.keys:
+                starts.append(start)
+                start += len(key) + 1
+            self.starts = starts
+        position = self.text.find(folded)
+        while position != -1:
+            n = bisect_right(self.starts, position) - 1
+            yield self.keys[n][1]
+            # carry on from the start of the next gloss, so that each gloss is only found once
+            if n + 1 == len(self.starts):
+                return
+            position = self.text.find(folded, self.starts[n+1])
+
+
+def histogram_bins(minimum, maximum, bins=FREQUENCY_BINS):
+    '''
+    :return: a list of (low, high) of bins of the same width from minimum to maximum. A bin holds the values from
+    low up to but not including high, apart from the last one, which also holds maximum. There is a single bin if
+    minimum and maximum are the same, and none if they are None.
+    '''
+    if minimum is None:
+        return list()
+    if minimum == maximum:
+        return [(minimum, maximum)]
+    width = (maximum - minimum) / bins
+    edges = [minimum + width * n for n in range(bins)] + [maximum]
+    return list(zip(edges, edges[1:]))
+
+
+class FrequencyIndex(CorpusIndex):
+    """
+    The frequencies of the signs of a corpus in sorted order, kept sorted as words are added and removed, with
+    their sum. The number of signs in a range of frequencies is found by bisection, and histograms are kept until
+    the next change. What is recorded for a sign is what gets removed again, so a sign that is changed in place
+    keeps its old frequency here until it is added to the corpus again.
+    """
+
+    def build(self, corpus):
+        self.frequencies = {sign.gloss: sign.frequency for sign in corpus.unorderedSigns()}  # gloss: frequency
+        self.keys = sorted((frequency, gloss) for gloss, frequency in self.frequencies.items())
+        self.values = [frequency for frequency, gloss in self.keys]  # the same order, for bisection by frequency
+        self.total = sum(self.values)
+        self.histograms = dict()  # number of bins: histogram
+
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and len(self.keys) == len(corpus.wordlist)
+
+    def wordAdded(self, sign, old):
+        if old is not None:
+            self.wordRemoved(old)
+        frequency = sign.frequency
+        key = (frequency, sign.gloss)
+        n = bisect_left(self.keys, key)
+        self.keys.insert(n, key)
+        self.values.insert(n, frequency)
+        self.frequencies[sign.gloss] = frequency
+        self.total += frequency
+        self.histograms.clear()
+
+    def wordRemoved(self, sign):
+        if sign.gloss not in self.frequencies:
+            return
+        frequency = self.frequencies.pop(sign.gloss)
+        n = bisect_left(self.keys, (frequency, sign.gloss))
+        del self.keys[n]
+        del self.values[n]
+        self.total -= frequency
+        self.histograms.clear()
+
+    def __len__(self):
+        return len(self.values)
+
+    def minimum(self):
+        return self.values[0] if self.values else None
+
+    def maximum(self):
+        return self.values[-1] if self.values else None
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else None
+
+    def bounds(self, minimum, maximum):
+        '''
+        :return: the position in self.keys of the first sign with a frequency of at least minimum, and the position
+        after the last sign with a frequency of at most maximum
+        '''
+        start = bisect_left(self.values, minimum)
+        return start, max(start, bisect_right(self.values, maximum))
+
+    def count(self, minimum, maximum):
+        '''
+        :return: the number of signs whose frequency is between minimum and maximum, both included
+        '''
+        start, end = self.bounds(minimum, maximum)
+        return end - start
+
+    def glossesBetween(self, minimum, maximum):
+        '''
+        :return: a list of the glosses of the signs whose frequency is between minimum and maximum, both included,
+        in order of frequency
+        '''
+        start, end = self.bounds(minimum, maximum)
+        return [gloss for frequency, gloss in self.keys[start:end]]
+
+    def histogram(self, bins=FREQUENCY_BINS):
+        '''
+        :return: a list of (low, high, number of signs) for each bin of histogram_bins
+        '''
+        if bins not in self.histograms:
+            edges = histogram_bins(self.minimum(), self.maximum(), bins)
+            # the number of signs below each edge, and all of them for the edge that closes the last bin
+            below = [bisect_left(self.values, low) for low, high in edges] + [len(self.values)]
+            self.histograms[bins] = [(low, high, end - start)
+                                     for (low, high), start, end in zip(edges, below, below[1:])]
+        return self.histograms[bins]
+
+
+class AttributeIndex(CorpusIndex):
+    """
+    The glosses of the signs of a corpus by the value of one of their attributes, so that the signs with some
+    values are found by set lookups and counted without looking at every sign. Like a FrequencyIndex, it records
+    the value a sign had when it was added to the corpus.
+    """
+    attribute = None  # the name of the attribute of Sign, set by subclasses
+
+    def build(self, corpus):
+        self.values = dict()  # gloss: value
+        self.glosses = dict()  # value: set of glosses
+        for sign in corpus.unorderedSigns():
+            self.add(sign)
+
+    def isCurrent(self, corpus):
+        return super().isCurrent(corpus) and len(self.values) == len(corpus.wordlist)
+
+    def add(self, sign):
+        value = getattr(sign, self.attribute)
+        self.values[sign.gloss] = value
+        glosses = self.glosses.get(value)
+        if glosses is None:
+            glosses = self.glosses[value] = set()
+            self.valueAdded(value)
+        glosses.add(sign.gloss)
+
+    def valueAdded(self, value):
+        pass
+
+    def valueRemoved(self, value):
+        pass
+
+    def wordAdded(self, sign, old):
+        if old is not None:
+            self.wordRemoved(old)
+        self.add(sign)
+
+    def wordRemoved(self, sign):
+        if sign.gloss not in self.values:
+            return
+        value = self.values.pop(sign.gloss)
+        glosses = self.glosses[value]
+        glosses.discard(sign.gloss)
+        if not glosses:
+            del self.glosses[value]
+            self.valueRemoved(value)
+
+    def counts(self):
+        '''
+        :return: a dictionary of every value in the corpus to the number of signs that have it
+        '''
+        return {value: len(glosses) for value, glosses in self.glosses.items()}
+
+    def count(self, values):
+        return sum(len(self.glosses.get(value, ())) for value in values)
+
+    def glossesWith(self, values):
+        '''
+        :return: a set of the glosses of the signs that have one of values
+        '''
+        glosses = set()
+        for value in values:
+            glosses.update(self.glosses.get(value, ()))
+        return glosses
+
+
+class CoderIndex(AttributeIndex):
+    """
+    The glosses of the signs of a corpus by their coder
+    """
+    attribute = 'coder'
+
+
+class LastUpdatedIndex(AttributeIndex):
+    """
+    The glosses of the signs of a corpus by the date they were last updated, with the dates in sorted order, so that
+    the signs updated in a range of dates, e.g. a week, are found by bisection. Signs without a date are left out of
+    every range.
+    """
+    attribute = 'lastUpdated'
+
+    def build(self, corpus):
+        self.dates = list()
+        super().build(corpus)
+
+    def valueAdded(self, value):
+        if value is not None:
+            insort(self.dates, value)
+
+    def valueRemoved(self, value):
+        if value is not None:
+            del self.dates[bisect_left(self.dates, value)]
+
+    def datesBetween(self, first, last):
+        '''
+        :return: a list of the dates in the corpus from first to last, both included
+        '''
+        return self.dates[bisect_left(self.dates, first):bisect_right(self.dates, last)]
+
+    def glossesBetween(self, first, last):
+        return self.glossesWith(self.datesBetween(first, last))
 
 
 class Corpus:
@@ -22,6 +389,10 @@ class Corpus:
                          '_version': 0.1  #currentSLPAversion
                          }
     basic_attributes = ['spelling', 'transcription', 'frequency']
+    journal = None  # set by binary.load_corpus/binary.save_corpus once the corpus has a file on disk
+    indexes = None  # CorpusIndex subclass: instance, made by getIndex
+    filtersInStore = False  # True if filterSigns is answered by the storage, e.g. an SQL query
+    revision = 0  # counts the words added and removed, so that results found before a change can be told apart
 
     def __init__(self, kwargs):
         for attr, default_value in Corpus.corpus_attributes.items():
@@ -40,24 +411,50 @@ class Corpus:
         else:
             return value
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('journal', None)
+        state.pop('indexes', None)
+        state.pop('revision', None)
+        return state
+
+    def snapshot(self):
+        # signs are replaced rather than edited in place when a word is saved, so a shallow copy is enough
+        snapshot = copy.copy(self)
+        snapshot.wordlist = self.wordlist.copy()
+        snapshot.indexes = None
+        return snapshot
+
+    def getIndex(self, indexClass):
+        '''
+        :param indexClass: a subclass of CorpusIndex
+        :return: the corpus's instance of indexClass, which is built the first time it is asked for and then
+        updated by addWord and removeWord
+        '''
+        if self.indexes is None:
+            self.indexes = dict()
+        index = self.indexes.get(indexClass)
+        if index is None or not index.isCurrent(self):
+            index = self.indexes[indexClass] = indexClass(self)
+        return index
+
+    def glosses(self):
+        return self.getIndex(GlossIndex).glosses
+
     def regExSearch(self, query):
-        expressions = [[query[0], query[1]], [query[2], query[3]]]
-        match_list = list()
-        for word in self:
-            #print('word: ', word)
-            for config_num, hand_num in [(1, 1), (1, 2), (2, 1), (2, 2)]:
-                slots = getattr(word, 'config{}hand{}'.format(config_num, hand_num))
-                #print('slots_list: ', slots)
-                slots = ''.join([slot if slot else '_' for slot in slots])
-                #print('slots: ', slots)
-                regex = re.compile(expressions[config_num - 1][hand_num - 1])
-                #print('regex: ', regex)
-                if regex.match(slots) is None:
-                    break
-            else:
-                match_list.append(word)
-
-        return match_list
+        # each expression is compiled once for the whole search rather than for every hand of every word
+        patterns = [re.compile(expression) for expression in query]
+        return [word for word in self if self.matchesRegEx(word, patterns)]
+
+    def matchesRegEx(self, word, patterns):
+        '''
+        :param patterns: a compiled regular expression for each hand, in the order of HAND_NAMES
+        :return: True if every hand of word matches its expression
+        '''
+        for slots, pattern in zip(word.slotSummary.strings, patterns):
+            if pattern.match(slots) is None:
+                return False
+        return True
 
     def getWord(self, text):
         return self[text]
@@ -73,44 +470,202 @@ class Corpus:
         if hasattr(item, 'gloss'):
             return item.gloss in self.wordlist
         else:
-            return item.upper() in [w.upper() for w in self.wordlist]
+            #glosses are matched regardless of case
+            return item in self.wordlist or self.getIndex(FoldedGlossIndex).lookup(item) is not None
 
     def __getitem__(self, key):
         try:
-            word = self.wordlist[key]
+            return self.wordlist[key]
         except KeyError:
-            try:
-                word = self.wordlist[key.upper()]
-            except KeyError:
-                word = self.wordlist[key.lower()]
-                #if this fails, then a KeyError is raised as usual
-        return word
+            gloss = self.getIndex(FoldedGlossIndex).lookup(key)
+            if gloss is None:
+                raise
+            return self.wordlist[gloss]
+
+    def matchGlosses(self, text, limit=None):
+        '''
+        Find glosses for completing a partly typed gloss, regardless of case
+        :param text: the text typed so far
+        :param limit: the maximum number of glosses to return, or None for all of them
+        :return: a list of the glosses starting with text, in sorted order, followed by the other glosses that
+        contain it
+        '''
+        index = self.getIndex(FoldedGlossIndex)
+        matches = list(itertools.islice(index.startingWith(text), limit))
+        if limit is not None and len(matches) >= limit:
+            return matches
+        found = set(matches)
+        others = (gloss for gloss in index.containing(text) if gloss not in found)
+        matches.extend(itertools.islice(others, None if limit is None else limit - len(matches)))
+        return matches
 
     def __iter__(self):
-        wordlist = sorted(self.wordlist.keys())
-        for item in wordlist:
-            yield self.wordlist[item]
+        wordlist = self.wordlist
+        for item in self.glosses()[:]:
+            yield wordlist[item]
+
+    def unorderedSigns(self):
+        '''
+        Iterate over the signs without sorting them by gloss, for analyses where the order does not matter
+        '''
+        return iter(self.wordlist.values())
 
     def __repr__(self):
         return 'Corpus object with name "{}"'.format(self.name)
 
     def addWord(self, hs):
+        old = self.wordlist.get(hs.gloss) if self.indexes else None
         self.wordlist[hs.gloss] = hs
+        self.revision += 1
+        if self.indexes:
+            for index in self.indexes.values():
+                index.wordAdded(hs, old)
+        if self.journal is not None:
+            self.journal.wordAdded(self, hs)
+
+    def removeWord(self, gloss):
+        sign = self.wordlist[gloss] if self.indexes else None
+        del self.wordlist[gloss]
+        self.revision += 1
+        if self.indexes:
+            for index in self.indexes.values():
+                index.wordRemoved(sign)
+        if self.journal is not None:
+            self.journal.wordRemoved(self, gloss)
+
+    def updateAttribute(self, name, value):
+        if getattr(self, name, None) == value:
+            return
+        setattr(self, name, value)
+        if self.journal is not None:
+            self.journal.attributeChanged(self, name, value)
 
     def randomWord(self):
         word = choice(list(self.wordlist.keys()))
         return self.wordlist[word]
 
+    def filterSigns(self, frequency_range=None, coders=None, lastUpdateds=None):
+        '''
+        Iterate, in gloss order, over the signs whose frequency, coder and date of last update are acceptable
+        :param frequency_range: a (minimum, maximum) tuple, or None to allow any frequency
+        :param coders: a set of coder names, or None to allow any coder
+        :param lastUpdateds: a set of dates, or None to allow any date
+        :return: an iterator of signs
+        '''
+        for word in self:
+            if frequency_range is not None and not frequency_range[0] <= word.frequency <= frequency_range[1]:
+                continue
+            if coders is not None and word.coder not in coders:
+                continue
+            if lastUpdateds is not None and word.lastUpdated not in lastUpdateds:
+                continue
+            yield word
+
     def getFrequencyRange(self):
-        minFreq = min(word.frequency for gloss, word in self.wordlist.items())
-        maxFreq = max(word.frequency for gloss, word in self.wordlist.items())
+        index = self.getIndex(FrequencyIndex)
+        return index.minimum(), index.maximum()
+
+    def countFrequencyRange(self, minimum, maximum):
+        '''
+        :return: the number of signs whose frequency is between minimum and maximum, both included
+        '''
+        return self.getIndex(FrequencyIndex).count(minimum, maximum)
+
+    def frequencyHistogram(self, bins=FREQUENCY_BINS):
+        '''
+        :return: a list of (low, high, number of signs) for bins of the same width over the frequencies of the
+        corpus, see histogram_bins
+        '''
+        return self.getIndex(FrequencyIndex).histogram(bins)
+
+    def coderCounts(self):
+        '''
+        :return: a dictionary of every coder in the corpus to the number of signs they coded
+        '''
+        return self.getIndex(CoderIndex).counts()
+
+    def lastUpdatedCounts(self):
+        '''
+        :return: a dictionary of every date in the corpus to the number of signs last updated on it
+        '''
+        return self.getIndex(LastUpdatedIndex).counts()
+
+    def signsUpdatedBetween(self, first, last):
+        '''
+        :return: a list of the signs last updated from first to last, both included, in gloss order
+        '''
+        wordlist = self.wordlist
+        return [wordlist[gloss] for gloss in sorted(self.getIndex(LastUpdatedIndex).glossesBetween(first, last))]
+
+
+class CompactCorpus(Corpus):
+    """
+    A Corpus that keeps the transcription slots and flags of all its signs in a single SlotStore.
+    Signs added to it are converted to CompactSign views over a row of the store.
+    """
+
+    def __init__(self, kwargs):
+        super().__init__(kwargs)
+        self.store = SlotStore()
+        wordlist = self.wordlist
+        self.wordlist = dict()
+        for sign in wordlist.values():
+            self.addWord(sign)
+
+    @classmethod
+    def fromCorpus(cls, corpus):
+        compact = cls.__new__(cls)
+        compact.__dict__.update(corpus.__getstate__())
+        compact.store = SlotStore()
+        compact.wordlist = dict()
+        for sign in corpus.wordlist.values():
+            compact.wordlist[sign.gloss] = compact.compactSign(sign)
+        return compact
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['wordlist'] = {gloss: sign.compactState() for gloss, sign in self.wordlist.items()}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.wordlist = {gloss: CompactSign.fromCompactState(compactState, self.store)
+                         for gloss, compactState in state['wordlist'].items()}
+
+    def snapshot(self):
+        state = self.__getstate__()
+        state['store'] = self.store.copy()
+        snapshot = CompactCorpus.__new__(CompactCorpus)
+        snapshot.__setstate__(state)
+        return snapshot
+
+    def compactSign(self, sign):
+        if isinstance(sign, CompactSign) and sign._store is self.store:
+            return sign
+        return CompactSign.fromSign(sign, self.store)
+
+    def releaseSign(self, sign):
+        # anything still holding on to the old sign (e.g. a results window) keeps seeing its own data
+        row = sign._row
+        sign.detach()
+        self.store.freeRow(row)
+
+    def addWord(self, hs):
+        hs = self.compactSign(hs)
+        old = self.wordlist.get(hs.gloss)
+        super().addWord(hs)
+        if old is not None and old is not hs:
+            self.releaseSign(old)
 
-        return minFreq, maxFreq
+    def removeWord(self, gloss):
+        sign = self.wordlist[gloss]
+        super().removeWord(gloss)
+        self.releaseSign(sign)
 
 
 class Sign:
     sign_attributes = {'gloss': str(), 'config1': None, 'config2': None,
-                       'parameters': defaultParameters,
+                       'parameters': defaultRecord,
                        'flags': {'config1hand1': [Flag(False, False) for n in range(34)],
                                  'config1hand2': [Flag(False, False) for n in range(34)],
                                  'config2hand1': [Flag(False, False) for n in range(34)],
@@ -153,16 +708,36 @@ class Sign:
         self.config1hand1, self.config1hand2 = self.config1
         self.config2hand1, self.config2hand2 = self.config2
 
-        self.determine_hand_type()
-        self.determine_config_type()
+    def __setattr__(self, name, value):
+        # replacing any of the hands makes the cached slot summary out of date. Changes made to the slot lists in
+        # place are not noticed, so hands must be assigned back after they are edited
+        if name in SLOT_ATTRIBUTES:
+            self.__dict__.pop('_slotSummary', None)
+        super().__setattr__(name, value)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in DERIVED_ATTRIBUTES:
+            state.pop(name, None)
+        return state
+
+    @property
+    def slotSummary(self):
+        '''
+        The transcription of every hand in the forms used by the searches, see SlotSummary
+        '''
+        try:
+            return self.__dict__['_slotSummary']
+        except KeyError:
+            summary = summarize_slots(tuple(tuple(getattr(self, name)) for name in HAND_NAMES))
+            self.__dict__['_slotSummary'] = summary
+            return summary
 
     def copyValue(self, value):
         if isinstance(value, dict):
             return value.copy()
         elif isinstance(value, list):
             return value[:]
-        elif isinstance(value, ParameterTreeModel):
-            return ParameterTreeModel(defaultParameters)
         else:
             return value
 
@@ -181,27 +756,24 @@ class Sign:
     def __repr__(self):
         return self.__str__()
 
-    def determine_hand_type(self):
-        c1h1, c1h2, c2h1, c2h2 = self.get_transcription_strings()
-
-        if (c1h1 == '______∅/______1____2____3____4___' and c2h1 == '______∅/______1____2____3____4___') \
-                or (c1h2 == '______∅/______1____2____3____4___' and c2h2 == '______∅/______1____2____3____4___'):
-            typ = 'one'
-        else:
-            typ = 'two'
+    @property
+    def hand_type(self):
+        return self.slotSummary.hand_type
 
-        self.hand_type = typ
+    @property
+    def config_type(self):
+        return self.slotSummary.config_type
 
-    def determine_config_type(self):
-        c1h1, c1h2, c2h1, c2h2 = self.get_transcription_strings()
+    @property
+    def sign_type(self):
+        return self.slotSummary.sign_type
 
-        if (c1h1 == '______∅/______1____2____3____4___' and c1h2 == '______∅/______1____2____3____4___') \
-                or (c2h1 == '______∅/______1____2____3____4___' and c2h2 == '______∅/______1____2____3____4___'):
-            typ = 'one'
-        else:
-            typ = 'two'
+    def determine_hand_type(self):
+        # the hand and config types are worked out from the slot summary, this only makes sure it is up to date
+        self.__dict__.pop('_slotSummary', None)
 
-        self.config_type = typ
+    def determine_config_type(self):
+        self.__dict__.pop('_slotSummary', None)
 
     @property
     def frequency(self):
@@ -217,6 +789,20 @@ class Sign:
     def notes(self):
         return self.signNotes
 
+    @property
+    def parameters(self):
+        try:
+            return self._parameters
+        except AttributeError:
+            # signs pickled before parameters were stored as records keep a list of Parameters or a tree model
+            self._parameters = toParameterRecord(self.__dict__.pop('parameters', defaultRecord))
+            return self._parameters
+
+    @parameters.setter
+    def parameters(self, newParameters):
+        self.__dict__.pop('parameters', None)
+        self._parameters = toParameterRecord(newParameters)
+
     @property
     def coder(self):
         if not hasattr(self, '_coder'):
@@ -298,9 +884,9 @@ class Sign:
         output.append('True' if self.reduplicated else 'False')
         output.append(self.notes)
         if parameter_format == 'xml':
-            parameters = self.parameters.exportXML()
+            parameters = exportXML(self.parameters)
         elif parameter_format == 'txt':
-            parameters = self.parameters.exportTree()
+            parameters = exportTree(self.parameters)
         output.append(parameters)
 
         output = ','.join(output)
@@ -326,8 +912,106 @@ class Sign:
         Also, the first slot is not included
         :return: a tuple of four strings
         '''
-        c1h1 = ''.join([slot if slot else '_' for slot in self.config1hand1[1:]])
-        c1h2 = ''.join([slot if slot else '_' for slot in self.config1hand2[1:]])
-        c2h1 = ''.join([slot if slot else '_' for slot in self.config2hand1[1:]])
-        c2h2 = ''.join([slot if slot else '_' for slot in self.config2hand2[1:]])
-        return c1h1, c1h2, c2h1, c2h2
+        return self.slotSummary.tails
+
+
+def _hand_property(hand):
+    def getter(self):
+        return self._store.getHand(self._row, hand)
+
+    def setter(self, slots):
+        self._store.setHand(self._row, hand, slots)
+
+    return property(getter, setter)
+
+
+class CompactSign(Sign):
+    """
+    A Sign whose transcription slots and flags live in a row of a SlotStore rather than in lists of its own.
+    Reading config1hand1 etc. or flags returns freshly built lists, so changes must be assigned back to take effect.
+    Pickling a CompactSign produces an ordinary Sign.
+    """
+
+    def __init__(self, kwargs, store, row=None):
+        self._store = store
+        self._row = store.newRow() if row is None else row
+        super().__init__(kwargs)
+
+    config1hand1 = _hand_property(0)
+    config1hand2 = _hand_property(1)
+    config2hand1 = _hand_property(2)
+    config2hand2 = _hand_property(3)
+
+    @property
+    def config1(self):
+        return [self.config1hand1, self.config1hand2]
+
+    @config1.setter
+    def config1(self, hands):
+        self.config1hand1, self.config1hand2 = hands
+
+    @property
+    def config2(self):
+        return [self.config2hand1, self.config2hand2]
+
+    @config2.setter
+    def config2(self, hands):
+        self.config2hand1, self.config2hand2 = hands
+
+    @property
+    def flags(self):
+        return {name: self._store.getFlags(self._row, hand) for hand, name in enumerate(HAND_NAMES)}
+
+    @flags.setter
+    def flags(self, flags):
+        for hand, name in enumerate(HAND_NAMES):
+            self._store.setFlags(self._row, hand, flags[name])
+
+    @classmethod
+    def fromSign(cls, sign, store):
+        compact = cls.__new__(cls)
+        compact._store = store
+        compact._row = store.newRow()
+        for name, value in sign.__getstate__().items():
+            if name not in ('config1', 'config2', 'flags', '_store', '_row') and name not in HAND_NAMES:
+                compact.__dict__[name] = value
+        for hand, name in enumerate(HAND_NAMES):
+            store.setHand(compact._row, hand, getattr(sign, name))
+        compact.flags = sign.flags
+        return compact
+
+    def compactState(self):
+        state = self.__getstate__()
+        del state['_store']
+        return state
+
+    @classmethod
+    def fromCompactState(cls, state, store):
+        compact = cls.__new__(cls)
+        compact.__dict__.update(state)
+        compact._store = store
+        return compact
+
+    def detach(self):
+        store = SlotStore()
+        row = store.newRow()
+        for hand, name in enumerate(HAND_NAMES):
+            store.setHand(row, hand, self._store.getHand(self._row, hand))
+            store.setFlags(row, hand, self._store.getFlags(self._row, hand))
+        self._store = store
+        self._row = row
+
+    def toSign(self):
+        state = {name: value for name, value in self.__getstate__().items() if name not in ('_store', '_row')}
+        hands = [self._store.getHand(self._row, hand) for hand in range(len(HAND_NAMES))]
+        for name, slots in zip(HAND_NAMES, hands):
+            state[name] = slots
+        state['config1'] = hands[0:2]
+        state['config2'] = hands[2:4]
+        state['flags'] = self.flags
+        sign = Sign.__new__(Sign)
+        sign.__dict__.update(state)
+        return sign
+
+    def __reduce__(self):
+        return copyreg._reconstructor, (Sign, object, None), self.toSign().__dict__
@@ -1,4 +1,7 @@
+import copy
 import anytree
+from functools import lru_cache
+from collections import namedtuple
 from xml.etree.ElementTree import Element as xmlElement, SubElement as xmlSubElement
 from xml.etree import ElementTree as xmlElementTree
 
@@ -280,9 +283,11 @@ def getParameterFromXML(element, terminal=False):
 
 def getXMLElements(param, elements):
     paramName = encodeXMLName(param.name)
-    for e in elements:
+    #search backwards, because several parameters have the same name (e.g. Contour of movement) and the parent
+    #is always the most recently added element with that name
+    for e in reversed(elements):
         if ((param.parent is None and e.attrib['name'] == 'Parameters')  # top-level parameter
-            or (e.attrib['name'] == param.parent.name)):  # sub-level parameter
+            or (param.parent is not None and e.attrib['name'] == param.parent.name)):  # sub-level parameter
             se = xmlSubElement(e, paramName)
             se.attrib['name'] = param.name
             se.attrib['is_checked'] = booleanToText(param.is_checked)
@@ -301,6 +306,8 @@ def getChildXMLElements(parameter, elements):
 
 
 def exportTree(parameterList):
+    if isinstance(parameterList, ParameterRecord):
+        return exportRecordTree(parameterList)
     export = list()
     params = list()
     for parameter in parameterList:
@@ -312,6 +319,8 @@ def exportTree(parameterList):
     return export
 
 def exportXML(parameterList):
+    if isinstance(parameterList, ParameterRecord):
+        return exportRecordXML(parameterList)
 
     elements = list()
     top = xmlElement('Parameters')
@@ -334,4 +343,125 @@ defaultParameterTree = anytree.Node('Parameters', parent = None)
 for parameter in defaultParameters:
     parentNode = anytree.Node(parameter.name, parent = defaultParameterTree)
     for childParameter in parameter.children:
-        addChild(parentNode, childParameter)
\ No newline at end of file
+        addChild(parentNode, childParameter)
+
+
+#COMPACT PARAMETER RECORDS
+#Signs do not keep a tree of Parameter objects of their own. They keep a ParameterRecord, which says which nodes of
+#the schema below are checked (as the bits of an int) and what the user typed for any "Specify" choices.
+#If the parameter tree above ever changes, increase PARAMETER_SCHEMA_VERSION and copy the old list of keys into
+#parameterSchemaHistory, so that records made with the old schema can still be read.
+PARAMETER_SCHEMA_VERSION = 1
+EDITABLE = None
+
+ParameterRecord = namedtuple('ParameterRecord', ['version', 'checked', 'edited'])
+
+def parameterKey(path, parameter):
+    #editable choices are renamed by the user, so they are identified by their parent instead of their name
+    if getattr(parameter, 'is_editable', False):
+        return path + (EDITABLE,)
+    return path + (parameter.name,)
+
+def walkParameters(parameterList, path=tuple()):
+    for parameter in parameterList:
+        key = parameterKey(path, parameter)
+        yield key, parameter
+        yield from walkParameters(parameter.children, key)
+
+def walkXML(element, path=tuple()):
+    for child in element:
+        if textToBoolean(child.attrib['is_editable']):
+            key = path + (EDITABLE,)
+        else:
+            key = path + (child.attrib['name'],)
+        yield key, child
+        yield from walkXML(child, key)
+
+schemaParameters = copy.deepcopy(defaultParameters)
+schemaNodes = [parameter for key, parameter in walkParameters(schemaParameters)]
+schemaKeys = tuple(key for key, parameter in walkParameters(schemaParameters))
+schemaIndex = {key: n for n, key in enumerate(schemaKeys)}
+#XML exported by older versions sometimes put a choice under the wrong parent of the same name, so choices are
+#also looked up by their parent's name and their own name when that is enough to tell them apart
+schemaTails = [key[-2:] for key in schemaKeys]
+schemaTailIndex = {tail: n for n, tail in enumerate(schemaTails) if schemaTails.count(tail) == 1}
+parameterSchemaHistory = {PARAMETER_SCHEMA_VERSION: schemaKeys}
+
+def makeRecord(nodes):
+    """
+    :param nodes: an iterable of (key, name, is_checked) tuples
+    :return: a ParameterRecord
+    """
+    checked = 0
+    edited = list()
+    for key, name, is_checked in nodes:
+        try:
+            n = schemaIndex[key]
+        except KeyError:
+            try:
+                n = schemaTailIndex[key[-2:]]
+            except KeyError:
+                #a parameter that is not part of the schema any more
+                continue
+        if is_checked:
+            checked |= 1 << n
+        if key[-1] is EDITABLE and name != schemaNodes[n].name:
+            edited.append((n, name))
+    return ParameterRecord(PARAMETER_SCHEMA_VERSION, checked, tuple(edited))
+
+def recordFromParameters(parameterList):
+    return makeRecord((key, parameter.name, parameter.is_checked) for key, parameter in walkParameters(parameterList))
+
+def recordFromXML(xmlstring):
+    top = xmlElementTree.fromstring(xmlstring)
+    return makeRecord((key, element.attrib['name'], textToBoolean(element.attrib['is_checked']))
+                      for key, element in walkXML(top))
+
+def upgradeRecord(record):
+    if record.version == PARAMETER_SCHEMA_VERSION:
+        return record
+    oldKeys = parameterSchemaHistory[record.version]
+    edited = dict(record.edited)
+    return makeRecord((key, edited.get(n, key[-1]), record.checked >> n & 1) for n, key in enumerate(oldKeys))
+
+def parametersFromRecord(record):
+    """
+    Build a new tree of Parameter objects, e.g. for a ParameterTreeModel, from a record
+    """
+    record = upgradeRecord(record)
+    edited = dict(record.edited)
+    parameterList = copy.deepcopy(schemaParameters)
+    for n, (key, parameter) in enumerate(walkParameters(parameterList)):
+        parameter.is_checked = bool(record.checked >> n & 1)
+        if n in edited:
+            parameter.name = edited[n]
+    return parameterList
+
+def toParameterRecord(value):
+    """
+    Convert anything that has been used to store the parameters of a sign (a record, a list of Parameters,
+    a ParameterTreeModel, or an XML string) to a ParameterRecord
+    """
+    if isinstance(value, ParameterRecord):
+        return upgradeRecord(value)
+    if isinstance(value, str):
+        return recordFromXML(value)
+    if hasattr(value, 'params'):
+        value = value.params
+    elif hasattr(value, 'parameterList'):
+        value = value.parameterList
+    try:
+        return recordFromParameters(value)
+    except (AttributeError, TypeError):
+        #occurs with older corpora where ParameterNode and anytree.Nodes are intermixed
+        return defaultRecord
+
+@lru_cache(maxsize=1024)
+def exportRecordXML(record):
+    return exportXML(parametersFromRecord(record))
+
+@lru_cache(maxsize=1024)
+def exportRecordTree(record):
+    return exportTree(parametersFromRecord(record))
+
+defaultRecord = recordFromParameters(schemaParameters)
@@ -0,0 +1,139 @@
+from array import array
+from constants import STANDARD_SYMBOLS, Flag
+
+HAND_NAMES = ['config1hand1', 'config1hand2', 'config2hand1', 'config2hand2']
+NUM_HANDS = 4
+NUM_SLOTS = 34
+ROW_SIZE = NUM_HANDS * NUM_SLOTS
+MAX_SYMBOLS = 256
+
+
+class SlotStore:
+    """
+    Column-oriented storage for the transcription slots of many signs.
+    Every slot symbol is interned to a one-byte code and the codes of all signs live in a single bytearray laid out as
+    [row, hand, slot]. The uncertain and estimate flags of each hand are packed into the bits of one integer each.
+    """
+
+    def __init__(self):
+        self.symbols = [''] + STANDARD_SYMBOLS
+        self.codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+        self.slots = bytearray()
+        self.uncertain = array('Q')
+        self.estimate = array('Q')
+        self.free = list()
+
+    def __len__(self):
+        return len(self.uncertain) // NUM_HANDS
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['codes']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def fromBuffers(cls, symbols, slots, uncertain, estimate):
+        '''
+        A store over rows that were laid out by another store, e.g. copied out of shared memory
+        :param symbols: the symbols of the other store, in the order of their codes
+        :param slots: the bytes of the slot codes of the rows
+        :param uncertain: the bytes of the uncertain flags of the rows, as written by array.tobytes
+        :param estimate: the bytes of the estimate flags of the rows
+        '''
+        store = cls.__new__(cls)
+        store.symbols = list(symbols)
+        store.codes = {symbol: code for code, symbol in enumerate(store.symbols)}
+        store.slots = bytearray(slots)
+        store.uncertain = array('Q')
+        store.uncertain.frombytes(uncertain)
+        store.estimate = array('Q')
+        store.estimate.frombytes(estimate)
+        store.free = list()
+        return store
+
+    def copy(self):
+        other = SlotStore.__new__(SlotStore)
+        other.symbols = self.symbols[:]
+        other.codes = self.codes.copy()
+        other.slots = self.slots[:]
+        other.uncertain = self.uncertain[:]
+        other.estimate = self.estimate[:]
+        other.free = self.free[:]
+        return other
+
+    def encode(self, symbol):
+        try:
+            return self.codes[symbol]
+        except KeyError:
+            if len(self.symbols) >= MAX_SYMBOLS:
+                raise ValueError('Cannot store more than {} different slot symbols'.format(MAX_SYMBOLS))
+            code = len(self.symbols)
+            self.symbols.append(symbol)
+            self.codes[symbol] = code
+            return code
+
+    def decode(self, code):
+        return self.symbols[code]
+
+    def newRow(self):
+        if self.free:
+            return self.free.pop()
+        row = len(self)
+        self.slots.extend(bytes(ROW_SIZE))
+        self.uncertain.extend([0] * NUM_HANDS)
+        self.estimate.extend([0] * NUM_HANDS)
+        return row
+
+    def freeRow(self, row):
+        start = row * ROW_SIZE
+        self.slots[start:start+ROW_SIZE] = bytes(ROW_SIZE)
+        for hand in range(NUM_HANDS):
+            self.uncertain[row*NUM_HANDS+hand] = 0
+            self.estimate[row*NUM_HANDS+hand] = 0
+        self.free.append(row)
+
+    def handOffset(self, row, hand):
+        return (row * NUM_HANDS + hand) * NUM_SLOTS
+
+    def getHand(self, row, hand):
+        '''
+        :param row: the row of the sign
+        :param hand: 0-3, in the order of HAND_NAMES
+        :return: a new list of 34 slot symbols
+        '''
+        start = self.handOffset(row, hand)
+        symbols = self.symbols
+        return [symbols[code] for code in self.slots[start:start+NUM_SLOTS]]
+
+    def setHand(self, row, hand, slots):
+        start = self.handOffset(row, hand)
+        codes = bytes(self.encode(symbol) for symbol in slots)
+        if len(codes) != NUM_SLOTS:
+            raise ValueError('Expected {} slots, got {}'.format(NUM_SLOTS, len(codes)))
+        self.slots[start:start+NUM_SLOTS] = codes
+
+    def handCodes(self, row, hand):
+        start = self.handOffset(row, hand)
+        return memoryview(self.slots)[start:start+NUM_SLOTS]
+
+    def getFlags(self, row, hand):
+        uncertain = self.uncertain[row*NUM_HANDS+hand]
+        estimate = self.estimate[row*NUM_HANDS+hand]
+        return [Flag(bool(uncertain >> n & 1), bool(estimate >> n & 1)) for n in range(NUM_SLOTS)]
+
+    def setFlags(self, row, hand, flags):
+        uncertain, estimate = 0, 0
+        for n, flag in enumerate(flags):
+            if flag[0]:
+                uncertain |= 1 << n
+            if flag[1]:
+                estimate |= 1 << n
+        self.uncertain[row*NUM_HANDS+hand] = uncertain
+        self.estimate[row*NUM_HANDS+hand] = estimate
+
+    def flagMasks(self, row, hand):
+        return self.uncertain[row*NUM_HANDS+hand], self.estimate[row*NUM_HANDS+hand]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of slpa import each other from the top level, as they do when run_slpa.py is started
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'slpa'))
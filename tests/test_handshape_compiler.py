@@ -0,0 +1,80 @@
+import itertools
+import random
+import pytest
+from analysis.handshape_search import handshape_mapping, HANDSHAPES
+from analysis.handshape_compiler import CONSTRAINTS
+
+BASES = 2  # hands that match each handshape, which the test hands are made from
+UNKNOWN_SYMBOLS = ['', 'Z']  # symbols that no handshape allows anywhere
+
+
+def reference(hand):
+    return sum(HANDSHAPES.bits[label] for label, handshape in handshape_mapping.items() if handshape.match(hand))
+
+
+def matching_hands(handshape, rnd, count=BASES, tries=20000):
+    '''
+    :return: up to count different hands made from the options of handshape that it matches
+    '''
+    found = list()
+    for n in range(tries):
+        hand = tuple(rnd.choice(options) for options in handshape.options)
+        if hand not in found and handshape.match(hand):
+            found.append(hand)
+            if len(found) == count:
+                break
+    return found
+
+
+def generate_hands(seed=0):
+    '''
+    For every handshape, hands that match it with each slot in turn replaced by every symbol, and with the slots of
+    each of its constraints replaced by every combination of the symbols they allow
+    :return: a sorted list of hands, as in SlotSummary.filled
+    '''
+    rnd = random.Random(seed)
+    symbols = sorted(set(HANDSHAPES.codes) | set(UNKNOWN_SYMBOLS))
+    hands = set()
+    for handshape in handshape_mapping.values():
+        bases = matching_hands(handshape, rnd)
+        assert bases, handshape
+        for base in bases:
+            for n in range(len(base)):
+                for symbol in symbols:
+                    hands.add(base[:n] + (symbol,) + base[n+1:])
+            for slots, test in CONSTRAINTS.get(handshape, []):
+                for combination in itertools.product(*[handshape.options[n] for n in slots]):
+                    hand = list(base)
+                    for n, symbol in zip(slots, combination):
+                        hand[n] = symbol
+                    hands.add(tuple(hand))
+    return sorted(hands)
+
+
+@pytest.fixture(scope='module')
+def hands():
+    hands = generate_hands()
+    return hands, [reference(hand) for hand in hands]
+
+
+def test_every_handshape_is_generated(hands):
+    hands, expected = hands
+    for label, bit in HANDSHAPES.bits.items():
+        assert any(bits & bit for bits in expected), label
+
+
+def test_classify_matches_handshapes(hands):
+    hands, expected = hands
+    assert [HANDSHAPES.classify(hand) for hand in hands] == expected
+
+
+def test_match_matches_handshapes(hands):
+    hands, expected = hands
+    for label, bit in HANDSHAPES.bits.items():
+        assert [HANDSHAPES.match(label, hand) for hand in hands] == [bool(bits & bit) for bits in expected], label
+
+
+def test_classify_many_matches_handshapes(hands):
+    pytest.importorskip('numpy')
+    hands, expected = hands
+    assert HANDSHAPES.classifyMany(hands).tolist() == expected
@@ -0,0 +1,61 @@
+import random
+import threading
+import pytest
+from lexicon import Corpus, Sign
+from analysis import unmarked_handshapes
+
+binary = pytest.importorskip('binary', exc_type=ImportError)  # which needs the GUI to unpickle parameter trees
+
+SIGNS = 400
+ADDED = 300
+THRESHOLD = 25  # journal records between compactions, low so that several of them run during the test
+SEED = 1234
+
+
+def make_sign(gloss, rnd):
+    hands = [list(rnd.choice([unmarked_handshapes.Handshape1.canonical, unmarked_handshapes.HandshapeB1.canonical]))
+             for n in range(4)]
+    return Sign({'gloss': gloss, 'config1': hands[:2], 'config2': hands[2:], '_frequency': float(rnd.randint(1, 50))})
+
+
+def test_reads_during_compaction(tmp_path):
+    rnd = random.Random(SEED)
+    corpus = Corpus({'name': 'lazy'})
+    for n in range(SIGNS):
+        corpus.addWord(make_sign('SIGN{:05d}'.format(n), rnd))
+    frequencies = {sign.gloss: sign.frequency for sign in corpus}
+    path = str(tmp_path / 'lazy.corpus')
+    binary.save_corpus(corpus, path)
+    corpus = binary.load_corpus(path)
+    assert isinstance(corpus, binary.LazyCorpus)
+    corpus.journal.threshold = THRESHOLD
+
+    errors = list()
+    done = threading.Event()
+
+    def read():
+        # every compaction swaps the mapped file under the reader, which must still get the sign it asked for
+        reader = random.Random(SEED)
+        while not done.is_set():
+            gloss = reader.choice(sorted(frequencies))
+            try:
+                sign = corpus.wordlist[gloss]
+            except Exception as error:
+                errors.append(error)
+                continue
+            if (sign.gloss, sign.frequency) != (gloss, frequencies[gloss]):
+                errors.append((gloss, sign.gloss))
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    try:
+        for n in range(ADDED):
+            corpus.addWord(make_sign('ADDED{:05d}'.format(n), rnd))
+            if n % THRESHOLD == 0:
+                corpus.journal.waitForCompaction()
+    finally:
+        corpus.journal.waitForCompaction()
+        done.set()
+        thread.join()
+    assert not errors, errors[:5]
+    assert len(corpus) == SIGNS + ADDED
@@ -0,0 +1,207 @@
+import inspect
+import random
+from datetime import date, timedelta
+from operator import truth, not_
+import pytest
+from lexicon import Corpus, Sign
+from constants import Flag, NULL, X_IN_BOX, GLOBAL_OPTIONS
+from slotstore import HAND_NAMES
+from analysis import vectorized, marked_handshapes, unmarked_handshapes
+from analysis.transcription_search import transcription_search
+from analysis.handshape_search import handshape_search, handshape_mapping
+from analysis.phonological_search import extended_finger_search
+
+pytest.importorskip('numpy')  # the backend that is compared with the others
+
+SIGNS = 1500
+QUERIES = 30
+SEED = 1234
+SYMBOLS = ['O', 'L', 'U', '{', '<', '=', 'H', 'E', 'e', 'i', 'F', 'f', '-', 't', 'fr', 'b', 'r', 'u', 'd', 'p', 'M',
+           'm', 'x-', 'x', 'x+', X_IN_BOX, '?']
+FIXED_SLOTS = {7: NULL, 8: '/', 15: '1', 20: '2', 25: '3', 30: '4'}  # the slots that transcriptions always fill in
+CODERS = ['alice', 'bob', 'carol', 'dave']
+DATES = [date(2020, 1, 1) + timedelta(days=7 * n) for n in range(20)]
+OPTIONS = ['Yes', 'No', 'Either', 'Either']
+CONFIGS = ['One-config signs', 'Two-config signs', 'Either']
+HANDS = ['One-hand signs', 'Two-hand signs', 'Either']
+# the regular expressions that the extended finger search dialog makes for each finger, with the i button checked
+FINGERS = {
+    'thumb': {'Extended': r'(?P<thumb>.(?P<thumb_opposition>[LU]).(?<thumb_mcp>[HEei]).).+.∅/.+.....',
+              'Not extended': r'(?P<thumb>.(?P<thumb_opposition_1>[^LU]).(?<thumb_mcp_1>[HEei]).|'
+                              r'_(?P<thumb_opposition_2>[LU]).(?<thumb_mcp_2>[^HEei]).|'
+                              r'_(?P<thumb_opposition_3>[^LU]).(?<thumb_mcp_3>[^HEei]).).+.∅/.+.....',
+              'Either': r'(?P<thumb>.(?P<thumb_opposition>.).(?<thumb_mcp>.).).+.∅/.+.....'},
+    'index': {'Extended': r'(?P<index>1(?P<index_mcp>[HEei])..)',
+              'Not extended': r'(?P<index>1(?P<index_mcp>[^HEei])..)',
+              'Either': r'(?P<index>1(?P<index_mcp>.)..)'},
+    'middle': {'Extended': r'(?P<middle>.+2(?P<middle_mcp>[HEei])..)',
+               'Not extended': r'(?P<middle>.+2(?P<middle_mcp>[^HEei])..)',
+               'Either': r'(?P<middle>.+2(?P<middle_mcp>.)..)'},
+    'ring': {'Extended': r'(?P<ring>.+3(?P<ring_mcp>[HEei])..)',
+             'Not extended': r'(?P<ring>.+3(?P<ring_mcp>[^HEei])..)',
+             'Either': r'(?P<ring>.+3(?P<ring_mcp>.)..)'},
+    'pinky': {'Extended': r'(?P<pinky>.+4(?P<pinky_mcp>[HEei])..)',
+              'Not extended': r'(?P<pinky>.+4(?P<pinky_mcp>[^HEei])..)',
+              'Either': r'(?P<pinky>.+4(?P<pinky_mcp>.)..)'}
+}
+NEUTRAL_HAND = r'(?P<thumb>_....)..∅/......(?P<index>1...)(?P<middle>.2...)(?P<ring>.3...)(?P<pinky>.4...)'
+
+
+def make_hand(rnd, canonicals):
+    if rnd.random() < 0.25:
+        hand = list(unmarked_handshapes.HandshapeEmpty.canonical)
+    else:
+        hand = list(rnd.choice(canonicals))
+        for n in range(rnd.choice([0, 0, 1, 2, 4])):
+            slot = rnd.randrange(1, 34)
+            if slot not in FIXED_SLOTS:
+                hand[slot] = rnd.choice(SYMBOLS + [''])
+    hand[0] = 'V' if rnd.random() < 0.1 else ''
+    return hand
+
+
+def make_corpus(size=SIGNS, seed=SEED):
+    '''
+    :return: a Corpus of size signs whose hands are the canonical forms of the named handshapes, some of them with
+    a few slots changed, and whose flags, options, frequencies, coders and dates are random
+    '''
+    rnd = random.Random(seed)
+    canonicals = [handshape.canonical for module in [marked_handshapes, unmarked_handshapes]
+                  for name, handshape in inspect.getmembers(module, inspect.isclass) if hasattr(handshape, 'canonical')]
+    corpus = Corpus({'name': 'generated'})
+    for n in range(size):
+        hands = [make_hand(rnd, canonicals) for name in HAND_NAMES]
+        if rnd.random() < 0.15:
+            hands[1], hands[3] = hands[0][:], hands[2][:]
+        kwargs = {'gloss': 'SIGN{:05d}'.format(n), 'config1': hands[0:2], 'config2': hands[2:4],
+                  'flags': {name: [Flag(rnd.random() < 0.05, rnd.random() < 0.05) for slot in range(34)]
+                            for name in HAND_NAMES},
+                  '_frequency': float(rnd.randint(1, 50)), '_coder': rnd.choice(CODERS),
+                  '_lastUpdated': rnd.choice(DATES)}
+        for option in GLOBAL_OPTIONS:
+            kwargs[option] = rnd.random() < 0.2
+        corpus.addWord(Sign(kwargs))
+    return corpus
+
+
+def slot_query(restrictions):
+    hand = list()
+    for n in range(1, 34):
+        slot = {'flag_estimate': 0, 'flag_uncertain': 0, 'allowed': {r'.+'}}
+        if n in FIXED_SLOTS:
+            slot['allowed'] = {FIXED_SLOTS[n]}
+        if n in restrictions:
+            slot['allowed'] = restrictions[n]
+        hand.append(slot)
+    return hand
+
+
+def transcription_queries(rnd):
+    queries = list()
+    for k in range(QUERIES):
+        restrictions = dict()
+        for n in range(rnd.choice([0, 1, 2, 3])):
+            slot = rnd.choice([n for n in range(1, 34) if n not in FIXED_SLOTS])
+            restrictions[slot] = set(rnd.sample(SYMBOLS, rnd.choice([1, 2, 4, 8])))
+            if rnd.random() < 0.2:
+                restrictions[slot].add('_')
+        config1 = (slot_query(restrictions), slot_query(dict()))
+        config2 = (slot_query(dict()), slot_query(dict() if rnd.random() < 0.7 else {16: {'H', 'E'}}))
+        if rnd.random() < 0.3:
+            config1[0][rnd.randrange(33)]['flag_estimate'] = rnd.choice([1, -1])
+        if rnd.random() < 0.3:
+            config2[1][rnd.randrange(33)]['flag_uncertain'] = rnd.choice([1, -1])
+        forearm, estimated, uncertain, incomplete = [rnd.choice(OPTIONS) for option in GLOBAL_OPTIONS]
+        queries.append(dict(forearm=forearm, estimated=estimated, uncertain=uncertain, incomplete=incomplete,
+                            configuration=rnd.choice(CONFIGS), hand=rnd.choice(HANDS),
+                            frequency_range=rnd.choice([None, (1.0, 50.0), (5.0, 20.0)]),
+                            config1=config1, config2=config2,
+                            coders=rnd.choice([None, set(CODERS), {'alice'}, {'bob', 'dave'}]),
+                            lastUpdateds=rnd.choice([None, set(DATES), set(DATES[:5])])))
+    return queries
+
+
+def handshape_queries(rnd):
+    labels = list(handshape_mapping)
+    queries = list()
+    for k in range(QUERIES):
+        hands = list()
+        for name in HAND_NAMES:
+            chosen = {'any'} if rnd.random() < 0.3 else set(rnd.sample(labels, rnd.choice([1, 1, 2, 3])))
+            hands.append({'labels': chosen, 'positive': not_ if rnd.random() < 0.2 else truth})
+        forearm, estimated, uncertain, incomplete = [rnd.choice(OPTIONS) for option in GLOBAL_OPTIONS]
+        queries.append(dict(forearm=forearm, estimated=estimated, uncertain=uncertain, incomplete=incomplete,
+                            config=rnd.choice(CONFIGS), hand=rnd.choice(HANDS),
+                            logic=rnd.choice(['Any of the above configurations', 'All of the above configurations']),
+                            c1h1=hands[0], c1h2=hands[1], c2h1=hands[2], c2h2=hands[3]))
+    return queries
+
+
+def extended_finger_queries(rnd):
+    neutral = {'fingerConfigRegExps': {NEUTRAL_HAND}, 'fingerNumberRegExps': {NEUTRAL_HAND},
+               'relationLogic': 'Apply both', 'searchMode': 'Positive'}
+
+    def expressions():
+        return {''.join(options[rnd.choice(['Extended', 'Not extended', 'Either'])] for options in FINGERS.values())
+                for n in range(rnd.choice([1, 2, 3]))}
+
+    queries = list()
+    for k in range(QUERIES):
+        hands = [neutral] * len(HAND_NAMES)
+        hands[rnd.randrange(len(HAND_NAMES))] = {
+            'fingerConfigRegExps': expressions(), 'fingerNumberRegExps': expressions(),
+            'relationLogic': rnd.choice(['Apply both', 'Apply either', 'Apply only the finger configuration',
+                                         'Apply only the number of extended fingers']),
+            'searchMode': rnd.choice(['Positive', 'Positive', 'Negative'])}
+        queries.append(dict(c1h1=hands[0], c1h2=hands[1], c2h1=hands[2], c2h2=hands[3],
+                            logic=rnd.choice(['All four hand/configuration specifications', 'Any']),
+                            sign_type=rnd.choice([{'one'}, {'two-same', 'two-diff'},
+                                                  {'one', 'two-same', 'two-diff'}])))
+    return queries
+
+
+SEARCHES = [(transcription_search, transcription_queries),
+            (handshape_search, handshape_queries),
+            (extended_finger_search, extended_finger_queries)]
+
+
+def backend_results(backend, function, queries):
+    '''
+    :return: the glosses found for each query by function with the backend selected, in a corpus of its own, so
+    that no backend is given results from the ResultCache of another
+    '''
+    corpus = make_corpus()
+    vectorized.select_backend(backend)
+    try:
+        search = vectorized.search_function(function)
+        return [[sign.gloss for sign in search(corpus, **query)] for query in queries]
+    finally:
+        vectorized.select_backend(vectorized.PYTHON)
+
+
+@pytest.mark.parametrize('function, make_queries', SEARCHES, ids=[function.__name__ for function, q in SEARCHES])
+def test_numpy_backend_finds_the_same_signs(function, make_queries):
+    queries = make_queries(random.Random(SEED))
+    expected = backend_results(vectorized.PYTHON, function, queries)
+    assert any(expected), 'no query found anything'
+    assert backend_results(vectorized.NUMPY, function, queries) == expected
+
+
+@pytest.mark.parametrize('function, make_queries', SEARCHES, ids=[function.__name__ for function, q in SEARCHES])
+def test_backends_agree_after_edits(function, make_queries):
+    # the NumPy backend makes its SlotMatrix again after the corpus changes
+    queries = make_queries(random.Random(SEED))
+    corpus = make_corpus()
+    matrix = vectorized.NUMPY_SEARCHES[function.__name__]
+    assert [[sign.gloss for sign in matrix(corpus, **query)] for query in queries] == \
+        [[sign.gloss for sign in function(corpus, **query)] for query in queries]
+    replacements = make_corpus(size=50, seed=SEED + 1)
+    for n, gloss in enumerate(sorted(corpus.wordlist)[:100]):
+        if n % 2:
+            corpus.removeWord(gloss)
+        else:
+            sign = replacements.wordlist['SIGN{:05d}'.format(n // 2)]
+            sign.gloss = gloss
+            corpus.addWord(sign)
+    assert [[sign.gloss for sign in matrix(corpus, **query)] for query in queries] == \
+        [[sign.gloss for sign in function(corpus, **query)] for query in queries]